@@ -0,0 +1,45 @@
+# -- coding: utf-8 --
+"""Benchmark of the import time of sciserialize.
+
+Run with `python benchmarks/bench_import.py`. Imports sciserialize in
+fresh interpreters with `python -X importtime`, prints the cumulative
+import time of the slowest modules and checks, that numpy and pandas
+are not imported.
+"""
+import os
+import subprocess
+import sys
+
+
+def import_times(statement='import sciserialize'):
+    """Returns the cumulative import times in us by module."""
+    root = os.path.join(os.path.dirname(__file__), '..')
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=root, check=True, stderr=subprocess.PIPE,
+        universal_newlines=True).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line.split('|')
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def main(repeat=5, top=10):
+    runs = [import_times() for _ in range(repeat)]
+    times = {module: min(run.get(module, 0) for run in runs)
+             for module in runs[0]}
+    print('import sciserialize: {:.1f} ms (best of {})'.format(
+        times['sciserialize'] / 1000, repeat))
+    for module in ('numpy', 'pandas', 'dateutil'):
+        print('{} imported: {}'.format(module, module in times))
+    print('\nslowest modules (cumulative ms):')
+    for module, us in sorted(times.items(), key=lambda item: -item[1])[
+            :top]:
+        print('{:>8.1f}  {}'.format(us / 1000, module))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+# -- coding: utf-8 --
+"""Benchmark of parallel compression of large arrays.
+
+Run with `python benchmarks/bench_parallel.py`. Prints the throughput
+of `packb` and `unpackb` with compression for different numbers of
+worker threads.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import sciserialize as scs  # noqa: E402
+
+
+def main(size_mb=256, codec='zlib'):
+    data = np.cumsum(np.random.randn(size_mb * 2 ** 17))
+    compression = {'codec': codec, 'level': 1}
+    print('packb/unpackb of {} MB float64, {} compression'.format(
+        size_mb, codec))
+    print('workers  pack MB/s  unpack MB/s')
+    for workers in (None, 2, 4, 8):
+        start = time.perf_counter()
+        packed = scs.packb(data, compression=compression, workers=workers)
+        pack_time = time.perf_counter() - start
+        start = time.perf_counter()
+        scs.unpackb(packed, workers=workers)
+        unpack_time = time.perf_counter() - start
+        print('{:>7}  {:>9.1f}  {:>11.1f}'.format(
+            workers or 1, size_mb / pack_time, size_mb / unpack_time))
+
+
+if __name__ == '__main__':
+    main()
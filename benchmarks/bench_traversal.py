@@ -0,0 +1,101 @@
+# -- coding: utf-8 --
+"""Benchmark of the traversal of `encode_types()` and `decode_types()`.
+
+Run with `python benchmarks/bench_traversal.py`. Compares the explicit
+stack traversal with recursive reference implementations (the former
+traversal, without the options) on deep, wide and typed trees and
+checks, that both give the same output. The recursive reference fails
+on trees deeper than the recursion limit.
+"""
+import datetime
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from sciserialize import coders  # noqa: E402
+
+
+def recursive_encode(data, registry=coders.get_registry(
+        coders.TYPE_CODER_LIST)):
+    if isinstance(data, dict):
+        return {key: recursive_encode(data[key]) for key in data}
+    elif isinstance(data, (list, tuple)):
+        return [recursive_encode(item) for item in data]
+    elif isinstance(data, (str, int, float)) or data is None:
+        return data
+    return registry.coder_for_object(data).encode(data)
+
+
+def recursive_decode(data, registry=coders.get_registry(
+        coders.TYPE_CODER_LIST), type_key=coders.TYPE_KEY):
+    if isinstance(data, dict) and type_key in data:
+        data = data.copy()
+        coder = registry.coder_for_typestr(data.pop(type_key))
+        return recursive_decode(coder.decode(data))
+    elif isinstance(data, dict):
+        return {key: recursive_decode(data[key]) for key in data}
+    elif isinstance(data, list):
+        return [recursive_decode(item) for item in data]
+    return data
+
+
+def deep_tree(depth):
+    tree = {'leaf': 1}
+    for level in range(depth):
+        tree = {'child': tree, 'level': [level, 'a']}
+    return tree
+
+
+def trees():
+    return {
+        'deep (depth 300)': deep_tree(300),
+        'wide (20000 records)': [
+            {'id': i, 'name': 'n{}'.format(i), 'values': [1.0, 2.0, 3.0],
+             'sub': {'a': i, 'b': None}} for i in range(20000)],
+        'typed (5000 records)': [
+            {'delta': datetime.timedelta(i), 'array': np.arange(3)}
+            for i in range(5000)],
+    }
+
+
+def best(function, argument, repeat=15, copy=None):
+    # Returns the best time of `function(argument)` in ms. The argument is
+    # made by `copy()` for every call, if given.
+    times = []
+    for _ in range(repeat):
+        if copy is not None:
+            argument = copy()
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    print('{:<22} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+        'tree (ms)', 'enc ref', 'encode', 'dec ref', 'decode',
+        'in place'))
+    for name, tree in trees().items():
+        encoded = coders.encode_types(tree)
+        assert coders.encode_types(tree) == recursive_encode(tree)
+        print('{:<22} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+            name,
+            best(recursive_encode, tree),
+            best(coders.encode_types, tree),
+            best(recursive_decode, encoded),
+            best(coders.decode_types, encoded),
+            best(lambda data: coders.decode_types(data, in_place=True),
+                 None, copy=lambda: coders.encode_types(tree))))
+    depth = 20 * sys.getrecursionlimit()
+    tree = deep_tree(depth)
+    decoded = coders.decode_types(coders.encode_types(tree))
+    for _ in range(depth):
+        decoded = decoded['child']
+    print('depth {}: encoded and decoded, leaf {}'.format(depth, decoded))
+
+
+if __name__ == '__main__':
+    main()
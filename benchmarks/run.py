@@ -0,0 +1,101 @@
+# -- coding: utf-8 --
+"""
+Runs the benchmark suite and compares it with a stored baseline.
+
+Usage:
+
+    python benchmarks/run.py [-k FILTER] [--repeat N] [--scale N]
+                             [--save FILE] [--compare FILE]
+                             [--threshold FRACTION]
+
+For every case of `suite.py` the best time of `--repeat` runs is
+reported as MB/s and objects/s, and the peak of traced memory of one
+more run under `tracemalloc`. `--save` stores the results as JSON,
+`--compare` reports the change against stored results and exits with
+status 1 if any case got slower or needs more memory by more than
+`--threshold`.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(__file__))
+import suite  # noqa: E402
+
+
+def measure(case, repeat):
+    """Returns the results of a case as dict."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        case.function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    case.function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    seconds = max(min(times), 1e-9)
+    return {'seconds': seconds,
+            'mb_per_s': case.nbytes / seconds / 2 ** 20,
+            'objects_per_s': case.nobjects / seconds,
+            'peak_mb': peak / 2 ** 20}
+
+
+def compare(results, baseline, threshold):
+    """Prints the changes and returns the names of regressed cases."""
+    regressions = []
+    print('\n{:<36} {:>10} {:>10}'.format('case', 'time', 'peak'))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        time_change = result['seconds'] / baseline[name]['seconds'] - 1
+        peak_change = ((result['peak_mb'] + 1e-3) /
+                       (baseline[name]['peak_mb'] + 1e-3) - 1)
+        regressed = time_change > threshold or peak_change > threshold
+        if regressed:
+            regressions.append(name)
+        print('{:<36} {:>+9.1%} {:>+9.1%}{}'.format(
+            name, time_change, peak_change,
+            '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-k', '--filter', default='',
+                        help='run only cases containing this string')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=int, default=1,
+                        help='multiplies the payload sizes')
+    parser.add_argument('--save', help='store results as JSON file')
+    parser.add_argument('--compare', help='compare with JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    results = {}
+    print('{:<36} {:>10} {:>12} {:>9}'.format(
+        'case', 'MB/s', 'objects/s', 'peak MB'))
+    for case in suite.all_cases(args.scale):
+        if args.filter not in case.name:
+            continue
+        result = results[case.name] = measure(case, args.repeat)
+        print('{:<36} {:>10.1f} {:>12.0f} {:>9.2f}'.format(
+            case.name, result['mb_per_s'], result['objects_per_s'],
+            result['peak_mb']))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
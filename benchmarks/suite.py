@@ -0,0 +1,211 @@
+# -- coding: utf-8 --
+"""
+Benchmark cases for the coders and serializers.
+
+Every case is a `Case` with a function that runs the benchmarked code
+once, the number of payload bytes and objects it handles per run. The
+runner in `run.py` measures time and memory of the cases.
+Cases are grouped by name: `coder.<typestr>.<encode|decode>`,
+`types.<tree>.<encode|decode>`, `<serializer>.<payload>` and
+`<packb|unpackb>.<codec>.workers<n>`.
+"""
+import datetime
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from sciserialize import coders, serializers  # noqa: E402
+
+
+class Case:
+    """A benchmark case.
+
+    `function` is called without arguments once per run, `nbytes` and
+    `nobjects` are the payload bytes and objects handled per run.
+    """
+
+    def __init__(self, name, function, nbytes, nobjects):
+        self.name = name
+        self.function = function
+        self.nbytes = nbytes
+        self.nobjects = nobjects
+
+
+# Sample objects for the coders in `coders.TYPE_CODER_LIST` by typestr.
+# Every coder needs a sample. Samples of optional packages, that are not
+# installed, are None and their coders are skipped.
+def coder_samples(scale=1):
+    n = 1000 * scale
+    try:
+        import scipy.sparse
+    except ImportError:
+        sparse_matrix = None
+    else:
+        sparse_matrix = scipy.sparse.random(n, 1000, density=0.01,
+                                            format='csr', random_state=0)
+    return {
+        'unique_set': set(range(n)),
+        'datetime': datetime.datetime(2020, 1, 2, 3, 4, 5, 6),
+        'datetime_epoch': datetime.datetime(2020, 1, 2, 3, 4, 5, 6),
+        'timedelta': datetime.timedelta(3, 4, 5),
+        'tuple': tuple(range(n)),
+        'ndarray': np.random.randn(n, 100),
+        'datetime64': np.datetime64('2020-01-01T00:00:00.000000001'),
+        'timedelta64': np.timedelta64(5, 'ms'),
+        'typed_list': [float(i) for i in range(n)],
+        'maskedarray': np.ma.masked_array(np.random.randn(n, 100),
+                                          np.random.rand(n, 100) > 0.5),
+        'dataframe': mixed_dataframe(n),
+        'pandas_index': pd.date_range('2020', periods=n, freq='s'),
+        'timestamp': pd.Timestamp('2020-01-01', tz='Europe/Berlin'),
+        'record_batch': [{'i': i, 'x': float(i), 'name': 'n{}'.format(i)}
+                         for i in range(n)],
+        'categorical': pd.Categorical(
+            np.array(['low', 'medium', 'high'])[np.arange(n * 100) % 3]),
+        'sparse_matrix': sparse_matrix,
+    }
+
+
+def mixed_dataframe(n):
+    return pd.DataFrame({
+        'f': np.random.randn(n),
+        'i': np.arange(n),
+        's': np.array(['a', 'bb', 'ccc'])[np.arange(n) % 3],
+        't': pd.date_range('2020', periods=n, freq='s'),
+    })
+
+
+def deep_tree(depth=100):
+    tree = {'leaf': datetime.timedelta(1)}
+    for level in range(depth):
+        tree = {'level': level, 'child': [tree, {'x': 1.5}]}
+    return tree
+
+
+def wide_tree(n=10000):
+    return {'key{}'.format(i): [i, 'text', datetime.timedelta(i), {i}]
+            for i in range(n)}
+
+
+def payloads(scale=1):
+    """Returns payloads for the serializer benchmarks by name."""
+    now = datetime.datetime(2020, 1, 1)
+    return {
+        'many_small': [{'time': now, 'dt': datetime.timedelta(seconds=i),
+                        'tags': {i, i + 1}, 'value': float(i)}
+                       for i in range(10000 * scale)],
+        'huge_arrays': [np.random.randn(2 ** 20 * scale)
+                        for _ in range(4)],
+        'mixed_dataframe': mixed_dataframe(100000 * scale),
+    }
+
+
+def count_objects(data):
+    """Returns the number of nodes in the data tree."""
+    if isinstance(data, dict):
+        return 1 + sum(count_objects(value) for value in data.values())
+    elif isinstance(data, (list, tuple)):
+        return 1 + sum(count_objects(value) for value in data)
+    return 1
+
+
+def payload_nbytes(data):
+    """Returns the serialized size of the data as msgpack."""
+    return len(serializers.packb(data))
+
+
+def coder_cases(scale=1):
+    samples = coder_samples(scale)
+    for coder in coders.TYPE_CODER_LIST:
+        sample = samples[coder.typestr]
+        if sample is None:
+            continue
+        if coder.typestr == 'typed_list':
+            encoded = coder.encode_homogeneous(sample)
+        else:
+            encoded = coder.encode(sample)
+        if coder.decode_content:
+            # These coders get the values decoded by `decode_types()`:
+            encoded = {key: coders.decode_types(value)
+                       for key, value in encoded.items()}
+        nbytes = payload_nbytes(sample)
+        name = 'coder.{}.'.format(coder.typestr)
+        yield Case(name + 'encode',
+                   lambda coder=coder, sample=sample: coder.encode(sample),
+                   nbytes, 1)
+        yield Case(name + 'decode',
+                   lambda coder=coder, encoded=encoded: coder.decode(encoded),
+                   nbytes, 1)
+
+
+def type_cases(scale=1):
+    for name, tree in (('deep', deep_tree()), ('wide', wide_tree(
+            10000 * scale))):
+        encoded = coders.encode_types(tree)
+        nbytes = payload_nbytes(tree)
+        nobjects = count_objects(tree)
+        yield Case('types.{}.encode'.format(name),
+                   lambda tree=tree: coders.encode_types(tree),
+                   nbytes, nobjects)
+        yield Case('types.{}.decode'.format(name),
+                   lambda encoded=encoded: coders.decode_types(encoded),
+                   nbytes, nobjects)
+
+
+def serializer_cases(scale=1):
+    for name, data in payloads(scale).items():
+        nobjects = count_objects(data)
+        packed = serializers.packb(data)
+        dumped = serializers.dumps(data)
+        nbytes = len(packed)
+
+        def pack(data=data):
+            serializers.pack(data, io.BytesIO())
+
+        def dump(data=data):
+            serializers.dump(data, io.StringIO())
+
+        cases = (
+            ('packb', lambda data=data: serializers.packb(data)),
+            ('unpackb', lambda packed=packed: serializers.unpackb(packed)),
+            ('pack', pack),
+            ('unpack', lambda packed=packed: serializers.unpack(
+                io.BytesIO(packed))),
+            ('dumps', lambda data=data: serializers.dumps(data)),
+            ('loads', lambda dumped=dumped: serializers.loads(dumped)),
+            ('dump', dump),
+            ('load', lambda dumped=dumped: serializers.load(
+                io.StringIO(dumped))),
+        )
+        for serializer, function in cases:
+            yield Case('{}.{}'.format(serializer, name), function,
+                       nbytes, nobjects)
+
+
+def compression_cases(scale=1, workers=(None, 4)):
+    # Like `bench_parallel.py` for compressible data:
+    data = np.cumsum(np.random.randn(2 ** 22 * scale))
+    compression = {'codec': 'zlib', 'level': 1}
+    for n in workers:
+        packed = serializers.packb(data, compression=compression, workers=n)
+        name = 'zlib.workers{}'.format(n or 1)
+        yield Case('packb.' + name,
+                   lambda n=n: serializers.packb(
+                       data, compression=compression, workers=n),
+                   data.nbytes, 1)
+        yield Case('unpackb.' + name,
+                   lambda n=n, packed=packed: serializers.unpackb(
+                       packed, workers=n),
+                   data.nbytes, 1)
+
+
+def all_cases(scale=1):
+    """Yields all benchmark cases."""
+    for cases in (coder_cases, type_cases, serializer_cases,
+                  compression_cases):
+        for case in cases(scale):
+            yield case
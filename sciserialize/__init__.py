@@ -97,12 +97,27 @@ Check out further data types to be implemented.
 
 import sciserialize.coders as coders
 import sciserialize.serializers as serializers
+import sciserialize.stats as stats
+import sciserialize.aio as aio
+import sciserialize.schema as schema
+import sciserialize.archive as archive
+import sciserialize.cache as cache
 from sciserialize.serializers import (dumps, loads, packb, unpackb,
-                                      dump, load, pack, unpack)
+                                      dump, load, pack, unpack,
+                                      StreamPacker, iter_unpack,
+                                      StreamDumper, iter_load,
+                                      dump_container, load_container)
+from sciserialize.stats import Stats
+from sciserialize.schema import Schema, SchemaError
+from sciserialize.archive import Archive
+from sciserialize.cache import Cache
 
 
 __all__ = ['dumps', 'loads', 'packb', 'unpackb',
            'dump', 'load', 'pack', 'unpack',
-           'coders', 'serializers']
+           'StreamPacker', 'iter_unpack', 'StreamDumper', 'iter_load',
+           'dump_container', 'load_container', 'Stats', 'Schema',
+           'SchemaError', 'Archive', 'Cache', 'coders', 'serializers',
+           'stats', 'aio', 'schema', 'archive', 'cache']
 
 __version__ = '0.1.1alpha'
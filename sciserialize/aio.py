@@ -0,0 +1,225 @@
+# -- coding: utf-8 --
+"""
+Streaming of records over asyncio streams.
+
+The counterparts of `StreamPacker`, `iter_unpack`, `StreamDumper` and
+`iter_load` for an `asyncio.StreamWriter` and `asyncio.StreamReader`:
+
+```python
+packer = aio.StreamPacker(writer)
+await packer.pack(record)
+
+async for record in aio.iter_unpack(reader):
+    ...
+```
+
+Records are written in pieces of at most `CHUNK_SIZE` bytes and the
+writer is drained after every piece, so a slow peer slows down the
+writer (backpressure) and large array buffers do not block the event
+loop while they are sent. MessagePack buffers are written directly
+from the arrays, without packing the whole record into one bytes
+object first. Reading feeds the received bytes into an unpacker and
+yields every record as soon as it is complete.
+"""
+import json as _json
+import struct as _struct
+from itertools import chain as _chain
+
+import msgpack as _msgpack
+
+from .coders import encode_types, decode_types, TYPE_CODER_LIST, TYPE_KEY
+from .serializers import (StreamPacker as _StreamPacker,
+                          StreamDumper as _StreamDumper,
+                          type_decoder as _type_decoder,
+                          _configure, _loads_json, _type_encoder,
+                          ENABLE_PICKLE, SINGLE_PASS)
+
+
+CHUNK_SIZE = 2 ** 16
+
+
+def _bin_header(nbytes):
+    if nbytes < 2 ** 8:
+        return _struct.pack('>BB', 0xc4, nbytes)
+    elif nbytes < 2 ** 16:
+        return _struct.pack('>BH', 0xc5, nbytes)
+    return _struct.pack('>BI', 0xc6, nbytes)
+
+
+def _iter_msgpack(obj, packer, use_bin_type, encode_type=None):
+    # Yields the MessagePack representation of `obj` in pieces. Buffers
+    # are yielded as memoryviews of themselves. Objects, that are not
+    # packed natively, are encoded by `encode_type` first, if given, so
+    # their buffers are yielded in pieces, too (single pass encoding).
+    if isinstance(obj, dict):
+        yield packer.pack_map_header(len(obj))
+        for key, value in obj.items():
+            yield packer.pack(key)
+            yield from _iter_msgpack(value, packer, use_bin_type,
+                                     encode_type)
+    elif isinstance(obj, (list, tuple)):
+        yield packer.pack_array_header(len(obj))
+        for value in obj:
+            yield from _iter_msgpack(value, packer, use_bin_type,
+                                     encode_type)
+    elif use_bin_type and isinstance(obj, (bytes, bytearray, memoryview)):
+        obj = memoryview(obj).cast('B')
+        yield _bin_header(obj.nbytes)
+        yield obj
+    elif (encode_type is None or obj is None or
+          isinstance(obj, (str, int, float, bytes, bytearray, memoryview))):
+        yield packer.pack(obj)
+    else:
+        yield from _iter_msgpack(encode_type(obj), packer, use_bin_type,
+                                 encode_type)
+
+
+async def _write_pieces(writer, pieces, chunk_size):
+    # Writes the pieces in chunks of about `chunk_size` bytes.
+    buffer = bytearray()
+    for piece in pieces:
+        if len(piece) < chunk_size:
+            buffer += piece
+            if len(buffer) < chunk_size:
+                continue
+            piece = b''
+        if buffer:
+            writer.write(bytes(buffer))
+            buffer.clear()
+            await writer.drain()
+        for start in range(0, len(piece), chunk_size):
+            writer.write(piece[start:start + chunk_size])
+            await writer.drain()
+    if buffer:
+        writer.write(bytes(buffer))
+        await writer.drain()
+
+
+class StreamPacker(_StreamPacker):
+    """Writes MessagePack packed records to an `asyncio.StreamWriter`.
+
+    Takes the same keyword arguments as `serializers.pack()`.
+    """
+
+    def __init__(self, writer, chunk_size=CHUNK_SIZE, **kwargs):
+        super().__init__(writer, **kwargs)
+        self.writer = writer
+        self.chunk_size = chunk_size
+        self._use_bin_type = kwargs.get('use_bin_type', True)
+        self._encode_type = _type_encoder(
+            self.single_pass, self.type_coder_list, self.enable_pickle,
+            self.type_key, kwargs.get('default'))
+
+    async def pack(self, obj):
+        """Writes one record to the stream."""
+        if not self.single_pass:
+            obj = encode_types(obj, self.type_coder_list, self.enable_pickle,
+                               self.type_key, self.pack_homogeneous,
+                               self.preserve_tuples,
+                               track_refs=self.track_refs,
+                               record_batches=self.record_batches)
+        await _write_pieces(
+            self.writer, _iter_msgpack(obj, self._packer, self._use_bin_type,
+                                       self._encode_type),
+            self.chunk_size)
+
+
+async def iter_unpack(reader,
+                      enable_pickle=ENABLE_PICKLE,
+                      type_coder_list=TYPE_CODER_LIST,
+                      type_key=TYPE_KEY,
+                      encoding='utf-8',
+                      single_pass=SINGLE_PASS,
+                      workers=None,
+                      executor=None,
+                      homogeneous_as_array=False,
+                      records_as='rows',
+                      chunk_size=CHUNK_SIZE,
+                      **kwargs):
+    """Yields the records of a MessagePack stream from an
+    `asyncio.StreamReader` with types decoded, until the end of the
+    stream. Further keyword arguments are passed to the msgpack
+    `Unpacker`; `max_buffer_size`, the maximum size of a record, is
+    2 GB by default.
+    """
+    type_coder_list = _configure(type_coder_list, executor=executor,
+                                 workers=workers,
+                                 homogeneous_as_array=homogeneous_as_array,
+                                 records_as=records_as)
+    if single_pass:
+        kwargs['object_hook'] = _type_decoder(type_coder_list, enable_pickle,
+                                              type_key)
+    kwargs.setdefault('max_buffer_size', 2 ** 31 - 1)
+    unpacker = _msgpack.Unpacker(encoding=encoding, **kwargs)
+    while True:
+        data = await reader.read(chunk_size)
+        if not data:
+            break
+        unpacker.feed(data)
+        for obj in unpacker:
+            if single_pass:
+                yield obj
+            else:
+                yield decode_types(obj, type_coder_list, enable_pickle,
+                                   type_key, in_place=True)
+
+
+class StreamDumper(_StreamDumper):
+    """Writes JSON records to an `asyncio.StreamWriter`, one per line.
+
+    Takes the same keyword arguments as `serializers.dump()`.
+    """
+
+    def __init__(self, writer, chunk_size=CHUNK_SIZE, **kwargs):
+        super().__init__(writer, **kwargs)
+        self.writer = writer
+        self.chunk_size = chunk_size
+
+    async def dump(self, obj):
+        """Writes one record to the stream."""
+        if not self.single_pass:
+            obj = encode_types(obj, self.type_coder_list, self.enable_pickle,
+                               self.type_key, self.pack_homogeneous,
+                               self.preserve_tuples,
+                               track_refs=self.track_refs,
+                               record_batches=self.record_batches)
+        pieces = (piece.encode() for piece in self._encoder.iterencode(obj))
+        await _write_pieces(self.writer, _chain(pieces, (b'\n',)),
+                            self.chunk_size)
+
+
+async def iter_load(reader,
+                    enable_pickle=ENABLE_PICKLE,
+                    type_coder_list=TYPE_CODER_LIST,
+                    type_key=TYPE_KEY,
+                    single_pass=SINGLE_PASS,
+                    workers=None,
+                    executor=None,
+                    homogeneous_as_array=False,
+                    records_as='rows',
+                    chunk_size=CHUNK_SIZE):
+    """Yields the records of a line-delimited JSON stream from an
+    `asyncio.StreamReader` with types decoded, until the end of the
+    stream. Lines are not limited in length.
+    """
+    type_coder_list = _configure(type_coder_list, executor=executor,
+                                 workers=workers,
+                                 homogeneous_as_array=homogeneous_as_array,
+                                 records_as=records_as)
+    buffer = bytearray()
+    while True:
+        data = await reader.read(chunk_size)
+        # Only the received data is searched for line ends:
+        end = data.rfind(b'\n')
+        if end >= 0 or not data:
+            lines = buffer + data[:end + 1] if data else buffer
+            buffer = bytearray(data[end + 1:]) if data else bytearray()
+            for line in bytes(lines).split(b'\n'):
+                if line.strip():
+                    yield _loads_json(_json.loads, line.decode(),
+                                      enable_pickle, type_coder_list,
+                                      type_key, single_pass)
+        else:
+            buffer += data
+        if not data:
+            break
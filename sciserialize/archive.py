@@ -0,0 +1,267 @@
+# -- coding: utf-8 --
+"""
+Archives of many MessagePack records with random access.
+
+An archive file holds records, that are appended one after another,
+and an index behind them. The index stores the key, offset, length and
+typestr of every record, so a single record is read and decoded without
+reading the records before it:
+
+```python
+with archive.Archive('results.sca', 'w') as a:
+    for name, result in experiments:
+        a.append(result, key=name)
+
+with archive.Archive('results.sca') as a:
+    result = a['run-042']     # by key
+    first = a[0]              # by position
+    for key, result in a.scan('run-010', 'run-020'):
+        ...
+```
+
+Layout: magic, records, index, trailer. The index is MessagePack, the
+trailer holds its offset and length. Opening with mode 'a' reads the
+index, new records overwrite it and the index is written again when the
+archive is closed. An archive, that was not closed, has no valid index.
+"""
+import os as _os
+import struct as _struct
+
+import msgpack as _msgpack
+
+from .coders import encode_types, decode_types, TYPE_CODER_LIST, TYPE_KEY
+from .serializers import _configure, _default_msgpack, ENABLE_PICKLE
+
+
+ARCHIVE_MAGIC = b'SCISERA\x01'
+_TRAILER = _struct.Struct('<QQ8s')
+
+
+def _typestr(obj, encoded, type_key):
+    # The typestr of a record for the index.
+    if isinstance(encoded, dict) and type_key in encoded:
+        return encoded[type_key]
+    return type(obj).__name__
+
+
+class Archive:
+    """Archive file at `path` with records addressed by position or key.
+
+    `mode` is 'r' (read), 'w' (create or truncate) or 'a' (append to an
+    existing archive or create it). Keys are strings and unique. The
+    other keyword arguments are the same as of `serializers.packb()`
+    and `serializers.unpackb()`.
+    """
+
+    def __init__(self,
+                 path,
+                 mode='r',
+                 enable_pickle=ENABLE_PICKLE,
+                 type_coder_list=TYPE_CODER_LIST,
+                 type_key=TYPE_KEY,
+                 compression=None,
+                 workers=None,
+                 executor=None,
+                 pack_homogeneous=False,
+                 preserve_tuples=False,
+                 track_refs=False,
+                 record_batches=False,
+                 homogeneous_as_array=False,
+                 records_as='rows'):
+        if mode not in ('r', 'w', 'a'):
+            raise ValueError('Unknown mode {!r}.'.format(mode))
+        self.path = path
+        self.mode = mode
+        self.enable_pickle = enable_pickle
+        self.type_key = type_key
+        self.pack_homogeneous = pack_homogeneous
+        self.preserve_tuples = preserve_tuples
+        self.track_refs = track_refs
+        self.record_batches = record_batches
+        self._encoders = _configure(type_coder_list, compression, executor,
+                                    workers)
+        self._decoders = _configure(type_coder_list, executor=executor,
+                                    workers=workers,
+                                    homogeneous_as_array=homogeneous_as_array,
+                                    records_as=records_as)
+        self._keys = []
+        self._offsets = []
+        self._lengths = []
+        self._typestrs = []
+        self._positions = {}
+        self._buffered = False
+        if mode == 'a' and not _os.path.exists(path):
+            mode = 'w'
+        self.fp = open(path, {'r': 'rb', 'w': 'w+b', 'a': 'r+b'}[mode])
+        try:
+            if mode == 'w':
+                self.fp.write(ARCHIVE_MAGIC)
+                self._end = len(ARCHIVE_MAGIC)
+            else:
+                self._read_index()
+        except BaseException:
+            self.fp.close()
+            raise
+        self._modified = mode == 'w'
+
+    def _read(self, offset, length):
+        if self._buffered:
+            # `pread` reads the file, not the write buffer of `fp`:
+            self.fp.flush()
+            self._buffered = False
+        data = _os.pread(self.fp.fileno(), length, offset)
+        if len(data) != length:
+            raise ValueError('Archive file {!r} is truncated.'.format(
+                self.path))
+        return data
+
+    def _read_index(self):
+        size = _os.fstat(self.fp.fileno()).st_size
+        if (size < len(ARCHIVE_MAGIC) + _TRAILER.size or
+                self._read(0, len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC):
+            raise ValueError('Not a sciserialize archive file.')
+        index_offset, index_length, magic = _TRAILER.unpack(
+            self._read(size - _TRAILER.size, _TRAILER.size))
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError('Archive file {!r} has no index, it was not '
+                             'closed.'.format(self.path))
+        index = _msgpack.unpackb(self._read(index_offset, index_length),
+                                 encoding='utf-8')
+        self._keys = index['keys']
+        self._offsets = index['offsets']
+        self._lengths = index['lengths']
+        self._typestrs = index['typestrs']
+        self._positions = {key: position
+                           for position, key in enumerate(self._keys)
+                           if key is not None}
+        self._end = index_offset
+
+    def _write_index(self):
+        index = _msgpack.packb({'keys': self._keys,
+                                'offsets': self._offsets,
+                                'lengths': self._lengths,
+                                'typestrs': self._typestrs},
+                               use_bin_type=True)
+        self.fp.seek(self._end)
+        self.fp.write(index)
+        self.fp.write(_TRAILER.pack(self._end, len(index), ARCHIVE_MAGIC))
+        self.fp.truncate()
+
+    def append(self, obj, key=None):
+        """Appends a record, optionally under a key. Returns its position.
+        """
+        if self.mode == 'r':
+            raise ValueError('Archive is opened read-only.')
+        if key is not None:
+            if not isinstance(key, str):
+                raise TypeError('Keys have to be strings, not {}.'.format(
+                    type(key).__name__))
+            if key in self._positions:
+                raise KeyError('Duplicate key {!r}.'.format(key))
+        encoded = encode_types(obj, self._encoders, self.enable_pickle,
+                               self.type_key, self.pack_homogeneous,
+                               self.preserve_tuples,
+                               track_refs=self.track_refs,
+                               record_batches=self.record_batches)
+        data = _msgpack.packb(encoded, use_bin_type=True,
+                              default=_default_msgpack())
+        self.fp.seek(self._end)
+        self.fp.write(data)
+        self._modified = True
+        self._buffered = True
+        position = len(self._keys)
+        self._keys.append(key)
+        self._offsets.append(self._end)
+        self._lengths.append(len(data))
+        self._typestrs.append(_typestr(obj, encoded, self.type_key))
+        if key is not None:
+            self._positions[key] = position
+        self._end += len(data)
+        return position
+
+    def position(self, key):
+        """Returns the position of the record with `key`."""
+        return self._positions[key]
+
+    def _record(self, position):
+        data = _msgpack.unpackb(self._read(self._offsets[position],
+                                           self._lengths[position]),
+                                encoding='utf-8')
+        return decode_types(data, self._decoders, self.enable_pickle,
+                            self.type_key, in_place=True)
+
+    def _resolve(self, item):
+        # Returns the position of a record by position or key.
+        if isinstance(item, str):
+            return self._positions[item]
+        return range(len(self._keys))[item]
+
+    def __getitem__(self, item):
+        """Returns the record at a position, with a key or the records of
+        a slice of positions."""
+        if isinstance(item, slice):
+            return [self._record(position)
+                    for position in range(len(self._keys))[item]]
+        return self._record(self._resolve(item))
+
+    def get(self, key, default=None):
+        """Returns the record with `key` or `default`."""
+        if key not in self._positions:
+            return default
+        return self._record(self._positions[key])
+
+    def scan(self, start=None, stop=None):
+        """Yields `(key, record)` for the records from `start` up to
+        `stop` (excluded), both positions or keys."""
+        start = 0 if start is None else self._resolve(start)
+        stop = len(self._keys) if stop is None else (
+            self._resolve(stop) if isinstance(stop, str) else stop)
+        for position in range(start, min(stop, len(self._keys))):
+            yield self._keys[position], self._record(position)
+
+    def keys(self):
+        """Returns the keys of the records, None for records without key.
+        """
+        return list(self._keys)
+
+    def typestr(self, item):
+        """Returns the typestr of a record by position or key."""
+        return self._typestrs[self._resolve(item)]
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        for position in range(len(self._keys)):
+            yield self._record(position)
+
+    def flush(self):
+        """Writes the index, so the archive is valid without closing it.
+        """
+        if self._modified:
+            self._write_index()
+            self.fp.flush()
+            self._modified = False
+            self._buffered = False
+
+    def close(self):
+        """Writes the index and closes the file."""
+        if self.fp.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return '{}({!r}, mode={!r}, records={})'.format(
+            self.__class__.__name__, self.path, self.mode, len(self))
@@ -0,0 +1,239 @@
+# -- coding: utf-8 --
+"""
+Persistent memoization cache in a directory.
+
+Results are stored as container files (see `serializers.dump_container`)
+named by a stable hash of the arguments. The hash is computed from the
+encoded arguments, so numpy arrays, DataFrames, sets, datetimes and all
+other supported types are hashed by their content:
+
+```python
+cache = Cache('~/.cache/analysis', max_size=10 * 2 ** 30)
+
+@cache.memoize
+def spectrum(signal, window='hann'):
+    ...
+```
+
+Arrays of cached results are memory mapped views of the files. Files are
+written to a temporary file first and renamed, so processes sharing the
+directory never read incomplete entries. When the size of the directory
+exceeds `max_size`, the least recently used entries are removed.
+"""
+import functools as _functools
+import hashlib as _hashlib
+import os as _os
+import struct as _struct
+import tempfile as _tempfile
+
+import msgpack as _msgpack
+
+from .coders import encode_types, TYPE_CODER_LIST, TYPE_KEY
+from .serializers import dump_container, load_container, ENABLE_PICKLE
+
+
+SUFFIX = '.scs'
+
+
+def _canonical(data, type_key):
+    # Returns bytes, that are equal for equal encoded data. Dict items
+    # and set items are sorted, buffers are replaced by their hash.
+    if isinstance(data, dict):
+        if data.get(type_key) == 'unique_set':
+            # The order of set items depends on the hash seed:
+            items = sorted(_canonical(item, type_key)
+                           for item in data['set'])
+            tag, body = b's', b''.join(items)
+        else:
+            tag, body = b'd', b''.join(sorted(
+                _canonical(key, type_key) + _canonical(value, type_key)
+                for key, value in data.items()))
+    elif isinstance(data, (list, tuple)):
+        tag, body = b'l', b''.join(_canonical(item, type_key)
+                                   for item in data)
+    elif isinstance(data, (bytes, bytearray, memoryview)):
+        tag, body = b'b', _hashlib.blake2b(data).digest()
+    else:
+        tag, body = b'v', _msgpack.packb(data, use_bin_type=True)
+    return _struct.pack('<cQ', tag, len(body)) + body
+
+
+def hash_key(obj,
+             enable_pickle=ENABLE_PICKLE,
+             type_coder_list=TYPE_CODER_LIST,
+             type_key=TYPE_KEY):
+    """Returns a hex digest of the content of `obj`, that is stable
+    across processes. Tuples and lists have different keys.
+    """
+    encoded = encode_types(obj, type_coder_list, enable_pickle, type_key,
+                           preserve_tuples=True)
+    return _hashlib.blake2b(_canonical(encoded, type_key),
+                            digest_size=20).hexdigest()
+
+
+class Cache:
+    """Mapping of keys to results stored in `directory`.
+
+    Keys are strings like those of `hash_key()`. With `max_size` (bytes)
+    the least recently used entries are removed after storing a result,
+    until the directory is smaller. `hits`, `misses` and `evictions`
+    count the lookups and removals of this instance. The other keyword
+    arguments are the same as of `serializers.dump_container()` and
+    `serializers.load_container()`.
+    """
+
+    def __init__(self,
+                 directory,
+                 max_size=None,
+                 enable_pickle=ENABLE_PICKLE,
+                 type_coder_list=TYPE_CODER_LIST,
+                 type_key=TYPE_KEY,
+                 compression=None,
+                 mode='c'):
+        self.directory = _os.path.expanduser(directory)
+        self.max_size = max_size
+        self.enable_pickle = enable_pickle
+        self.type_coder_list = type_coder_list
+        self.type_key = type_key
+        self.compression = compression
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        _os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return _os.path.join(self.directory, key + SUFFIX)
+
+    def key(self, *args, **kwargs):
+        """Returns the key of the arguments."""
+        return hash_key([args, sorted(kwargs.items())], self.enable_pickle,
+                        self.type_coder_list, self.type_key)
+
+    def get(self, key, default=None):
+        """Returns the result of `key` or `default`."""
+        try:
+            fp = open(self._path(key), 'rb')
+        except FileNotFoundError:
+            self.misses += 1
+            return default
+        with fp:
+            value = load_container(fp, self.enable_pickle,
+                                   self.type_coder_list, self.type_key,
+                                   self.mode)
+        self.hits += 1
+        try:
+            # The modification time orders the entries by last use:
+            _os.utime(self._path(key))
+        except FileNotFoundError:
+            pass
+        return value
+
+    def __getitem__(self, key):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        fd, temp_path = _tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with open(fd, 'wb') as fp:
+                dump_container(value, fp, self.enable_pickle,
+                               self.type_coder_list, self.type_key,
+                               compression=self.compression)
+            _os.replace(temp_path, self._path(key))
+        except BaseException:
+            _os.unlink(temp_path)
+            raise
+        if self.max_size is not None:
+            self.evict(self.max_size)
+
+    def __delitem__(self, key):
+        try:
+            _os.unlink(self._path(key))
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return _os.path.exists(self._path(key))
+
+    def _entries(self):
+        # Returns (mtime, size, path) of the entries.
+        entries = []
+        for entry in _os.scandir(self.directory):
+            if entry.name.endswith(SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def keys(self):
+        """Returns the keys of the stored results."""
+        return [_os.path.basename(path)[:-len(SUFFIX)]
+                for _, _, path in self._entries()]
+
+    def __len__(self):
+        return len(self._entries())
+
+    def size(self):
+        """Returns the size of the stored results in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_size):
+        """Removes the least recently used results, until the size of the
+        directory is at most `max_size`. Returns the number removed.
+        """
+        entries = sorted(self._entries())
+        size = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, entry_size, path in entries:
+            if size <= max_size:
+                break
+            try:
+                _os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        self.evictions += removed
+        return removed
+
+    def clear(self):
+        """Removes all results."""
+        self.evict(-1)
+
+    def stats(self):
+        """Returns a dict of the hits, misses and evictions."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions}
+
+    def memoize(self, function=None, name=None):
+        """Decorator caching the results of a function by its arguments.
+
+        The results are stored under the key of `name` (by default the
+        qualified name of the function) and the arguments.
+        """
+        if function is None:
+            return _functools.partial(self.memoize, name=name)
+        if name is None:
+            name = '{}.{}'.format(function.__module__, function.__qualname__)
+        missing = object()
+
+        @_functools.wraps(function)
+        def memoized(*args, **kwargs):
+            key = self.key(name, *args, **kwargs)
+            value = self.get(key, missing)
+            if value is missing:
+                value = function(*args, **kwargs)
+                self[key] = value
+            return value
+        memoized.cache = self
+        return memoized
+
+    def __repr__(self):
+        return '{}({!r}, max_size={!r})'.format(
+            self.__class__.__name__, self.directory, self.max_size)
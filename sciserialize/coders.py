@@ -1,10 +1,24 @@
 # -- coding: utf-8 --
 import warnings as _warnings
 import pickle as _pickle
+import copy as _copy
+import sys as _sys
+import importlib as _importlib
+import hashlib as _hashlib
+from collections.abc import MutableMapping as _MutableMapping
+from collections.abc import MutableSequence as _MutableSequence
+
+from . import compression as _compression
 
 
 TYPE_KEY = '__type__'
 PYPICKLE_TYPE_NAME = 'pypickle'
+TUPLE_TYPE_NAME = 'tuple'
+TYPED_LIST_TYPE_NAME = 'typed_list'
+RECORD_BATCH_TYPE_NAME = 'record_batch'
+HOMOGENEOUS_MIN_LENGTH = 16
+SHARED_TYPE_NAME = 'shared'
+REF_TYPE_NAME = 'ref'
 
 
 # Define type coders that allow to encode and decode
@@ -22,9 +36,58 @@ PYPICKLE_TYPE_NAME = 'pypickle'
 # (For instance JSON has no binary type so bytes need to be converted
 # to base64 strings)
 
+# Coders for types of heavy packages like numpy and pandas import them
+# lazily, so `import sciserialize` stays cheap. Their class attributes are
+# `_LazyImport`s, that import on first access, and they set `type_name`
+# to the qualified name of their type. The `TypeCoderRegistry` uses such
+# coders for encoding only after the module of the type was imported
+# elsewhere; an object of the type cannot exist before. Decoding imports
+# the module on the first typestr of the coder.
+
+class _LazyImport:
+    """Class attribute, that imports `module` on first access.
+
+    Returns the attribute `name` of the module, if `name` is given.
+    """
+
+    def __init__(self, module, name=None):
+        self.module = module
+        self.name = name
+
+    def __get__(self, obj, cls=None):
+        try:
+            return self._value
+        except AttributeError:
+            value = _importlib.import_module(self.module)
+            if self.name is not None:
+                value = getattr(value, self.name)
+            self._value = value
+            return value
+
+
+def _import_type(type_name):
+    # Returns the type of a qualified name like 'numpy.ndarray'.
+    module, name = type_name.rsplit('.', 1)
+    return getattr(_importlib.import_module(module), name)
+
+
+def _is_imported(type_name):
+    # Returns True if the module of a qualified type name is imported.
+    return type_name.rsplit('.', 1)[0] in _sys.modules
+
+
 class TypeCoder:
     type_ = None  # This is the  datatype of the environment
+    # Qualified name of `type_` for lazy registration, like 'numpy.ndarray':
+    type_name = None
     typestr = None  # This is the identification string in serialized data
+    options = ()  # Names of the attributes that can be set by `configure()`
+    # If the decoded object is a container, its content is decoded again
+    # by `decode_types()`, if `redecode` is True:
+    redecode = True
+    # If `decode_content` is True, `decode_types()` decodes the values of
+    # the encoded dict before the coder, like single pass decoders do:
+    decode_content = False
 
     def verify_type(self, obj):
         """Returns a boolean if `type_` ist an instance of `self.type_`.
@@ -44,6 +107,16 @@ class TypeCoder:
         # environment specific data type.
         pass
 
+    def configure(self, **options):
+        """Returns a copy of the coder with the given options set.
+        Options, that are not in `self.options` are ignored.
+        """
+        coder = _copy.copy(self)
+        for name, value in options.items():
+            if name in self.options:
+                setattr(coder, name, value)
+        return coder
+
     def __repr__(self):
         return str(self.__class__)
 
@@ -60,9 +133,28 @@ class SetCoder(TypeCoder):
         return set(data['set'])
 
 
+class TupleCoder(TypeCoder):
+    """Coder for tuples, used by `encode_types()` with
+    `preserve_tuples=True`. By default tuples are encoded as lists.
+    """
+    type_ = tuple
+    typestr = TUPLE_TYPE_NAME
+
+    def encode(self, obj):
+        return {TYPE_KEY: self.typestr,
+                'items': list(obj)}
+
+    def decode(self, data):
+        return tuple(data['items'])
+
+
 class DateTimeIsoStringCoder(TypeCoder):
+    """Coder for datetimes as ISO 8601 strings.
+
+    Decoding uses the fast `datetime.fromisoformat()` and falls back to
+    `dateutil.parser` for strings it does not accept.
+    """
     from datetime import datetime
-    import dateutil.parser
     type_ = datetime
     typestr = 'datetime'
 
@@ -71,7 +163,57 @@ class DateTimeIsoStringCoder(TypeCoder):
                 'isostr': self.datetime.isoformat(obj)}
 
     def decode(self, data):
-        return self.dateutil.parser.parse(data['isostr'])
+        try:
+            return self.datetime.fromisoformat(data['isostr'])
+        except ValueError:
+            import dateutil.parser
+            return dateutil.parser.parse(data['isostr'])
+
+
+class DateTimeEpochCoder(TypeCoder):
+    """Coder for datetimes as integer time since the epoch.
+
+    `epoch` counts `unit`s ('s', 'ms', 'us' or 'ns') since 1970-01-01
+    UTC, or since 1970-01-01 local time for naive datetimes. `tz` is the
+    IANA name of a `zoneinfo` timezone or the UTC offset in seconds.
+    Datetimes are encoded with microseconds.
+    This coder is not used for encoding by default; put it in front of
+    the `DateTimeIsoStringCoder` in the coder list to use it.
+    """
+    from datetime import datetime, timedelta, timezone
+    type_ = datetime
+    typestr = 'datetime_epoch'
+    units = {'s': 10 ** 6, 'ms': 10 ** 3, 'us': 1}
+
+    def encode(self, obj):
+        offset = obj.utcoffset()
+        epoch = obj.replace(tzinfo=None) - self.datetime(1970, 1, 1)
+        tz = None
+        if offset is not None:
+            epoch -= offset
+            tz = getattr(obj.tzinfo, 'key', None)
+            if tz is None:
+                tz = int(offset.total_seconds())
+        return {TYPE_KEY: self.typestr,
+                'epoch': epoch // self.timedelta(microseconds=1),
+                'unit': 'us',
+                'tz': tz}
+
+    def decode(self, data):
+        if data['unit'] == 'ns':
+            microseconds = data['epoch'] // 1000
+        else:
+            microseconds = data['epoch'] * self.units[data['unit']]
+        obj = self.datetime(1970, 1, 1) + self.timedelta(
+            microseconds=microseconds)
+        tz = data.get('tz')
+        if tz is None:
+            return obj
+        obj = obj.replace(tzinfo=self.timezone.utc)
+        if isinstance(tz, str):
+            import zoneinfo
+            return obj.astimezone(zoneinfo.ZoneInfo(tz))
+        return obj.astimezone(self.timezone(self.timedelta(seconds=tz)))
 
 
 class TimeDeltaCoder(TypeCoder):
@@ -90,78 +232,669 @@ class TimeDeltaCoder(TypeCoder):
 
 
 class NumpyArrayCoder(TypeCoder):
-    from numpy import ndarray, frombuffer, array
-    type_ = ndarray
+    """Coder for numpy arrays.
+
+    The array bytes are encoded as memoryview of the array itself, they
+    are only copied if the array is not C-contiguous.
+    Decoded arrays are views of the received buffer. They are read-only
+    if the buffer is immutable, like the bytes returned by msgpack, and
+    writable if the buffer is, for instance a `bytearray` owned by the
+    caller. With `writable=True` read-only buffers are copied, at the
+    cost of a second copy of the array data in memory.
+    With `compression` settings (see `compression.get_compression()`)
+    the bytes are encoded as list of compressed chunks. If an `executor`
+    (like `concurrent.futures.ThreadPoolExecutor`) is given, the chunks
+    are compressed and decompressed in parallel.
+    """
+    frombuffer = _LazyImport('numpy', 'frombuffer')
+    array = _LazyImport('numpy', 'array')
+    ascontiguousarray = _LazyImport('numpy', 'ascontiguousarray')
+    uint8 = _LazyImport('numpy', 'uint8')
+    dtype = _LazyImport('numpy', 'dtype')
+    type_ = _LazyImport('numpy', 'ndarray')
+    type_name = 'numpy.ndarray'
     typestr = 'ndarray'
+    options = ('writable', 'compression', 'executor')
+
+    def __init__(self, writable=False, compression=None, executor=None):
+        self.writable = writable
+        self.compression = _compression.get_compression(compression)
+        self.executor = executor
+
+    def _map(self, function, iterable):
+        if self.executor is None:
+            return map(function, iterable)
+        return self.executor.map(function, iterable)
+
+    def to_buffer(self, obj):
+        """Returns a byte memoryview of the array data."""
+        return memoryview(
+            self.ascontiguousarray(obj).reshape(-1).view(self.uint8))
+
+    def from_buffer(self, buffer, dtype, shape):
+        """Returns an array of the buffer data."""
+        array = self.frombuffer(buffer, dtype=dtype).reshape(shape)
+        if self.writable and not array.flags.writeable:
+            return array.copy()
+        return array
 
     def encode(self, obj):
         if obj.dtype == object:
             data = encode_types(obj.tolist())
+        elif self.compression is not None:
+            return self.encode_compressed(obj)
         else:
-            data = bytearray(obj.data)
+            data = self.to_buffer(obj)
         return {TYPE_KEY: self.typestr,
                 'dtype': str(obj.dtype),
                 'shape': [int(sh) for sh in obj.shape],
                 'bytes': data}
 
+    def encode_compressed(self, obj):
+        chunks, sizes = _compression.compress(
+            self.to_buffer(obj), obj.dtype.itemsize, self.compression,
+            self._map)
+        return {TYPE_KEY: self.typestr,
+                'dtype': str(obj.dtype),
+                'shape': [int(sh) for sh in obj.shape],
+                'compression': {'codec': self.compression.codec,
+                                'shuffle': self.compression.shuffle,
+                                'sizes': sizes},
+                'chunks': chunks}
+
     def decode(self, data):
         if data['dtype'] == 'object':
             return self.array(decode_types(data['bytes']),
                               dtype=data['dtype']).reshape(data['shape'])
+        elif 'chunks' in data:
+            return self.decode_compressed(data)
         else:
-            return self.frombuffer(data['bytes'],
-                                   dtype=data['dtype']).reshape(data['shape'])
+            return self.from_buffer(data['bytes'], data['dtype'],
+                                    data['shape'])
+
+    def decode_compressed(self, data):
+        compression = data['compression']
+        buffer = _compression.decompress(
+            data['chunks'], compression['sizes'],
+            self.dtype(data['dtype']).itemsize,
+            compression['codec'], compression['shuffle'], self._map)
+        return self.from_buffer(buffer, data['dtype'], data['shape'])
+
+
+class NumpyDateTime64Coder(TypeCoder):
+    """Coder for numpy datetime64 scalars as int64 and dtype.
+
+    Arrays of datetime64 are encoded by the `NumpyArrayCoder` as raw
+    int64 buffers with their dtype.
+    """
+    array = _LazyImport('numpy', 'array')
+    type_ = _LazyImport('numpy', 'datetime64')
+    type_name = 'numpy.datetime64'
+    typestr = 'datetime64'
+
+    def encode(self, obj):
+        return {TYPE_KEY: self.typestr,
+                'dtype': str(obj.dtype),
+                'value': int(obj.view('int64'))}
+
+    def decode(self, data):
+        return self.array(data['value'], 'int64').view(data['dtype'])[()]
+
+
+class NumpyTimeDelta64Coder(NumpyDateTime64Coder):
+    """Coder for numpy timedelta64 scalars as int64 and dtype."""
+    type_ = _LazyImport('numpy', 'timedelta64')
+    type_name = 'numpy.timedelta64'
+    typestr = 'timedelta64'
+
+
+class TypedListCoder(TypeCoder):
+    """Coder for homogeneous lists and tuples of ints, floats or bools.
+
+    Used by `encode_types()` with `pack_homogeneous`. The items are
+    encoded as typed buffer by the `NumpyArrayCoder`. They are decoded
+    to a list (or tuple), or to an array with `as_array=True`.
+    """
+    numpy = _LazyImport('numpy')
+    type_ = None  # Lists are not dispatched by type, see `encode_types()`
+    typestr = TYPED_LIST_TYPE_NAME
+    options = ('as_array',)
+    redecode = False
+    dtypes = {float: 'float64', int: 'int64', bool: 'bool'}
+
+    def __init__(self, as_array=False, writable=False, compression=None,
+                 executor=None):
+        self.as_array = as_array
+        self.ndarray_coder = NumpyArrayCoder(writable, compression, executor)
+
+    def configure(self, **options):
+        coder = TypeCoder.configure(self, **options)
+        coder.ndarray_coder = self.ndarray_coder.configure(**options)
+        return coder
+
+    def encode_homogeneous(self, obj, preserve_tuples=False):
+        """Returns the encoded list or None if it is not homogeneous.
+
+        Tuples are marked to be decoded as tuples with `preserve_tuples`.
+        """
+        types = set(map(type, obj))
+        if len(types) != 1:
+            return None
+        dtype = self.dtypes.get(types.pop())
+        if dtype is None:
+            return None
+        try:
+            return self.encode(self.numpy.array(obj, dtype=dtype),
+                               preserve_tuples and isinstance(obj, tuple))
+        except OverflowError:
+            return None
+
+    def encode(self, obj, is_tuple=False):
+        d = self.ndarray_coder.encode(self.numpy.asarray(obj))
+        d[TYPE_KEY] = self.typestr
+        d['tuple'] = is_tuple
+        return d
+
+    def decode(self, data):
+        array = self.ndarray_coder.decode(data)
+        if self.as_array:
+            return array
+        elif data.get('tuple'):
+            return tuple(array.tolist())
+        return array.tolist()
+
+
+class RecordBatchCoder(TypeCoder):
+    """Coder for lists of dicts with the same keys (records).
+
+    Used by `encode_types()` with `record_batches`. The keys are encoded
+    once and the values column by column. Columns of only ints, only
+    floats or only bools are encoded as typed buffers by the
+    `TypedListCoder`. The records are decoded to a list of dicts, or
+    with `records_as='arrays'` to a dict of numpy arrays and with
+    `records_as='dataframe'` to a pandas DataFrame. Columns, that are no
+    typed buffers, become object arrays. The keys are kept as they are,
+    so with JSON non-string keys round-trip unchanged here, while JSON
+    converts them to strings in ordinary dicts.
+    """
+    numpy = _LazyImport('numpy')
+    pandas = _LazyImport('pandas')
+    type_ = None  # Lists are not dispatched by type, see `encode_types()`
+    typestr = RECORD_BATCH_TYPE_NAME
+    options = ('records_as',)
+    redecode = False
+    decode_content = True
+
+    def __init__(self, records_as='rows', writable=False, compression=None,
+                 executor=None):
+        self.records_as = records_as
+        self.typed_list_coder = TypedListCoder(False, writable, compression,
+                                               executor)
+
+    def configure(self, **options):
+        coder = TypeCoder.configure(self, **options)
+        coder.typed_list_coder = self.typed_list_coder.configure(**options)
+        return coder
+
+    def encode_records(self, obj, encode_column=None, typed_list_coder=None):
+        """Returns the encoded records or None if `obj` is no list of
+        dicts with the same keys. See `encode()` for the arguments.
+        """
+        if not obj or type(obj[0]) is not dict:
+            return None
+        keys = obj[0].keys()
+        for record in obj:
+            if type(record) is not dict or record.keys() != keys:
+                return None
+        # Called through the instance, so coders instrumented by
+        # `stats.Stats` record the call:
+        return self.encode(obj, encode_column, typed_list_coder)
+
+    def encode(self, obj, encode_column=None, typed_list_coder=None):
+        # Columns, that are not typed buffers, are encoded by
+        # `encode_column` (`encode_types()` by default), typed buffers by
+        # `typed_list_coder` (the own `TypedListCoder` by default).
+        encode_column = encode_column or encode_types
+        typed_list_coder = typed_list_coder or self.typed_list_coder
+        keys = obj[0].keys() if obj else ()
+        columns = []
+        for key in keys:
+            column = [record[key] for record in obj]
+            encoded = typed_list_coder.encode_homogeneous(column)
+            columns.append(encode_column(column) if encoded is None
+                           else encoded)
+        return {TYPE_KEY: self.typestr,
+                'keys': list(keys),
+                'length': len(obj),
+                'columns': columns}
+
+    def _array(self, column):
+        # Typed buffers become arrays of their dtype, all other columns
+        # 1-D object arrays with one value per record, even if the values
+        # are lists or strings.
+        if isinstance(column, self.numpy.ndarray):
+            return column
+        types = set(map(type, column))
+        dtype = (self.typed_list_coder.dtypes.get(types.pop())
+                 if len(types) == 1 else None)
+        if dtype is not None:
+            try:
+                return self.numpy.array(column, dtype=dtype)
+            except OverflowError:
+                pass
+        array = self.numpy.empty(len(column), object)
+        array[:] = column
+        return array
+
+    def decode(self, data):
+        keys = data['keys']
+        columns = data['columns']
+        if self.records_as == 'arrays':
+            return {key: self._array(column)
+                    for key, column in zip(keys, columns)}
+        elif self.records_as == 'dataframe':
+            return self.pandas.DataFrame(
+                {key: self._array(column)
+                 for key, column in zip(keys, columns)},
+                index=self.pandas.RangeIndex(data['length']))
+        columns = [column.tolist() if hasattr(column, 'tolist') else column
+                   for column in columns]
+        if not keys:
+            return [{} for _ in range(data['length'])]
+        return [dict(zip(keys, values)) for values in zip(*columns)]
 
 
 class NumpyMaskedArrayCoder(TypeCoder):
-    from numpy.ma import masked_array
-    from numpy import frombuffer
-    import numpy
-    type_ = masked_array
+    """Coder for numpy masked arrays.
+
+    The data is encoded by the `NumpyArrayCoder`, the mask as bits packed
+    into bytes by `numpy.packbits()` and omitted if the array has no mask
+    (`numpy.ma.nomask`). Masks encoded as one byte per element by earlier
+    versions are decoded, too.
+    """
+    masked_array = _LazyImport('numpy.ma', 'masked_array')
+    numpy = _LazyImport('numpy')
+    type_ = _LazyImport('numpy.ma', 'MaskedArray')
+    type_name = 'numpy.ma.MaskedArray'
     typestr = 'maskedarray'
-    ndarray_coder = NumpyArrayCoder()
+
+    def __init__(self, writable=False, compression=None, executor=None):
+        self.ndarray_coder = NumpyArrayCoder(writable, compression, executor)
+
+    def configure(self, **options):
+        coder = _copy.copy(self)
+        coder.ndarray_coder = self.ndarray_coder.configure(**options)
+        return coder
 
     def encode(self, obj):
-        d = self.ndarray_coder.encode(obj)
+        d = self.ndarray_coder.encode(obj.data)
         d[TYPE_KEY] = self.typestr
-        d['mask_bytes'] = bytearray(obj.mask.data)
-        d['fill_value'] = self.numpy.asscalar(obj.fill_value)
+        if obj.mask is not self.numpy.ma.nomask:
+            d['mask_bits'] = memoryview(self.numpy.packbits(
+                self.numpy.ascontiguousarray(obj.mask).reshape(-1)))
+        d['fill_value'] = obj.fill_value.item()
         return d
 
+    def decode_mask(self, data):
+        """Returns the mask of an encoded masked array."""
+        if 'mask_bytes' in data:
+            # One byte per element, encoded by earlier versions:
+            return self.ndarray_coder.from_buffer(data['mask_bytes'], bool,
+                                                  data['shape'])
+        elif 'mask_bits' in data:
+            bits = self.numpy.frombuffer(data['mask_bits'], self.numpy.uint8)
+            size = int(self.numpy.prod(data['shape']))
+            return self.numpy.unpackbits(bits, count=size).view(
+                bool).reshape(data['shape'])
+        return self.numpy.ma.nomask
+
     def decode(self, data):
-        mask = self.frombuffer(data['mask_bytes'], dtype=bool)
         return self.masked_array(self.ndarray_coder.decode(data),
-                                 mask, fill_value=data['fill_value'])
+                                 self.decode_mask(data),
+                                 fill_value=data['fill_value'])
+
+
+class PandasIndexCoder(TypeCoder):
+    """Coder for pandas indexes.
+
+    The labels are encoded as array by the `NumpyArrayCoder`, with the
+    name of the index. `RangeIndex` is encoded by start, stop and step,
+    `DatetimeIndex` as int64 buffer with timezone and frequency,
+    `MultiIndex` by its levels and codes and `CategoricalIndex` by the
+    codes and the categories.
+    """
+    pandas = _LazyImport('pandas')
+    type_ = _LazyImport('pandas', 'Index')
+    type_name = 'pandas.Index'
+    typestr = 'pandas_index'
+
+    def __init__(self, writable=False, compression=None, executor=None):
+        self.ndarray_coder = NumpyArrayCoder(writable, compression, executor)
+
+    def configure(self, **options):
+        coder = _copy.copy(self)
+        coder.ndarray_coder = self.ndarray_coder.configure(**options)
+        return coder
+
+    def encode_array(self, array, tz=None):
+        """Returns the encoded representation of an array or
+        timezone aware datetimes, without type key.
+        """
+        if tz is not None:
+            array = array.asi8.view('datetime64[ns]')
+        d = self.ndarray_coder.encode(array)
+        # The arrays are part of an encoded index or frame. Without type
+        # key, they are not decoded before it by single pass decoders.
+        del d[TYPE_KEY]
+        if tz is not None:
+            d['tz'] = str(tz)
+        return d
+
+    def encode_categorical(self, categorical, dense=False):
+        """Returns the encoded representation of a categorical, without
+        type key: the codes as array and the categories as index. With
+        `dense=True` it is decoded to an array of the values.
+        """
+        d = {'codes': self.encode_array(categorical.codes),
+             'categories': self.encode_index(categorical.categories),
+             'ordered': bool(categorical.ordered)}
+        if dense:
+            d['dense'] = True
+        return d
+
+    def decode_categorical(self, data):
+        """Returns the categorical of an encoded representation."""
+        codes = self.decode_array(data['codes'])
+        categories = self.decode_index(data['categories'])
+        if data.get('dense'):
+            return categories.to_numpy().take(codes)
+        return self.pandas.Categorical.from_codes(
+            codes, categories=categories, ordered=data['ordered'])
+
+    def decode_array(self, data):
+        """Returns the array of an encoded representation."""
+        if 'categories' in data:
+            return self.decode_categorical(data)
+        array = self.ndarray_coder.decode(data)
+        if data.get('tz') is not None:
+            array = self.pandas.DatetimeIndex(array).tz_localize(
+                'UTC').tz_convert(data['tz']).array
+        return array
+
+    def encode_index(self, index):
+        """Returns the encoded representation of an index,
+        without type key.
+        """
+        if isinstance(index, self.pandas.MultiIndex):
+            return {'kind': 'multi',
+                    'names': encode_types(list(index.names)),
+                    'levels': [self.encode_index(level)
+                               for level in index.levels],
+                    'codes': [self.encode_array(codes)
+                              for codes in index.codes]}
+        elif isinstance(index, self.pandas.RangeIndex):
+            return {'kind': 'range',
+                    'name': encode_types(index.name),
+                    'start': index.start,
+                    'stop': index.stop,
+                    'step': index.step}
+        elif isinstance(index, self.pandas.CategoricalIndex):
+            return {'kind': 'categorical',
+                    'name': encode_types(index.name),
+                    'values': self.encode_categorical(index.array)}
+        elif isinstance(index, self.pandas.DatetimeIndex):
+            return {'kind': 'datetime',
+                    'name': encode_types(index.name),
+                    'values': self.encode_array(index, index.tz),
+                    'freq': index.freqstr}
+        return {'kind': 'index',
+                'name': encode_types(index.name),
+                'values': self.encode_array(index.to_numpy())}
+
+    def decode_index(self, data):
+        """Returns the index of an encoded representation."""
+        name = decode_types(data.get('name'))
+        if data['kind'] == 'multi':
+            return self.pandas.MultiIndex(
+                levels=[self.decode_index(level) for level in data['levels']],
+                codes=[self.decode_array(codes) for codes in data['codes']],
+                names=decode_types(data['names']))
+        elif data['kind'] == 'range':
+            return self.pandas.RangeIndex(data['start'], data['stop'],
+                                          data['step'], name=name)
+        elif data['kind'] == 'datetime':
+            return self.pandas.DatetimeIndex(
+                self.decode_array(data['values']), name=name,
+                freq=data['freq'])
+        elif data['kind'] == 'categorical':
+            return self.pandas.CategoricalIndex(
+                self.decode_categorical(data['values']), name=name)
+        return self.pandas.Index(self.decode_array(data['values']),
+                                 name=name)
+
+    def encode(self, obj):
+        d = self.encode_index(obj)
+        d[TYPE_KEY] = self.typestr
+        return d
+
+    def decode(self, data):
+        return self.decode_index(data)
+
+
+class PandasTimestampCoder(TypeCoder):
+    """Coder for pandas timestamps as nanoseconds since the epoch."""
+    Timestamp = _LazyImport('pandas', 'Timestamp')
+    type_ = Timestamp
+    type_name = 'pandas.Timestamp'
+    typestr = 'timestamp'
+
+    def encode(self, obj):
+        return {TYPE_KEY: self.typestr,
+                'value': obj.value,
+                'tz': None if obj.tz is None else str(obj.tz)}
+
+    def decode(self, data):
+        obj = self.Timestamp(data['value'])
+        if data['tz'] is not None:
+            obj = obj.tz_localize('UTC').tz_convert(data['tz'])
+        return obj
+
+
+class PandasCategoricalCoder(TypeCoder):
+    """Coder for pandas categoricals as codes and categories.
+
+    The codes are encoded as array of the smallest integer type, that
+    holds all codes, and every category is stored once.
+    """
+    type_ = _LazyImport('pandas', 'Categorical')
+    type_name = 'pandas.Categorical'
+    typestr = 'categorical'
+
+    def __init__(self, writable=False, compression=None, executor=None):
+        self.index_coder = PandasIndexCoder(writable, compression, executor)
+
+    def configure(self, **options):
+        coder = _copy.copy(self)
+        coder.index_coder = self.index_coder.configure(**options)
+        return coder
+
+    def encode(self, obj):
+        d = self.index_coder.encode_categorical(obj)
+        d[TYPE_KEY] = self.typestr
+        return d
+
+    def decode(self, data):
+        return self.index_coder.decode_categorical(data)
 
 
 class DataFrameCoder(TypeCoder):
-    from pandas import DataFrame
-    type_ = type(DataFrame())
+    """Coder for pandas DataFrames.
+
+    Every column is encoded as its own array by the `NumpyArrayCoder`,
+    so the dtypes of the columns are preserved and numeric columns are
+    stored as raw bytes. Index and column labels are encoded by the
+    `PandasIndexCoder`.
+    Categorical columns are encoded by their codes and categories. Object
+    columns of strings with at most `dictionary_ratio` times as many
+    distinct values as rows are encoded the same way and decoded as
+    object columns again. Set `dictionary_ratio` to 0 to disable it.
+    """
+    pandas = _LazyImport('pandas')
+    DataFrame = _LazyImport('pandas', 'DataFrame')
+    type_ = DataFrame
+    type_name = 'pandas.DataFrame'
     typestr = 'dataframe'
-    ndarray_coder = NumpyArrayCoder()
+
+    def __init__(self, writable=False, compression=None, executor=None,
+                 dictionary_ratio=0.5):
+        self.index_coder = PandasIndexCoder(writable, compression, executor)
+        self.dictionary_ratio = dictionary_ratio
+
+    @property
+    def ndarray_coder(self):
+        return self.index_coder.ndarray_coder
+
+    def configure(self, **options):
+        coder = _copy.copy(self)
+        coder.index_coder = self.index_coder.configure(**options)
+        return coder
+
+    def dictionary(self, values):
+        """Returns the values of an object column as categorical, if they
+        are strings with few distinct values, else None.
+        """
+        if (not self.dictionary_ratio or not len(values) or
+                self.pandas.api.types.infer_dtype(
+                    values, skipna=False) != 'string'):
+            return None
+        codes, categories = self.pandas.factorize(values)
+        if len(categories) > self.dictionary_ratio * len(values):
+            return None
+        return self.pandas.Categorical.from_codes(codes, categories)
 
     def encode(self, obj):
-        d = self.ndarray_coder.encode(obj.values)
-        d[TYPE_KEY] = self.typestr
-        d['columns'] = obj.columns.to_native_types()
-        d['rows'] = obj.index.to_native_types()
+        index_coder = self.index_coder
+        arrays = []
+        for _, column in obj.items():
+            if isinstance(column.dtype, self.pandas.DatetimeTZDtype):
+                arrays.append(index_coder.encode_array(column.array,
+                                                       column.dtype.tz))
+            elif isinstance(column.dtype, self.pandas.CategoricalDtype):
+                arrays.append(index_coder.encode_categorical(column.array))
+            else:
+                values = column.to_numpy()
+                categorical = (self.dictionary(values)
+                               if values.dtype == object else None)
+                if categorical is not None:
+                    arrays.append(index_coder.encode_categorical(
+                        categorical, dense=True))
+                else:
+                    arrays.append(index_coder.encode_array(values))
+        return {TYPE_KEY: self.typestr,
+                'index': index_coder.encode_index(obj.index),
+                'columns': index_coder.encode_index(obj.columns),
+                'arrays': arrays}
+
+    def decode(self, data):
+        if 'bytes' in data:
+            # Data encoded as single array by earlier versions:
+            columns = decode_types(data['columns'])
+            rows = decode_types(data['rows'])
+            values = self.ndarray_coder.decode(data)
+            return self.DataFrame(values, index=rows, columns=columns)
+        index_coder = self.index_coder
+        arrays = [index_coder.decode_array(array) for array in data['arrays']]
+        # Build the frame from a dict of arrays without copy, so the
+        # arrays are not consolidated into blocks. Column labels are set
+        # afterwards, they may not be unique.
+        frame = self.DataFrame(dict(enumerate(arrays)),
+                               index=index_coder.decode_index(data['index']),
+                               copy=False)
+        frame.columns = index_coder.decode_index(data['columns'])
+        return frame
+
+
+class ScipySparseCoder(TypeCoder):
+    """Coder for scipy sparse matrices by their index and data arrays.
+
+    CSR and CSC matrices are encoded by `indptr`, `indices` and `data`,
+    COO matrices by `row`, `col` and `data`, all by the
+    `NumpyArrayCoder`. Matrices of the other formats are encoded as CSR
+    and converted back to their format when decoded.
+    """
+    sparse = _LazyImport('scipy.sparse')
+    type_ = _LazyImport('scipy.sparse', 'spmatrix')
+    type_name = 'scipy.sparse.spmatrix'
+    typestr = 'sparse_matrix'
+    suffix = '_matrix'  # Of the decoded classes, like `csr_matrix`
+
+    def __init__(self, writable=False, compression=None, executor=None):
+        self.index_coder = PandasIndexCoder(writable, compression, executor)
+
+    def configure(self, **options):
+        coder = _copy.copy(self)
+        coder.index_coder = self.index_coder.configure(**options)
+        return coder
+
+    def encode(self, obj):
+        encode_array = self.index_coder.encode_array
+        d = {TYPE_KEY: self.typestr,
+             'format': obj.format,
+             'shape': [int(sh) for sh in obj.shape]}
+        if obj.format == 'coo':
+            d['row'] = encode_array(obj.row)
+            d['col'] = encode_array(obj.col)
+        else:
+            if obj.format not in ('csr', 'csc'):
+                obj = obj.tocsr()
+            d['indptr'] = encode_array(obj.indptr)
+            d['indices'] = encode_array(obj.indices)
+        d['data'] = encode_array(obj.data)
         return d
 
     def decode(self, data):
-        columns = decode_types(data['columns'])
-        rows = decode_types(data['rows'])
-        values = self.ndarray_coder.decode(data)
-        return self.DataFrame(values, index=rows, columns=columns)
+        decode_array = self.index_coder.decode_array
+        shape = tuple(data['shape'])
+        values = decode_array(data['data'])
+        if 'row' in data:
+            return getattr(self.sparse, 'coo' + self.suffix)(
+                (values, (decode_array(data['row']),
+                          decode_array(data['col']))), shape=shape)
+        fmt = 'csc' if data['format'] == 'csc' else 'csr'
+        matrix = getattr(self.sparse, fmt + self.suffix)(
+            (values, decode_array(data['indices']),
+             decode_array(data['indptr'])), shape=shape)
+        if data['format'] != fmt:
+            matrix = matrix.asformat(data['format'])
+        return matrix
+
+
+class ScipySparseArrayCoder(ScipySparseCoder):
+    """Coder for scipy sparse arrays like `csr_array`.
+
+    Encoded like the matrices of the `ScipySparseCoder` and decoded to
+    sparse arrays again. Needs scipy 1.11 or later, where the sparse
+    arrays are no subclasses of `spmatrix` anymore.
+    """
+    type_ = _LazyImport('scipy.sparse', 'sparray')
+    type_name = 'scipy.sparse.sparray'
+    typestr = 'sparse_array'
+    suffix = '_array'
 
 
 # Initialize all implemented coder instances into a coder list:
-# Subclassed types must be last. The list will be iterated from
-# last index.
+# If two coders handle the same type or typestr, the one with the lower
+# index wins. Subclasses are resolved by the `TypeCoderRegistry` along
+# the MRO, so the order of unrelated coders does not matter.
 TYPE_CODER_LIST = []
 try:
     TYPE_CODER_LIST.append(SetCoder())
 except:
     _warnings.warn('SetCoder could not be loaded')
+try:
+    TYPE_CODER_LIST.append(DateTimeEpochCoder())
+except:
+    _warnings.warn('DateTimeEpochCoder could not be loaded')
 try:
     TYPE_CODER_LIST.append(DateTimeIsoStringCoder())
 except:
@@ -174,6 +907,14 @@ try:
     TYPE_CODER_LIST.append(NumpyArrayCoder())
 except:
     _warnings.warn('NumpyArrayCoder could not be loaded')
+try:
+    TYPE_CODER_LIST.append(NumpyDateTime64Coder())
+except:
+    _warnings.warn('NumpyDateTime64Coder could not be loaded')
+try:
+    TYPE_CODER_LIST.append(NumpyTimeDelta64Coder())
+except:
+    _warnings.warn('NumpyTimeDelta64Coder could not be loaded')
 try:
     TYPE_CODER_LIST.append(NumpyMaskedArrayCoder())
 except:
@@ -182,74 +923,704 @@ try:
     TYPE_CODER_LIST.append(DataFrameCoder())
 except:
     _warnings.warn('DataFrameCoder could not be loaded')
+try:
+    TYPE_CODER_LIST.append(TupleCoder())
+except:
+    _warnings.warn('TupleCoder could not be loaded')
+try:
+    TYPE_CODER_LIST.append(TypedListCoder())
+except:
+    _warnings.warn('TypedListCoder could not be loaded')
+try:
+    TYPE_CODER_LIST.append(RecordBatchCoder())
+except:
+    _warnings.warn('RecordBatchCoder could not be loaded')
+try:
+    TYPE_CODER_LIST.append(PandasIndexCoder())
+except:
+    _warnings.warn('PandasIndexCoder could not be loaded')
+try:
+    TYPE_CODER_LIST.append(PandasTimestampCoder())
+except:
+    _warnings.warn('PandasTimestampCoder could not be loaded')
+try:
+    TYPE_CODER_LIST.append(PandasCategoricalCoder())
+except:
+    _warnings.warn('PandasCategoricalCoder could not be loaded')
+try:
+    TYPE_CODER_LIST.append(ScipySparseCoder())
+except:
+    _warnings.warn('ScipySparseCoder could not be loaded')
+try:
+    TYPE_CODER_LIST.append(ScipySparseArrayCoder())
+except:
+    _warnings.warn('ScipySparseArrayCoder could not be loaded')
 
 
 TYPE_CODER_LIST.reverse()
 
 
+# Number of configured registries cached per registry:
+CONFIGURED_CACHE_SIZE = 8
+
+
+class TypeCoderRegistry:
+    """Dispatch table for a list of type coders.
+
+    Encoding looks up the coder by the exact type of an object. Types
+    seen for the first time are resolved along their MRO, so the most
+    specific coder wins, and the result is cached. Decoding maps the
+    typestr to its coder through a dict.
+    Coders that reimplement `verify_type` are asked on every object,
+    before the cached lookup, in the order of the coder list.
+    Coders with a `type_name` are added to the lookup only when the
+    module of their type was imported.
+    """
+
+    def __init__(self, type_coder_list):
+        self.type_coder_list = list(type_coder_list)
+        self._by_typestr = {}
+        self._by_type = {}
+        self._verifying_coders = []
+        self._lazy_coders = []
+        for coder in self.type_coder_list:
+            self._by_typestr.setdefault(coder.typestr, coder)
+            if type(coder).verify_type is not TypeCoder.verify_type:
+                self._verifying_coders.append(coder)
+            elif coder.type_name is not None:
+                self._lazy_coders.append(coder)
+            elif isinstance(coder.type_, type):
+                self._by_type.setdefault(coder.type_, coder)
+        self._pending_coders = list(self._lazy_coders)
+        self._type_cache = {}
+        self._configured = {}
+
+    def matches(self, type_coder_list):
+        """Returns True if the registry was built from these coders."""
+        return (len(type_coder_list) == len(self.type_coder_list) and
+                all(a is b for a, b in zip(type_coder_list,
+                                           self.type_coder_list)))
+
+    def _resolve_lazy_coders(self):
+        # Adds the lazy coders, whose modules were imported, to the lookup.
+        # Types cached before stay valid; they cannot be subclasses of a
+        # type of a module, that was not imported.
+        for coder in [coder for coder in self._pending_coders
+                      if _is_imported(coder.type_name)]:
+            self._pending_coders.remove(coder)
+            try:
+                type_ = _import_type(coder.type_name)
+            except (ImportError, AttributeError):
+                continue  # Like `scipy.sparse.sparray` of old versions
+            other = self._by_type.get(type_)
+            if other is None or (self.type_coder_list.index(coder) <
+                                 self.type_coder_list.index(other)):
+                self._by_type[type_] = coder
+
+    def _resolve_type(self, cls):
+        if self._pending_coders:
+            self._resolve_lazy_coders()
+        for klass in cls.__mro__:
+            if klass in self._by_type:
+                return self._by_type[klass]
+        # Coders with a tuple or an abstract base class as `type_`:
+        for coder in self.type_coder_list:
+            if (coder not in self._verifying_coders and
+                    coder not in self._lazy_coders and
+                    coder.type_ is not None and
+                    not isinstance(coder.type_, type) and
+                    issubclass(cls, coder.type_)):
+                return coder
+        return None
+
+    def coder_for_object(self, obj):
+        """Returns the coder for `obj` or None if it is not supported."""
+        for coder in self._verifying_coders:
+            if coder.verify_type(obj):
+                return coder
+        cls = type(obj)
+        try:
+            return self._type_cache[cls]
+        except KeyError:
+            coder = self._type_cache[cls] = self._resolve_type(cls)
+            return coder
+
+    def coder_for_typestr(self, typestr):
+        """Returns the coder for `typestr` or None if it is not supported."""
+        return self._by_typestr.get(typestr)
+
+    def configure(self, **options):
+        """Returns a registry of coders configured with `options`.
+
+        See `TypeCoder.configure()`. The option values have to be
+        hashable, the registries of the `CONFIGURED_CACHE_SIZE` last used
+        options are cached. Options like executors, that are created per
+        call, are not kept alive by the cache for long.
+        """
+        key = tuple(sorted(options.items()))
+        # Most recently used last:
+        registry = self._configured.pop(key, None)
+        if registry is None:
+            registry = TypeCoderRegistry(
+                [coder.configure(**options)
+                 for coder in self.type_coder_list])
+            if len(self._configured) >= CONFIGURED_CACHE_SIZE:
+                del self._configured[next(iter(self._configured))]
+        self._configured[key] = registry
+        return registry
+
+    def __iter__(self):
+        return iter(self.type_coder_list)
+
+    def __len__(self):
+        return len(self.type_coder_list)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__,
+                                 self.type_coder_list)
+
+
+_REGISTRY_CACHE = {}
+
+
+def get_registry(type_coder_list=TYPE_CODER_LIST):
+    """Returns the `TypeCoderRegistry` for a list of coders.
+
+    Registries are built once per list and rebuilt only if the list was
+    changed since. A registry passed in is returned as it is.
+    """
+    if isinstance(type_coder_list, TypeCoderRegistry):
+        return type_coder_list
+    registry = _REGISTRY_CACHE.get(id(type_coder_list))
+    if registry is None or not registry.matches(type_coder_list):
+        if len(_REGISTRY_CACHE) > 64:
+            _REGISTRY_CACHE.clear()
+        registry = TypeCoderRegistry(type_coder_list)
+        _REGISTRY_CACHE[id(type_coder_list)] = registry
+    return registry
+
+
+# Shared references:
+# With `track_refs` objects, that occur more than once in the data, are
+# encoded once as `{type_key: 'shared', 'id': n, 'value': encoded}` at
+# their first occurrence and as `{type_key: 'ref', 'id': n}` at all the
+# others, in the order of traversal. Containers and objects encoded by
+# coders are tracked by identity, scalars and strings are not. With
+# `track_refs='content'` equal numpy arrays are also encoded once, by a
+# hash of their dtype, shape and bytes.
+def _content_key(obj):
+    # Returns the content key of a numpy array or None.
+    numpy = _sys.modules.get('numpy')
+    if (numpy is None or type(obj) is not numpy.ndarray or
+            obj.dtype.hasobject):
+        return None
+    digest = _hashlib.blake2b(
+        numpy.ascontiguousarray(obj).reshape(-1).view(numpy.uint8)).digest()
+    return (obj.dtype.str, obj.shape, digest)
+
+
+def _shared_keys(data, by_content=False):
+    # Returns the keys of the objects, that occur more than once in the
+    # data, and a dict of the content keys by object id.
+    seen = set()
+    shared = set()
+    content_keys = {}
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (str, int, float)) or obj is None:
+            continue
+        key = id(obj)
+        if by_content:
+            content_key = _content_key(obj)
+            if content_key is not None:
+                key = content_keys[id(obj)] = content_key
+        if key in seen:
+            shared.add(key)
+            continue
+        seen.add(key)
+        if isinstance(obj, dict):
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+    return shared, content_keys
+
+
 # Define Type coders, that uses the coder list to
 # encode and decode the data:
+# Both traverse the data with an explicit stack of tasks. A visit task
+# `(_VISIT, ..., parent, key)` stores the result of a value at
+# `parent[key]`, a finish task `(_FINISH, function, argument, parent,
+# key)` stores `function(argument)` there, after the tasks pushed after it
+# are done.
+_VISIT = 0
+_FINISH = 1
+_SCALAR_TYPES = frozenset((str, int, float, bool, type(None)))
+_PLAIN_TYPES = _SCALAR_TYPES | {bytes, bytearray, memoryview}
+_NATIVE_TYPES = (dict, list, tuple, str, int, float)
+
+
 def encode_types(data,
                  type_coder_list=TYPE_CODER_LIST,
                  enable_pickle=False,
-                 type_key=TYPE_KEY):
-    """Recursive type encoder."""
-    def _recursive_encoder(data):
-        if isinstance(data, dict):
-            out = {}
-            for key in data:
-                out[key] = _recursive_encoder(data[key])
-        elif isinstance(data, (list, tuple)):
-            out = list(data)
-            for index in range(len(out)):
-                out[index] = _recursive_encoder(data[index])
-        elif isinstance(data, (str, int, float)):
-            return data
-        else:
-            for coder in type_coder_list:
-                if coder.verify_type(data):
-                    return coder.encode(data)
-            if enable_pickle:
-                out = {type_key: PYPICKLE_TYPE_NAME,
-                       'b': bytearray(_pickle.dumps(data))}
+                 type_key=TYPE_KEY,
+                 pack_homogeneous=False,
+                 preserve_tuples=False,
+                 stats=None,
+                 track_refs=False,
+                 record_batches=False):
+    """Recursive type encoder.
+
+    With `pack_homogeneous` lists and tuples of only ints, only floats
+    or only bools are encoded as typed buffers by the `TypedListCoder`,
+    if they have at least `HOMOGENEOUS_MIN_LENGTH` (or
+    `pack_homogeneous`, if it is an int) items.
+    With `preserve_tuples=True` tuples are encoded by the `TupleCoder`,
+    so they are decoded as tuples again and not as lists.
+    Calls of the coders are recorded by a `stats.Stats` passed as `stats`.
+    With `track_refs=True` objects occuring more than once are encoded
+    once and referenced elsewhere, so `decode_types()` restores shared
+    objects and cycles. `track_refs='content'` also encodes equal numpy
+    arrays once.
+    With `record_batches` lists of at least `HOMOGENEOUS_MIN_LENGTH` (or
+    `record_batches`, if it is an int) dicts with the same keys are
+    encoded column by column by the `RecordBatchCoder`. The dicts of a
+    batch are not tracked by `track_refs`, their values are.
+    """
+    if stats is not None:
+        with stats.phase('encode_types'):
+            return encode_types(data, stats.instrument(type_coder_list),
+                                enable_pickle, type_key, pack_homogeneous,
+                                preserve_tuples, track_refs=track_refs,
+                                record_batches=record_batches)
+    registry = get_registry(type_coder_list)
+    coder_for_object = registry.coder_for_object
+    typed_list_coder = tuple_coder = record_batch_coder = None
+    if pack_homogeneous:
+        typed_list_coder = registry.coder_for_typestr(TYPED_LIST_TYPE_NAME)
+        min_length = (HOMOGENEOUS_MIN_LENGTH if pack_homogeneous is True
+                      else pack_homogeneous)
+    if preserve_tuples:
+        tuple_coder = registry.coder_for_typestr(TUPLE_TYPE_NAME)
+    if record_batches:
+        record_batch_coder = registry.coder_for_typestr(
+            RECORD_BATCH_TYPE_NAME)
+        min_records = (HOMOGENEOUS_MIN_LENGTH if record_batches is True
+                       else record_batches)
+
+    if track_refs:
+        shared, content_keys = _shared_keys(data, track_refs == 'content')
+        ids = {}
+    else:
+        # Ids of the containers on the path to the visited value, to
+        # detect cycles, that cannot be encoded without references:
+        active = set()
+
+        def _enter(data):
+            if id(data) in active:
+                raise ValueError(
+                    'Circular reference detected; use track_refs=True')
+            active.add(id(data))
+
+        def _leave(argument):
+            active.discard(argument[0])
+            return argument[1]
+
+    def _push_items(stack, out):
+        # Encodes the items of a dict or list, that have a coder, and
+        # pushes visit tasks for the other items, that are not scalars, in
+        # order. With `track_refs` all items are visited.
+        tasks = []
+        for key, value in (out.items() if type(out) is dict
+                           else enumerate(out)):
+            if type(value) in _SCALAR_TYPES:
+                continue
+            elif not (track_refs or isinstance(value, _NATIVE_TYPES)):
+                coder = coder_for_object(value)
+                if coder is not None:
+                    out[key] = coder.encode(value)
+                    continue
+            tasks.append((_VISIT, value, out, key))
+        tasks.reverse()
+        stack.extend(tasks)
+
+    def _encode(data):
+        # Encodes the data depth first with an explicit stack of tasks, so
+        # the depth is not limited by the recursion limit. Containers are
+        # copied shallowly and their items, that are not native scalars,
+        # are replaced by visit tasks in order.
+        root = [None]
+        stack = [(_VISIT, data, root, 0)]
+        while stack:
+            task = stack.pop()
+            if task[0] is _FINISH:
+                _, function, argument, parent, key = task
+                parent[key] = function(argument)
+                continue
+            _, data, parent, key = task
+            if isinstance(data, (str, int, float)) or data is None:
+                parent[key] = data
+                continue
+            if track_refs:
+                ref_key = content_keys.get(id(data), id(data))
+                if ref_key in ids:
+                    parent[key] = {type_key: REF_TYPE_NAME,
+                                   'id': ids[ref_key]}
+                    continue
+                elif ref_key in shared:
+                    # The id is taken before the value is encoded, so
+                    # cycles are encoded as references:
+                    ids[ref_key] = len(ids)
+                    parent[key] = {type_key: SHARED_TYPE_NAME,
+                                   'id': ids[ref_key], 'value': None}
+                    parent, key = parent[key], 'value'
+            if isinstance(data, dict):
+                out = parent[key] = dict(data)
+                if not track_refs:
+                    _enter(data)
+                    stack.append((_FINISH, _leave, (id(data), out),
+                                  parent, key))
+                _push_items(stack, out)
+                continue
+            elif isinstance(data, (list, tuple)):
+                if typed_list_coder is not None and len(data) >= min_length:
+                    out = typed_list_coder.encode_homogeneous(
+                        data, preserve_tuples)
+                    if out is not None:
+                        parent[key] = out
+                        continue
+                if not track_refs:
+                    _enter(data)
+                if (record_batch_coder is not None and
+                        isinstance(data, list) and len(data) >= min_records):
+                    out = record_batch_coder.encode_records(
+                        data, _encode, typed_list_coder or
+                        registry.coder_for_typestr(TYPED_LIST_TYPE_NAME))
+                    if out is not None:
+                        if not track_refs:
+                            active.discard(id(data))
+                        parent[key] = out
+                        continue
+                out = parent[key] = list(data)
+                if tuple_coder is not None and isinstance(data, tuple):
+                    stack.append((_FINISH, tuple_coder.encode, out,
+                                  parent, key))
+                if not track_refs:
+                    stack.append((_FINISH, _leave, (id(data), out),
+                                  parent, key))
+                _push_items(stack, out)
+                continue
+            coder = coder_for_object(data)
+            if coder is not None:
+                parent[key] = coder.encode(data)
+            elif enable_pickle:
+                parent[key] = {type_key: PYPICKLE_TYPE_NAME,
+                               'b': bytearray(_pickle.dumps(data))}
             else:
                 raise(ValueError(
                     'Type {}  with value {} is not supported. '.format(
                         type(data), data) +
                     'Enable pickle or implement a TypeCoder.'))
-        return out
-    return _recursive_encoder(data)
+        return root[0]
+    return _encode(data)
 
 
 def decode_types(data,
                  type_coder_list=TYPE_CODER_LIST,
                  enable_pickle=False,
-                 type_key=TYPE_KEY):
-    """Recursive type decoder."""
-    supported_typestr_list = [o.typestr for o in type_coder_list]
-
-    def _recursive_decoder(data):
-        if isinstance(data, dict) and type_key in data:
-            data = data.copy()
-            typestr = data.pop(type_key)
-            if typestr in supported_typestr_list:
-                index = supported_typestr_list.index(typestr)
-                return _recursive_decoder(type_coder_list[index].decode(data))
-            elif enable_pickle and typestr == PYPICKLE_TYPE_NAME:
-                out = _pickle.loads(data['b'])
+                 type_key=TYPE_KEY,
+                 lazy=False,
+                 stats=None,
+                 in_place=False):
+    """Recursive type decoder.
+
+    With `lazy=True` dicts and lists are returned as `LazyDict` and
+    `LazyList` proxies, that decode their values on first access.
+    Calls of the coders are recorded by a `stats.Stats` passed as `stats`.
+    Shared objects and references of `encode_types()` with `track_refs`
+    are restored, but not by lazy decoding.
+    With `in_place=True` the dicts and lists of the data are reused for
+    the decoded data instead of copied. Use it for data, that is not
+    used otherwise, like freshly parsed data.
+    """
+    if stats is not None:
+        with stats.phase('decode_types'):
+            return decode_types(data, stats.instrument(type_coder_list),
+                                enable_pickle, type_key, lazy,
+                                in_place=in_place)
+    if lazy:
+        def decode_typed(data):
+            return decode_types(data, type_coder_list, enable_pickle,
+                                type_key)
+        return _lazy_value(data, decode_typed, type_key)
+    coder_for_typestr = get_registry(type_coder_list).coder_for_typestr
+    shared = {}
+
+    def _push_items(stack, out):
+        # Decodes the typed items of a dict or list, that do not need
+        # further decoding, and pushes visit tasks for the other items,
+        # that are not scalars, in order.
+        tasks = []
+        for key, value in (out.items() if type(out) is dict
+                           else enumerate(out)):
+            if type(value) in _PLAIN_TYPES:
+                continue
+            elif type(value) is dict and type_key in value:
+                coder = coder_for_typestr(value[type_key])
+                if coder is not None and not coder.decode_content:
+                    value = out[key] = coder.decode(value)
+                    if not (coder.redecode and
+                            isinstance(value, (dict, list, tuple))):
+                        continue
+            tasks.append((_VISIT, out, key))
+        tasks.reverse()
+        stack.extend(tasks)
+
+    def _restore_type_key(typestr):
+        def restore(out):
+            out[type_key] = typestr
+            return out
+        return restore
+
+    def _decode_typed(data, parent, key, stack):
+        # Decodes a dict with type key into `parent[key]`.
+        typestr = data[type_key]
+        if typestr == REF_TYPE_NAME:
+            try:
+                parent[key] = shared[data['id']]
+            except KeyError:
+                raise ValueError('Reference to shared object {} before '
+                                 'it was decoded.'.format(data['id']))
+            return
+        elif typestr == SHARED_TYPE_NAME:
+            value = data['value']
+            if (isinstance(value, dict) and type_key not in value or
+                    isinstance(value, list)):
+                # Containers are registered before their content is
+                # decoded, so references in the content can be resolved:
+                container = dict if isinstance(value, dict) else list
+                out = (value if in_place and type(value) is container
+                       else container(value))
+                parent[key] = shared[data['id']] = out
+                _push_items(stack, out)
+            else:
+                parent[key] = shared[data['id']] = _decode(value)
+            return
+        coder = coder_for_typestr(typestr)
+        if coder is not None and coder.decode_content:
+            content = {item_key: data[item_key] for item_key in data
+                       if item_key != type_key}
+            parent[key] = content
+            stack.append((_FINISH, coder.decode, content, parent, key))
+            _push_items(stack, content)
+        elif coder is not None:
+            out = parent[key] = coder.decode(data)
+            if coder.redecode and isinstance(out, (dict, list, tuple)):
+                stack.append((_VISIT, parent, key))
+        elif enable_pickle and typestr == PYPICKLE_TYPE_NAME:
+            parent[key] = _pickle.loads(data['b'])
+        else:
+            # Unknown types are decoded as dicts, with the type key last:
+            content = {item_key: data[item_key] for item_key in data
+                       if item_key != type_key}
+            parent[key] = content
+            stack.append((_FINISH, _restore_type_key(typestr), content,
+                          parent, key))
+            _push_items(stack, content)
+
+    def _decode(data):
+        # Decodes the data depth first with an explicit stack of tasks.
+        # Containers are copied shallowly (or reused with `in_place`) and
+        # their items, that are not scalars, are decoded in place.
+        root = [data]
+        stack = [(_VISIT, root, 0)]
+        pop = stack.pop
+        while stack:
+            task = pop()
+            if task[0] is _FINISH:
+                _, function, argument, parent, key = task
+                parent[key] = function(argument)
+                continue
+            _, parent, key = task
+            data = parent[key]
+            if isinstance(data, dict):
+                if type_key in data:
+                    coder = coder_for_typestr(data[type_key])
+                    if (coder is None or coder.decode_content or
+                            coder.redecode):
+                        _decode_typed(data, parent, key, stack)
+                    else:
+                        parent[key] = coder.decode(data)
+                    continue
+                out = data if in_place and type(data) is dict else dict(data)
+            elif isinstance(data, list):
+                out = data if in_place and type(data) is list else list(data)
+            elif isinstance(data, tuple):
+                out = list(data)
+                stack.append((_FINISH, tuple, out, parent, key))
             else:
-                out = _recursive_decoder(data)
-                out[type_key] = typestr
-                return out
-        elif isinstance(data, dict):
-            out = {}
-            for key in data:
-                out[key] = _recursive_decoder(data[key])
-        elif isinstance(data, (list, tuple)):
-            out = list(data)
-            for index in range(len(out)):
-                out[index] = _recursive_decoder(data[index])
+                continue
+            parent[key] = out
+            _push_items(stack, out)
+        return root[0]
+    return _decode(data)
+
+
+# Lazy decoding:
+# The proxies hold the undecoded values and decode them on first access.
+# Typed values are decoded completely, plain dicts and lists are wrapped
+# in proxies again. Decoded values replace the undecoded ones.
+def _lazy_value(value, decode_typed, type_key):
+    if isinstance(value, dict):
+        if type_key in value:
+            return decode_typed(value)
+        return LazyDict(value, decode_typed, type_key)
+    elif isinstance(value, (list, tuple)):
+        return LazyList(value, decode_typed, type_key)
+    return value
+
+
+def _materialize(value):
+    if isinstance(value, (LazyDict, LazyList)):
+        return value.materialize()
+    return value
+
+
+class LazyDict(_MutableMapping):
+    """Dict proxy that decodes its values on first access."""
+
+    def __init__(self, data, decode_typed, type_key=TYPE_KEY):
+        self._data = dict(data)
+        self._pending = set(self._data)
+        self._decode_typed = decode_typed
+        self._type_key = type_key
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        if key in self._pending:
+            value = _lazy_value(value, self._decode_typed, self._type_key)
+            self._data[key] = value
+            self._pending.discard(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._pending.discard(key)
+
+    def __delitem__(self, key):
+        del self._data[key]
+        self._pending.discard(key)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def materialize(self):
+        """Returns a dict with all values decoded."""
+        return {key: _materialize(self[key]) for key in self}
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.materialize())
+
+
+class LazyList(_MutableSequence):
+    """List proxy that decodes its items on first access."""
+
+    def __init__(self, data, decode_typed, type_key=TYPE_KEY):
+        self._data = list(data)
+        self._pending = [True] * len(self._data)
+        self._decode_typed = decode_typed
+        self._type_key = type_key
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        value = self._data[index]
+        if self._pending[index]:
+            value = _lazy_value(value, self._decode_typed, self._type_key)
+            self._data[index] = value
+            self._pending[index] = False
+        return value
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = list(value)
+            self._data[index] = value
+            self._pending[index] = [False] * len(value)
         else:
-            out = data
-        return out
-    return _recursive_decoder(data)
+            self._data[index] = value
+            self._pending[index] = False
+
+    def __delitem__(self, index):
+        del self._data[index]
+        del self._pending[index]
+
+    def __len__(self):
+        return len(self._data)
+
+    def insert(self, index, value):
+        self._data.insert(index, value)
+        self._pending.insert(index, False)
+
+    def materialize(self):
+        """Returns a list with all items decoded."""
+        return [_materialize(value) for value in self]
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.materialize())
+
+
+# Define single object coders for serializers that traverse the data
+# themselves and call the coders from their `default` and `object_hook`
+# hooks. No intermediate encoded tree is built this way:
+def type_encoder(type_coder_list=TYPE_CODER_LIST,
+                 enable_pickle=False,
+                 type_key=TYPE_KEY,
+                 fallback=None):
+    """Returns a function that encodes a single object with its coder.
+
+    Containers returned by a coder are not traversed, this is left to
+    the serializer. Objects without coder are passed to `fallback`.
+    """
+    coder_for_object = get_registry(type_coder_list).coder_for_object
+
+    def _type_encoder(obj):
+        coder = coder_for_object(obj)
+        if coder is not None:
+            return coder.encode(obj)
+        if fallback is not None:
+            return fallback(obj)
+        if enable_pickle:
+            return {type_key: PYPICKLE_TYPE_NAME,
+                    'b': bytearray(_pickle.dumps(obj))}
+        raise(ValueError(
+            'Type {}  with value {} is not supported. '.format(
+                type(obj), obj) +
+            'Enable pickle or implement a TypeCoder.'))
+    return _type_encoder
+
+
+def type_decoder(type_coder_list=TYPE_CODER_LIST,
+                 enable_pickle=False,
+                 type_key=TYPE_KEY):
+    """Returns a function that decodes a single dict with its coder.
+
+    The values of the dict have to be decoded already, as it is done by
+    the `object_hook` of json and msgpack. Dicts without or with an
+    unsupported typestr are returned unchanged.
+    """
+    coder_for_typestr = get_registry(type_coder_list).coder_for_typestr
+
+    def _type_decoder(data):
+        if type_key not in data:
+            return data
+        typestr = data[type_key]
+        coder = coder_for_typestr(typestr)
+        if coder is not None:
+            return coder.decode(data)
+        elif enable_pickle and typestr == PYPICKLE_TYPE_NAME:
+            return _pickle.loads(data['b'])
+        return data
+    return _type_decoder
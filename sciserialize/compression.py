@@ -0,0 +1,146 @@
+# -- coding: utf-8 --
+"""
+Compression of array buffers.
+
+Buffers are split into chunks of fixed size, every chunk is filtered
+and compressed on its own. The filters reorder the bytes of the items,
+so bytes (`'byte'`) or bits (`'bit'`) of the same significance are next
+to each other, which makes numeric data compress much better.
+
+The codecs of the standard library (`'zlib'`, `'lzma'`, `'bz2'`) are
+always available, `'lz4'` and `'zstd'` if the packages `lz4` or
+`zstandard` are installed.
+"""
+import zlib as _zlib
+import lzma as _lzma
+import bz2 as _bz2
+from collections import namedtuple as _namedtuple
+
+
+CHUNK_SIZE = 2 ** 20
+SHUFFLE_FILTERS = (None, 'byte', 'bit')
+
+# Codec name: (compress(data, level), decompress(data), default level)
+CODECS = {
+    'zlib': (_zlib.compress, _zlib.decompress, 6),
+    'lzma': (lambda data, level: _lzma.compress(data, preset=level),
+             _lzma.decompress, 6),
+    'bz2': (_bz2.compress, _bz2.decompress, 9),
+}
+try:
+    import lz4.frame as _lz4
+    CODECS['lz4'] = (
+        lambda data, level: _lz4.compress(data, compression_level=level),
+        _lz4.decompress, 0)
+except ImportError:
+    pass
+try:
+    import zstandard as _zstd
+    CODECS['zstd'] = (
+        lambda data, level: _zstd.ZstdCompressor(level=level).compress(data),
+        lambda data: _zstd.ZstdDecompressor().decompress(data), 3)
+except ImportError:
+    pass
+
+
+class Compression(_namedtuple('Compression',
+                              ['codec', 'level', 'chunk_size', 'shuffle'])):
+    """Compression settings for array buffers.
+
+    `codec` is one of `CODECS`, `level` defaults to the default level of
+    the codec, `chunk_size` is the size of the uncompressed chunks in
+    bytes and `shuffle` one of `SHUFFLE_FILTERS`.
+    """
+
+    def __new__(cls, codec='zlib', level=None, chunk_size=CHUNK_SIZE,
+                shuffle='byte'):
+        if codec not in CODECS:
+            raise ValueError('Compression codec {!r} is not available. '
+                             'Available codecs: {}'.format(
+                                 codec, ', '.join(sorted(CODECS))))
+        if shuffle not in SHUFFLE_FILTERS:
+            raise ValueError('Unknown shuffle filter {!r}.'.format(shuffle))
+        if level is None:
+            level = CODECS[codec][2]
+        return super().__new__(cls, codec, level, int(chunk_size), shuffle)
+
+
+def get_compression(compression):
+    """Returns `Compression` settings or None.
+
+    `compression` can be None, a codec name, a dict of settings or
+    `Compression` settings.
+    """
+    if compression is None or isinstance(compression, Compression):
+        return compression
+    elif isinstance(compression, dict):
+        return Compression(**compression)
+    return Compression(compression)
+
+
+def _shuffle(chunk, itemsize, shuffle):
+    if shuffle is None or itemsize == 1 and shuffle == 'byte':
+        return chunk
+    import numpy as _np
+    items = _np.frombuffer(chunk, _np.uint8).reshape(-1, itemsize)
+    if shuffle == 'byte':
+        return items.T.tobytes()
+    return _np.packbits(_np.unpackbits(items, axis=1).T).tobytes()
+
+
+def _unshuffle(raw, out, itemsize, shuffle):
+    import numpy as _np
+    if shuffle is None or itemsize == 1 and shuffle == 'byte':
+        out[:] = _np.frombuffer(raw, _np.uint8)
+    elif shuffle == 'byte':
+        out.reshape(-1, itemsize)[:] = _np.frombuffer(
+            raw, _np.uint8).reshape(itemsize, -1).T
+    else:
+        bits = _np.unpackbits(_np.frombuffer(raw, _np.uint8))
+        out.reshape(-1, itemsize)[:] = _np.packbits(
+            bits.reshape(itemsize * 8, -1).T, axis=1)
+
+
+def _chunk_bounds(nbytes, itemsize, chunk_size):
+    # Chunks hold whole items, so they can be shuffled on their own:
+    chunk_size = max(chunk_size - chunk_size % itemsize, itemsize)
+    return [(start, min(start + chunk_size, nbytes))
+            for start in range(0, nbytes, chunk_size)]
+
+
+def compress(buffer, itemsize, compression, map_=map):
+    """Returns the compressed chunks of `buffer` and their sizes.
+
+    `buffer` is a byte memoryview of items with `itemsize` bytes.
+    `map_` is used to compress the chunks, for instance the `map` method
+    of an executor.
+    """
+    buffer = memoryview(buffer).cast('B')
+    compress_ = CODECS[compression.codec][0]
+    bounds = _chunk_bounds(buffer.nbytes, itemsize, compression.chunk_size)
+
+    def compress_chunk(bound):
+        chunk = _shuffle(buffer[bound[0]:bound[1]], itemsize,
+                         compression.shuffle)
+        return compress_(chunk, compression.level)
+    return (list(map_(compress_chunk, bounds)),
+            [stop - start for start, stop in bounds])
+
+
+def decompress(chunks, sizes, itemsize, codec, shuffle, map_=map):
+    """Returns a writable uint8 array of the decompressed chunks."""
+    if codec not in CODECS:
+        raise ValueError('Compression codec {!r} is not available.'.format(
+            codec))
+    import numpy as _np
+    decompress_ = CODECS[codec][1]
+    out = _np.empty(sum(sizes), _np.uint8)
+    starts = _np.cumsum([0] + list(sizes[:-1]))
+
+    def decompress_chunk(args):
+        chunk, start, size = args
+        _unshuffle(decompress_(chunk), out[start:start + size], itemsize,
+                   shuffle)
+    for _ in map_(decompress_chunk, zip(chunks, starts, sizes)):
+        pass
+    return out
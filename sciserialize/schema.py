@@ -0,0 +1,332 @@
+# -- coding: utf-8 --
+"""
+Compiled encoders and decoders for messages of a fixed structure.
+
+A schema describes the structure of a message:
+
++ a dict describes a dict with exactly these keys and value schemas,
++ a list with one schema describes a list of items of this schema
+  (tuples match it, too, unless `preserve_tuples` is set),
++ `int`, `float`, `str`, `bool`, `bytes` or `None` describe values of
+  exactly this type,
++ a typestr like `'ndarray'` describes values encoded by its coder,
++ `object` describes any value, it is encoded generically.
+
+```python
+spec = {'id': int, 'values': 'ndarray', 'tags': [str], 'extra': object}
+message_schema = Schema(spec)
+# or from an example message:
+message_schema = Schema.from_example(message)
+data = message_schema.packb(message)
+message = message_schema.unpackb(data)
+```
+
+`Schema` compiles the schema into nested functions, that encode and
+decode the known paths directly, without the type dispatch of
+`encode_types()` and `decode_types()` for every value. Messages, that
+do not match the schema, are encoded and decoded generically, or raise
+a `SchemaError` with `fallback=False`.
+"""
+import json as _json
+
+import msgpack as _msgpack
+
+from .coders import (encode_types, decode_types, get_registry,
+                     TYPE_CODER_LIST, TYPE_KEY, TUPLE_TYPE_NAME)
+from .serializers import (_default_json, _obj_hook_json, _default_msgpack,
+                          ENABLE_PICKLE)
+
+
+NATIVE_TYPES = (int, float, str, bool, bytes, type(None))
+
+
+class SchemaError(ValueError):
+    """Raised if a message does not match its schema."""
+
+
+class _Mismatch(Exception):
+    # Raised by the compiled functions with the path of the mismatch.
+
+    def __init__(self, path, expected):
+        super().__init__(path, expected)
+        self.path = path
+        self.expected = expected
+
+
+def infer(example, type_coder_list=TYPE_CODER_LIST, preserve_tuples=False):
+    """Returns the schema of an example message.
+
+    Lists are described by the schema of their items, if all items have
+    the same schema and by `object` otherwise. Tuples are described like
+    lists, or by the `'tuple'` typestr with `preserve_tuples`.
+    """
+    registry = get_registry(type_coder_list)
+    list_types = (list,) if preserve_tuples else (list, tuple)
+
+    def _infer(value):
+        if type(value) is dict:
+            return {key: _infer(item) for key, item in value.items()}
+        elif type(value) in list_types:
+            items = [_infer(item) for item in value]
+            if items and all(item == items[0] for item in items):
+                return [items[0]]
+            return [object]
+        elif type(value) in NATIVE_TYPES:
+            return None if value is None else type(value)
+        coder = registry.coder_for_object(value)
+        if coder is None:
+            return object
+        return coder.typestr
+    return _infer(example)
+
+
+def _format_path(path):
+    return ''.join('[{!r}]'.format(key) for key in path) or 'message'
+
+
+class Schema:
+    """Compiled encoder and decoder of a schema.
+
+    The keyword arguments are the same as of `encode_types()` and
+    `decode_types()`. With `fallback=False` a `SchemaError` is raised
+    for messages, that do not match the schema.
+    """
+
+    def __init__(self,
+                 spec,
+                 type_coder_list=TYPE_CODER_LIST,
+                 enable_pickle=ENABLE_PICKLE,
+                 type_key=TYPE_KEY,
+                 fallback=True,
+                 preserve_tuples=False):
+        self.spec = spec
+        self.type_coder_list = type_coder_list
+        self.enable_pickle = enable_pickle
+        self.type_key = type_key
+        self.fallback = fallback
+        self.preserve_tuples = preserve_tuples
+        self._list_types = (list,) if preserve_tuples else (list, tuple)
+        self._registry = get_registry(type_coder_list)
+        self._encode = self._compile_encoder(spec, ())
+        self._decode = self._compile_decoder(spec, ())
+        self._packer = _msgpack.Packer(use_bin_type=True,
+                                       default=_default_msgpack())
+        self._json_encoder = _json.JSONEncoder(default=_default_json())
+
+    @classmethod
+    def from_example(cls, example, **kwargs):
+        """Returns the compiled schema of an example message."""
+        return cls(infer(example, kwargs.get('type_coder_list',
+                                             TYPE_CODER_LIST),
+                         kwargs.get('preserve_tuples', False)), **kwargs)
+
+    def _generic_encoder(self, value):
+        return encode_types(value, self._registry, self.enable_pickle,
+                            self.type_key,
+                            preserve_tuples=self.preserve_tuples)
+
+    def _generic_decoder(self, data):
+        return decode_types(data, self._registry, self.enable_pickle,
+                            self.type_key)
+
+    def _compile_encoder(self, spec, path):
+        # Returns a function, that encodes a value of the schema and
+        # raises `_Mismatch` for other values.
+        list_types = self._list_types
+        if isinstance(spec, dict):
+            keys = spec.keys()
+            natives = []
+            encoders = []
+            for key, item_spec in spec.items():
+                if item_spec is None or item_spec in NATIVE_TYPES:
+                    natives.append((key, type(None) if item_spec is None
+                                    else item_spec))
+                else:
+                    encoders.append((key, self._compile_encoder(
+                        item_spec, path + (key,))))
+
+            def encode_dict(value):
+                if type(value) is not dict or value.keys() != keys:
+                    raise _Mismatch(path, 'dict with keys {}'.format(
+                        list(keys)))
+                for key, type_ in natives:
+                    if type(value[key]) is not type_:
+                        raise _Mismatch(path + (key,), type_.__name__)
+                if not encoders:
+                    return value
+                out = value.copy()
+                for key, encoder in encoders:
+                    out[key] = encoder(out[key])
+                return out
+            return encode_dict
+        elif isinstance(spec, list):
+            if len(spec) != 1:
+                raise ValueError('List schemas have exactly one item schema.')
+            item_spec = spec[0]
+            if item_spec is None or item_spec in NATIVE_TYPES:
+                item_type = type(None) if item_spec is None else item_spec
+
+                def encode_native_list(value):
+                    if type(value) not in list_types:
+                        raise _Mismatch(path, 'list')
+                    for item in value:
+                        if type(item) is not item_type:
+                            raise _Mismatch(path + ('*',),
+                                            item_type.__name__)
+                    return value if type(value) is list else list(value)
+                return encode_native_list
+            encoder = self._compile_encoder(item_spec, path + ('*',))
+
+            def encode_list(value):
+                if type(value) not in list_types:
+                    raise _Mismatch(path, 'list')
+                return [encoder(item) for item in value]
+            return encode_list
+        elif spec is object:
+            return self._generic_encoder
+        elif spec is None or spec in NATIVE_TYPES:
+            type_ = type(None) if spec is None else spec
+
+            def encode_native(value):
+                if type(value) is not type_:
+                    raise _Mismatch(path, type_.__name__)
+                return value
+            return encode_native
+        coder = self._registry.coder_for_typestr(spec)
+        if coder is None:
+            raise ValueError('No coder for typestr {!r}.'.format(spec))
+        if spec == TUPLE_TYPE_NAME:
+            # The items of tuples are encoded before the tuple, like by
+            # `encode_types()`:
+            generic_encoder = self._generic_encoder
+
+            def encode_tuple(value):
+                if type(value) is not tuple:
+                    raise _Mismatch(path, spec)
+                return generic_encoder(value)
+            return encode_tuple
+        coder_for_object = self._registry.coder_for_object
+        types = set()
+
+        def encode_typed(value):
+            if type(value) not in types:
+                if coder_for_object(value) is not coder:
+                    raise _Mismatch(path, spec)
+                types.add(type(value))
+            return coder.encode(value)
+        return encode_typed
+
+    def _compile_decoder(self, spec, path):
+        # Returns a function, that decodes an encoded value of the schema
+        # and raises `_Mismatch` for other data, like generically encoded
+        # messages with the same keys.
+        type_key = self.type_key
+        if isinstance(spec, dict):
+            keys = spec.keys()
+            natives = []
+            decoders = []
+            for key, item_spec in spec.items():
+                if item_spec is None or item_spec in NATIVE_TYPES:
+                    natives.append((key, type(None) if item_spec is None
+                                    else item_spec))
+                else:
+                    decoders.append((key, self._compile_decoder(
+                        item_spec, path + (key,))))
+
+            def decode_dict(data):
+                if type(data) is not dict or data.keys() != keys:
+                    raise _Mismatch(path, 'dict with keys {}'.format(
+                        list(keys)))
+                for key, type_ in natives:
+                    if type(data[key]) is not type_:
+                        raise _Mismatch(path + (key,), type_.__name__)
+                if not decoders:
+                    return data
+                out = data.copy()
+                for key, decoder in decoders:
+                    out[key] = decoder(out[key])
+                return out
+            return decode_dict
+        elif isinstance(spec, list):
+            item_spec = spec[0]
+            if item_spec is None or item_spec in NATIVE_TYPES:
+                item_type = type(None) if item_spec is None else item_spec
+
+                def decode_native_list(data):
+                    if not isinstance(data, list):
+                        raise _Mismatch(path, 'list')
+                    for item in data:
+                        if type(item) is not item_type:
+                            raise _Mismatch(path + ('*',),
+                                            item_type.__name__)
+                    return data
+                return decode_native_list
+            decoder = self._compile_decoder(item_spec, path + ('*',))
+
+            def decode_list(data):
+                if not isinstance(data, list):
+                    raise _Mismatch(path, 'list')
+                return [decoder(item) for item in data]
+            return decode_list
+        elif spec is object:
+            return self._generic_decoder
+        elif spec is None or spec in NATIVE_TYPES:
+            type_ = type(None) if spec is None else spec
+
+            def decode_native(data):
+                if type(data) is not type_:
+                    raise _Mismatch(path, type_.__name__)
+                return data
+            return decode_native
+        coder = self._registry.coder_for_typestr(spec)
+        generic_decoder = self._generic_decoder
+
+        def decode_typed(data):
+            if type(data) is not dict or data.get(type_key) != spec:
+                raise _Mismatch(path, spec)
+            value = coder.decode(data)
+            if coder.redecode and isinstance(value, (dict, list, tuple)):
+                return generic_decoder(value)
+            return value
+        return decode_typed
+
+    def _error(self, mismatch):
+        return SchemaError('{} does not match the schema, expected {}.'.format(
+            _format_path(mismatch.path), mismatch.expected))
+
+    def encode(self, obj):
+        """Returns the encoded message, see `encode_types()`."""
+        try:
+            return self._encode(obj)
+        except _Mismatch as mismatch:
+            if not self.fallback:
+                raise self._error(mismatch) from None
+        return self._generic_encoder(obj)
+
+    def decode(self, data):
+        """Returns the decoded message, see `decode_types()`."""
+        try:
+            return self._decode(data)
+        except _Mismatch as mismatch:
+            if not self.fallback:
+                raise self._error(mismatch) from None
+        return self._generic_decoder(data)
+
+    def packb(self, obj):
+        """Returns the MessagePack packed message."""
+        return self._packer.pack(self.encode(obj))
+
+    def unpackb(self, data):
+        """Returns the message unpacked from MessagePack."""
+        return self.decode(_msgpack.unpackb(data, raw=False))
+
+    def dumps(self, obj):
+        """Returns the message as JSON string."""
+        return self._json_encoder.encode(self.encode(obj))
+
+    def loads(self, data):
+        """Returns the message loaded from a JSON string."""
+        return self.decode(_json.loads(data, object_hook=_obj_hook_json))
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.spec)
@@ -2,34 +2,306 @@
 import json as _json
 import msgpack as _msgpack
 import base64 as _base64
+import binascii as _binascii
+import codecs as _codecs
+import mmap as _mmap
+import re as _re
+import struct as _struct
+from contextlib import nullcontext as _nullcontext
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
 
-from .coders import (encode_types, decode_types, TYPE_CODER_LIST, TYPE_KEY)
+from .coders import (encode_types, decode_types, type_encoder, type_decoder,
+                     get_registry, TYPE_CODER_LIST, TYPE_KEY)
+from .compression import get_compression
 
 
 BASE64_KEY = '__base64__'
+BLOB_KEY = '__blob__'
 ENABLE_PICKLE = False
+SINGLE_PASS = False
 
+# All serializers have a `single_pass` option. If it is set, no encoded
+# copy of the data is built by `encode_types()` before serialization.
+# Instead, json and msgpack traverse the data themselves and call the
+# type coders from their `default` hook for every object they do not
+# support natively. Decoding is done by the `object_hook` while parsing.
+# Note that tuples are packed natively by json and msgpack in this mode.
+# The serializers have a `compression` option, see
+# `compression.get_compression()`. Array buffers are compressed by the
+# `NumpyArrayCoder` then. Decoding does not need any option.
+# All serializers and deserializers have `workers` and `executor` options.
+# The chunks of compressed arrays are compressed and decompressed in
+# parallel by the executor, or by a shared thread pool with `workers`
+# threads. The output is the same as without.
+# The serializers have `pack_homogeneous`, `preserve_tuples`,
+# `track_refs` and `record_batches` options, see `encode_types()`. They
+# are ignored by single pass serializers. Data with shared references
+# has to be decoded with `single_pass=False` and `lazy=False`.
+# Packed lists are decoded as arrays with `homogeneous_as_array=True`,
+# record batches as dict of arrays with `records_as='arrays'` or as
+# DataFrame with `records_as='dataframe'`.
+# The deserializers have a `lazy` option, see `decode_types()`. Lazy
+# decoding ignores the `single_pass` option.
+# The deserializers have a `select` option, see "Partial decoding" below.
+# `dumps`, `loads`, `dump`, `load`, `packb`, `unpackb`, `pack` and
+# `unpack` have a `stats` option. A `stats.Stats` passed records the
+# calls of the coders and the time of type coding and of json/msgpack.
 
-def _default_json(default=None):
+
+def _default_json(default=None, encode_type=None):
     def default_json(obj):
-        if isinstance(obj, bytearray):
+        if isinstance(obj, (bytes, bytearray, memoryview)):
             return {BASE64_KEY: _base64.b64encode(obj).decode()}
+        elif encode_type:
+            return encode_type(obj)
         elif default:
             return default(obj)
         return obj
     return default_json
 
 
+_THREAD_POOLS = {}
+
+
+def _get_executor(executor=None, workers=None):
+    # Returns the executor or a shared thread pool with `workers` threads.
+    if executor is not None or not workers:
+        return executor
+    if workers not in _THREAD_POOLS:
+        _THREAD_POOLS[workers] = _ThreadPoolExecutor(workers)
+    return _THREAD_POOLS[workers]
+
+
+def _configure(type_coder_list, compression=None, executor=None,
+               workers=None, homogeneous_as_array=False, records_as='rows',
+               stats=None):
+    # Returns the registry of the coders configured with the options.
+    options = {'compression': get_compression(compression),
+               'executor': _get_executor(executor, workers),
+               'as_array': homogeneous_as_array or None,
+               'records_as': None if records_as == 'rows' else records_as}
+    options = {name: value for name, value in options.items()
+               if value is not None}
+    if options:
+        type_coder_list = get_registry(type_coder_list).configure(**options)
+    if stats is not None:
+        type_coder_list = stats.instrument(type_coder_list)
+    return type_coder_list
+
+
+def _phase(stats, name):
+    # Records the time of a phase, see `stats.Stats.phase()`.
+    if stats is None:
+        return _nullcontext()
+    return stats.phase(name)
+
+
+def _type_encoder(single_pass, type_coder_list, enable_pickle, type_key,
+                  default):
+    if single_pass:
+        return type_encoder(type_coder_list, enable_pickle, type_key,
+                            fallback=default)
+    return None
+
+
+# Partial decoding:
+# The deserializers have a `select` option, a list of key paths like
+# `[('meta', 'run_id'), ('results', 0)]`. Only the selected subtrees are
+# decoded and returned in their original structure, other keys and list
+# items are left out; a string or int selects a top-level item. Typed
+# objects are always selected as a whole. MessagePack data is scanned
+# without unpacking the data, that is not selected, so its payloads are
+# never allocated. JSON has to be parsed completely, but only the
+# selected subtrees are base64 and type decoded. Partial decoding
+# ignores the `single_pass` option and does not resolve references to
+# shared objects, that are not selected.
+_MISSING = object()
+# Sizes of the MessagePack types of fixed size by their first byte:
+_MSGPACK_FIXED = {0xc0: 1, 0xc2: 1, 0xc3: 1, 0xca: 5, 0xcb: 9, 0xcc: 2,
+                  0xcd: 3, 0xce: 5, 0xcf: 9, 0xd0: 2, 0xd1: 3, 0xd2: 5,
+                  0xd3: 9, 0xd4: 3, 0xd5: 4, 0xd6: 6, 0xd7: 10, 0xd8: 18}
+# Size of the length, extra header bytes and items per entry (0 for raw
+# data) of the other MessagePack types by their first byte:
+_MSGPACK_SIZED = {0xc4: (1, 0, 0), 0xc5: (2, 0, 0), 0xc6: (4, 0, 0),
+                  0xc7: (1, 1, 0), 0xc8: (2, 1, 0), 0xc9: (4, 1, 0),
+                  0xd9: (1, 0, 0), 0xda: (2, 0, 0), 0xdb: (4, 0, 0),
+                  0xdc: (2, 0, 1), 0xdd: (4, 0, 1),
+                  0xde: (2, 0, 2), 0xdf: (4, 0, 2)}
+
+
+def _selection(paths):
+    # Returns the paths as tree of dicts, selected subtrees are True.
+    tree = {}
+    for path in paths:
+        if isinstance(path, (str, int)):
+            path = (path,)
+        if not path:
+            return True
+        node = tree
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+            if node is True:
+                break
+        else:
+            node[path[-1]] = True
+    return tree
+
+
+def _msgpack_header(buffer, pos):
+    # Returns the number of items of a MessagePack object (keys and
+    # values of maps) and the position of the first item, or the position
+    # after the object, if it has no items.
+    byte = buffer[pos]
+    if byte <= 0x7f or byte >= 0xe0:
+        return 0, pos + 1
+    elif byte <= 0x8f:
+        return 2 * (byte & 0x0f), pos + 1
+    elif byte <= 0x9f:
+        return byte & 0x0f, pos + 1
+    elif byte <= 0xbf:
+        return 0, pos + 1 + (byte & 0x1f)
+    elif byte in _MSGPACK_FIXED:
+        return 0, pos + _MSGPACK_FIXED[byte]
+    length_size, extra, items = _MSGPACK_SIZED[byte]
+    length = int.from_bytes(buffer[pos + 1:pos + 1 + length_size], 'big')
+    pos += 1 + length_size + extra
+    if items:
+        return items * length, pos
+    return 0, pos + length
+
+
+def _msgpack_skip(buffer, pos):
+    # Returns the position after the MessagePack object at `pos`.
+    count = 1
+    while count:
+        items, pos = _msgpack_header(buffer, pos)
+        count += items - 1
+    return pos
+
+
+def _select_msgpack(buffer, pos, selection, unpack, type_key):
+    # Returns the unpacked object at `pos` projected on the selection.
+    if selection is True:
+        return unpack(buffer[pos:_msgpack_skip(buffer, pos)])
+    byte = buffer[pos]
+    is_map = 0x80 <= byte <= 0x8f or byte in (0xde, 0xdf)
+    if not (is_map or 0x90 <= byte <= 0x9f or byte in (0xdc, 0xdd)):
+        return _MISSING
+    items, item_pos = _msgpack_header(buffer, pos)
+    if not is_map:
+        selected = []
+        for index in range(items):
+            if index in selection or index - items in selection:
+                value = _select_msgpack(buffer, item_pos, selection.get(
+                    index, selection.get(index - items)), unpack, type_key)
+                if value is not _MISSING:
+                    selected.append(value)
+            item_pos = _msgpack_skip(buffer, item_pos)
+        return selected
+    entries = []
+    for _ in range(items // 2):
+        value_pos = _msgpack_skip(buffer, item_pos)
+        key = unpack(buffer[item_pos:value_pos])
+        if key == type_key:
+            # Typed objects are selected as a whole:
+            return unpack(buffer[pos:_msgpack_skip(buffer, pos)])
+        if key in selection:
+            entries.append((key, value_pos))
+        item_pos = _msgpack_skip(buffer, value_pos)
+    selected = {}
+    for key, value_pos in entries:
+        value = _select_msgpack(buffer, value_pos, selection[key], unpack,
+                                type_key)
+        if value is not _MISSING:
+            selected[key] = value
+    return selected
+
+
+def _unpack_selected(buffer, select, encoding, type_key):
+    # Returns the unpacked selection of the first MessagePack object of
+    # the buffer and its end.
+    buffer = memoryview(buffer).cast('B')
+
+    def unpack(data):
+        return _msgpack.unpackb(data, encoding=encoding)
+    data = _select_msgpack(buffer, 0, _selection(select), unpack, type_key)
+    return ({} if data is _MISSING else data), _msgpack_skip(buffer, 0)
+
+
+def _unpack_selected_file(fp, select, encoding, type_key):
+    # Returns the unpacked selection of the next MessagePack object of the
+    # file. Files are mapped into memory, so data, that is not selected,
+    # is never read.
+    start = fp.tell()
+    try:
+        buffer = memoryview(_mmap.mmap(fp.fileno(), 0,
+                                       access=_mmap.ACCESS_READ))[start:]
+    except (AttributeError, OSError, ValueError):
+        buffer = fp.read()
+    data, end = _unpack_selected(buffer, select, encoding, type_key)
+    fp.seek(start + end)
+    return data
+
+
+def _select_data(data, selection, type_key):
+    # Returns the parsed data projected on the selection.
+    if selection is True:
+        return data
+    elif isinstance(data, dict):
+        if type_key in data:
+            return data
+        selected = {key: _select_data(data[key], selection[key], type_key)
+                    for key in data if key in selection}
+    elif isinstance(data, list):
+        selected = [_select_data(value, selection.get(
+                        index, selection.get(index - len(data))), type_key)
+                    for index, value in enumerate(data)
+                    if index in selection or index - len(data) in selection]
+        return [value for value in selected if value is not _MISSING]
+    else:
+        return _MISSING
+    return {key: value for key, value in selected.items()
+            if value is not _MISSING}
+
+
+def _decode_base64(data):
+    # Decodes the base64 strings of data parsed without `_obj_hook_json`.
+    if isinstance(data, dict):
+        if len(data) == 1 and BASE64_KEY in data:
+            return _obj_hook_json(data)
+        return {key: _decode_base64(value) for key, value in data.items()}
+    elif isinstance(data, list):
+        return [_decode_base64(value) for value in data]
+    return data
+
+
 def dumps(obj,
           enable_pickle=ENABLE_PICKLE,
           type_coder_list=TYPE_CODER_LIST,
           type_key=TYPE_KEY,
           default=None,
+          single_pass=SINGLE_PASS,
+          compression=None,
+          workers=None,
+          executor=None,
+          pack_homogeneous=False,
+          preserve_tuples=False,
+          track_refs=False,
+          record_batches=False,
+          stats=None,
           **kwargs):
     """Returns JSON string. Types encoded."""
-    return _json.dumps(encode_types(
-        obj, type_coder_list, enable_pickle, type_key),
-        default=_default_json(default), **kwargs)
+    type_coder_list = _configure(type_coder_list, compression, executor,
+                                 workers, stats=stats)
+    encode_type = _type_encoder(single_pass, type_coder_list, enable_pickle,
+                                type_key, default)
+    if not single_pass:
+        obj = encode_types(obj, type_coder_list, enable_pickle, type_key,
+                           pack_homogeneous, preserve_tuples, stats,
+                           track_refs, record_batches)
+    with _phase(stats, 'json'):
+        return _json.dumps(obj, default=_default_json(default, encode_type),
+                           **kwargs)
 
 dumps.__doc__ = ''.join((dumps.__doc__, '\n\nJSON-Doc:\n',
                          _json.dumps.__doc__))
@@ -42,31 +314,267 @@ def _obj_hook_json(data):
         return data
 
 
+def _single_pass_obj_hook_json(type_coder_list, enable_pickle, type_key):
+    decode_type = type_decoder(type_coder_list, enable_pickle, type_key)
+
+    def obj_hook_json(data):
+        if len(data) == 1 and BASE64_KEY in data:
+            return _base64.b64decode(data[BASE64_KEY].encode())
+        return decode_type(data)
+    return obj_hook_json
+
+
+def _loads_json(loader, data, enable_pickle, type_coder_list, type_key,
+                single_pass, lazy=False, stats=None, select=None):
+    if select is not None:
+        with _phase(stats, 'json'):
+            data = _select_data(loader(data), _selection(select), type_key)
+        data = _decode_base64({} if data is _MISSING else data)
+    elif single_pass and not lazy:
+        with _phase(stats, 'json'):
+            return loader(data, object_hook=_single_pass_obj_hook_json(
+                type_coder_list, enable_pickle, type_key))
+    else:
+        with _phase(stats, 'json'):
+            data = loader(data, object_hook=_obj_hook_json)
+    return decode_types(data, type_coder_list, enable_pickle, type_key,
+                        lazy, stats, in_place=True)
+
+
 def loads(data,
           enable_pickle=ENABLE_PICKLE,
           type_coder_list=TYPE_CODER_LIST,
           type_key=TYPE_KEY,
+          single_pass=SINGLE_PASS,
+          lazy=False,
+          workers=None,
+          executor=None,
+          homogeneous_as_array=False,
+          records_as='rows',
+          stats=None,
+          select=None,
           **kwargs):
     """Returns data deserialized from JSON string. Types decoded."""
-    return decode_types(
-        _json.loads(data, object_hook=_obj_hook_json),
-        type_coder_list, enable_pickle, type_key)
+    type_coder_list = _configure(type_coder_list, executor=executor,
+                                 workers=workers,
+                                 homogeneous_as_array=homogeneous_as_array,
+                                 records_as=records_as, stats=stats)
+    return _loads_json(_json.loads, data, enable_pickle, type_coder_list,
+                       type_key, single_pass, lazy, stats, select)
 
 loads.__doc__ = ''.join((loads.__doc__, '\n\nJSON-Doc:\n',
                          _json.loads.__doc__))
 
 
+# Streaming JSON:
+# `dump()` writes the JSON text in pieces and buffers (array bytes and
+# others) as base64 in chunks of `BASE64_CHUNK_SIZE` bytes, so neither
+# the base64 string of a buffer nor the whole text is built in memory.
+# `load()` reads the text in chunks and decodes base64 strings of
+# buffers while reading into bytearrays, which decoded arrays view
+# without copying. Only the rest of the text is parsed by json. The
+# text is the same as written by `dumps()`.
+BASE64_CHUNK_SIZE = 3 * 2 ** 16
+_BASE64_START = _re.compile(r'\{\s*"%s"\s*:\s*"' % BASE64_KEY)
+
+
+def _iter_json(obj, encoder, default):
+    # Yields the JSON text of `obj` in pieces, written with the separators
+    # and options of the `JSONEncoder`.
+    if isinstance(obj, (str, int, float)) or obj is None:
+        yield encoder.encode(obj)
+    elif isinstance(obj, dict):
+        yield '{'
+        items = sorted(obj.items()) if encoder.sort_keys else obj.items()
+        first = True
+        for key, value in items:
+            if not isinstance(key, str):
+                if isinstance(key, (int, float)) or key is None:
+                    key = encoder.encode(key)
+                elif encoder.skipkeys:
+                    continue
+                else:
+                    raise TypeError('keys must be str, int, float, bool or '
+                                    'None, not {}'.format(type(key).__name__))
+            if not first:
+                yield encoder.item_separator
+            first = False
+            yield encoder.encode(key)
+            yield encoder.key_separator
+            yield from _iter_json(value, encoder, default)
+        yield '}'
+    elif isinstance(obj, (list, tuple)):
+        yield '['
+        for index, value in enumerate(obj):
+            if index:
+                yield encoder.item_separator
+            yield from _iter_json(value, encoder, default)
+        yield ']'
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        buffer = memoryview(obj).cast('B')
+        yield '{{"{}"{}"'.format(BASE64_KEY, encoder.key_separator)
+        for start in range(0, buffer.nbytes, BASE64_CHUNK_SIZE):
+            yield _base64.b64encode(
+                buffer[start:start + BASE64_CHUNK_SIZE]).decode()
+        yield '"}'
+    else:
+        yield from _iter_json(default(obj), encoder, default)
+
+
+def _write_json(fp, pieces, size=2 ** 16):
+    # Writes the pieces joined to blocks of about `size` characters.
+    block = []
+    length = 0
+    for piece in pieces:
+        block.append(piece)
+        length += len(piece)
+        if length >= size:
+            fp.write(''.join(block))
+            block.clear()
+            length = 0
+    fp.write(''.join(block))
+
+
+def _load_json(fp, object_hook=None):
+    # Returns the data of a JSON file like `json.load()`. The base64
+    # strings of buffers are decoded while reading and replaced by
+    # `{BASE64_KEY: index}` in the text, that is parsed. Objects, that
+    # start like a buffer, but have other keys or a string, that is no
+    # base64, are restored and parsed as ordinary objects.
+    buffers = []
+    text = []
+    pending = ''
+    decoder = None
+    state = 'text'
+
+    def restore(last=''):
+        # Returns the text of the current buffer object read so far and
+        # drops the buffer. Groups of 4 characters without padding are
+        # encoded unambiguously, the `last` piece is kept as it is.
+        buffer = buffers.pop()
+        return start + _base64.b64encode(
+            buffer[:len(buffer) - last_size]).decode('ascii') + last
+
+    while True:
+        chunk = fp.read(4 * BASE64_CHUNK_SIZE // 3)
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = _codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk, final=not chunk)
+        pending += chunk
+        while pending:
+            if state == 'text':
+                match = _BASE64_START.search(pending)
+                if match is None:
+                    # Keep a possibly incomplete start of a base64 object:
+                    keep = pending.rfind('{', -64) if chunk else -1
+                    keep = len(pending) if keep < 0 else keep
+                    text.append(pending[:keep])
+                    pending = pending[keep:]
+                    break
+                text.append(pending[:match.start()])
+                start = match.group()
+                last_size = 0
+                buffers.append(bytearray())
+                pending = pending[match.end():]
+                state = 'base64'
+            elif state == 'base64':
+                end = pending.find('"')
+                if end >= 0:
+                    last = pending[:end]
+                    try:
+                        data = _base64.b64decode(last.replace('\\/', '/'),
+                                                 validate=True)
+                    except _binascii.Error:
+                        text.append(restore(last))
+                        pending = pending[end:]
+                        state = 'text'
+                        continue
+                    buffers[-1] += data
+                    last_size = len(data)
+                    last += '"'
+                    pending = pending[end + 1:]
+                    state = 'end'
+                    continue
+                # Decode complete groups of 4 characters before any
+                # padding, keep the rest:
+                escape = '\\' if pending.endswith('\\') else ''
+                data = pending[:len(pending) - len(escape)].replace(
+                    '\\/', '/')
+                size = len(data) - len(data) % 4
+                padding = data.find('=', 0, size)
+                if padding >= 0:
+                    size = padding - padding % 4
+                try:
+                    buffers[-1] += _base64.b64decode(data[:size],
+                                                     validate=True)
+                except _binascii.Error:
+                    text.append(restore())
+                    state = 'text'
+                    continue
+                pending = data[size:] + escape
+                break
+            else:
+                pending = pending.lstrip()
+                if not pending:
+                    break
+                if pending[0] == '}':
+                    text.append('{{"{}": {}}}'.format(BASE64_KEY,
+                                                      len(buffers) - 1))
+                    pending = pending[1:]
+                else:
+                    # More keys follow, it is an ordinary object:
+                    text.append(restore(last))
+                state = 'text'
+        if not chunk:
+            break
+    if state != 'text':
+        raise ValueError('Incomplete base64 object in JSON data.')
+    text.append(pending)
+
+    def hook(data):
+        if len(data) == 1 and type(data.get(BASE64_KEY)) is int:
+            return buffers[data[BASE64_KEY]]
+        return data if object_hook is None else object_hook(data)
+    return _json.loads(''.join(text), object_hook=hook)
+
+
 def dump(obj,
          fp,
          enable_pickle=ENABLE_PICKLE,
          type_coder_list=TYPE_CODER_LIST,
          type_key=TYPE_KEY,
          default=None,
+         single_pass=SINGLE_PASS,
+         compression=None,
+         workers=None,
+         executor=None,
+         pack_homogeneous=False,
+         preserve_tuples=False,
+         track_refs=False,
+         record_batches=False,
+         stats=None,
          **kwargs):
-    """Dump into `fp`. Types encoded."""
-    return _json.dump(encode_types(
-        obj, type_coder_list, enable_pickle, type_key),
-        fp, default=_default_json(default), **kwargs)
+    """Dump into `fp`. Types encoded.
+
+    The text is written in pieces, see "Streaming JSON" above, except
+    with `indent` or `cls`.
+    """
+    type_coder_list = _configure(type_coder_list, compression, executor,
+                                 workers, stats=stats)
+    encode_type = _type_encoder(single_pass, type_coder_list, enable_pickle,
+                                type_key, default)
+    if not single_pass:
+        obj = encode_types(obj, type_coder_list, enable_pickle, type_key,
+                           pack_homogeneous, preserve_tuples, stats,
+                           track_refs, record_batches)
+    with _phase(stats, 'json'):
+        if kwargs.get('indent') is not None or 'cls' in kwargs:
+            return _json.dump(obj, fp,
+                              default=_default_json(default, encode_type),
+                              **kwargs)
+        _write_json(fp, _iter_json(obj, _json.JSONEncoder(**kwargs),
+                                   _default_json(default, encode_type)))
 
 dump.__doc__ = ''.join((dump.__doc__, '\n\nJSON-Doc:\n',
                         _json.dump.__doc__))
@@ -76,20 +584,34 @@ def load(fp,
          enable_pickle=ENABLE_PICKLE,
          type_coder_list=TYPE_CODER_LIST,
          type_key=TYPE_KEY,
+         single_pass=SINGLE_PASS,
+         lazy=False,
+         workers=None,
+         executor=None,
+         homogeneous_as_array=False,
+         records_as='rows',
+         stats=None,
+         select=None,
          **kwargs):
     """Returns data deserialized from JSON string. Types decoded."""
-    return decode_types(
-        _json.load(fp, object_hook=_obj_hook_json),
-        type_coder_list, enable_pickle, type_key)
+    type_coder_list = _configure(type_coder_list, executor=executor,
+                                 workers=workers,
+                                 homogeneous_as_array=homogeneous_as_array,
+                                 records_as=records_as, stats=stats)
+    return _loads_json(_load_json, fp, enable_pickle, type_coder_list,
+                       type_key, single_pass, lazy, stats, select)
 
 load.__doc__ = ''.join((load.__doc__, '\n\nJSON-Doc:\n',
                         _json.load.__doc__))
 
 
-def _default_msgpack(default=None):
+def _default_msgpack(default=None, encode_type=None):
     def default_msgpack(obj):
-        if isinstance(obj, bytearray):
+        # Only older msgpack versions do not pack these natively:
+        if isinstance(obj, (bytearray, memoryview)):
             return bytes(obj)
+        elif encode_type:
+            return encode_type(obj)
         elif default:
             return default(obj)
         return obj
@@ -103,13 +625,30 @@ def packb(obj,
           default=None,
           encoding='utf-8',
           use_bin_type=True,
+          single_pass=SINGLE_PASS,
+          compression=None,
+          workers=None,
+          executor=None,
+          pack_homogeneous=False,
+          preserve_tuples=False,
+          track_refs=False,
+          record_batches=False,
+          stats=None,
           **kwargs):
     """Returns MessagePack packed data. Types encoded."""
-    return _msgpack.packb(
-        encode_types(obj, type_coder_list, enable_pickle, type_key),
-        encoding=encoding, use_bin_type=use_bin_type,
-        default=_default_msgpack(default),
-        **kwargs)
+    type_coder_list = _configure(type_coder_list, compression, executor,
+                                 workers, stats=stats)
+    encode_type = _type_encoder(single_pass, type_coder_list, enable_pickle,
+                                type_key, default)
+    if not single_pass:
+        obj = encode_types(obj, type_coder_list, enable_pickle, type_key,
+                           pack_homogeneous, preserve_tuples, stats,
+                           track_refs, record_batches)
+    with _phase(stats, 'msgpack'):
+        return _msgpack.packb(
+            obj, encoding=encoding, use_bin_type=use_bin_type,
+            default=_default_msgpack(default, encode_type),
+            **kwargs)
 
 packb.__doc__ = ''.join((packb.__doc__, '\n\nMesssagePack-Doc:\n',
                          _msgpack.packb.__doc__))
@@ -120,11 +659,33 @@ def unpackb(obj,
             type_coder_list=TYPE_CODER_LIST,
             type_key=TYPE_KEY,
             encoding='utf-8',
+            single_pass=SINGLE_PASS,
+            lazy=False,
+            workers=None,
+            executor=None,
+            homogeneous_as_array=False,
+            records_as='rows',
+            stats=None,
+            select=None,
             **kwargs):
     """Returns unpacked messagepack data with types decoded."""
-    return decode_types(
-        _msgpack.unpackb(obj, encoding=encoding),
-        type_coder_list, enable_pickle, type_key)
+    type_coder_list = _configure(type_coder_list, executor=executor,
+                                 workers=workers,
+                                 homogeneous_as_array=homogeneous_as_array,
+                                 records_as=records_as, stats=stats)
+    if select is not None:
+        with _phase(stats, 'msgpack'):
+            data, _ = _unpack_selected(obj, select, encoding, type_key)
+    elif single_pass and not lazy:
+        with _phase(stats, 'msgpack'):
+            return _msgpack.unpackb(
+                obj, encoding=encoding, object_hook=type_decoder(
+                    type_coder_list, enable_pickle, type_key))
+    else:
+        with _phase(stats, 'msgpack'):
+            data = _msgpack.unpackb(obj, encoding=encoding)
+    return decode_types(data, type_coder_list, enable_pickle, type_key,
+                        lazy, stats, in_place=True)
 
 unpackb.__doc__ = ''.join((unpackb.__doc__, '\n\nMesssagePack-Doc:\n',
                            _msgpack.unpackb.__doc__))
@@ -138,13 +699,30 @@ def pack(obj,
          default=None,
          encoding='utf-8',
          use_bin_type=True,
+         single_pass=SINGLE_PASS,
+         compression=None,
+         workers=None,
+         executor=None,
+         pack_homogeneous=False,
+         preserve_tuples=False,
+         track_refs=False,
+         record_batches=False,
+         stats=None,
          **kwargs):
     """Returns MessagePack packed data. Types encoded."""
-    return _msgpack.pack(
-        encode_types(obj, type_coder_list, enable_pickle, type_key),
-        fp, encoding=encoding, use_bin_type=use_bin_type,
-        default=_default_msgpack(default),
-        **kwargs)
+    type_coder_list = _configure(type_coder_list, compression, executor,
+                                 workers, stats=stats)
+    encode_type = _type_encoder(single_pass, type_coder_list, enable_pickle,
+                                type_key, default)
+    if not single_pass:
+        obj = encode_types(obj, type_coder_list, enable_pickle, type_key,
+                           pack_homogeneous, preserve_tuples, stats,
+                           track_refs, record_batches)
+    with _phase(stats, 'msgpack'):
+        return _msgpack.pack(
+            obj, fp, encoding=encoding, use_bin_type=use_bin_type,
+            default=_default_msgpack(default, encode_type),
+            **kwargs)
 
 pack.__doc__ = ''.join((pack.__doc__, '\n\nMesssagePack-Doc:\n',
                         _msgpack.pack.__doc__))
@@ -155,11 +733,328 @@ def unpack(fp,
            type_coder_list=TYPE_CODER_LIST,
            type_key=TYPE_KEY,
            encoding='utf-8',
+           single_pass=SINGLE_PASS,
+           lazy=False,
+           workers=None,
+           executor=None,
+           homogeneous_as_array=False,
+           records_as='rows',
+           stats=None,
+           select=None,
            **kwargs):
     """Returns unpacked messagepack data with types decoded."""
-    return decode_types(
-        _msgpack.unpack(fp, encoding=encoding),
-        type_coder_list, enable_pickle, type_key)
+    type_coder_list = _configure(type_coder_list, executor=executor,
+                                 workers=workers,
+                                 homogeneous_as_array=homogeneous_as_array,
+                                 records_as=records_as, stats=stats)
+    if select is not None:
+        with _phase(stats, 'msgpack'):
+            data = _unpack_selected_file(fp, select, encoding, type_key)
+    elif single_pass and not lazy:
+        with _phase(stats, 'msgpack'):
+            return _msgpack.unpack(
+                fp, encoding=encoding, object_hook=type_decoder(
+                    type_coder_list, enable_pickle, type_key))
+    else:
+        with _phase(stats, 'msgpack'):
+            data = _msgpack.unpack(fp, encoding=encoding)
+    return decode_types(data, type_coder_list, enable_pickle, type_key,
+                        lazy, stats, in_place=True)
 
 unpack.__doc__ = ''.join((unpack.__doc__, '\n\nMesssagePack-Doc:\n',
                           _msgpack.unpack.__doc__))
+
+
+# Streaming of records:
+# The following classes and generators write and read many top-level
+# objects (records) to and from one file, one at a time. MessagePack
+# records are simply concatenated, JSON records are written as one line
+# each (line-delimited JSON).
+class StreamPacker:
+    """Appends MessagePack packed records to `fp`. Types encoded.
+
+    Takes the same keyword arguments as `pack()`.
+    """
+
+    def __init__(self,
+                 fp,
+                 enable_pickle=ENABLE_PICKLE,
+                 type_coder_list=TYPE_CODER_LIST,
+                 type_key=TYPE_KEY,
+                 default=None,
+                 encoding='utf-8',
+                 use_bin_type=True,
+                 single_pass=SINGLE_PASS,
+                 compression=None,
+                 workers=None,
+                 executor=None,
+                 pack_homogeneous=False,
+                 preserve_tuples=False,
+                 track_refs=False,
+                 record_batches=False,
+                 **kwargs):
+        type_coder_list = _configure(type_coder_list, compression,
+                                     executor, workers)
+        self.fp = fp
+        self.enable_pickle = enable_pickle
+        self.type_coder_list = type_coder_list
+        self.type_key = type_key
+        self.single_pass = single_pass
+        self.pack_homogeneous = pack_homogeneous
+        self.preserve_tuples = preserve_tuples
+        self.track_refs = track_refs
+        self.record_batches = record_batches
+        encode_type = _type_encoder(single_pass, type_coder_list,
+                                    enable_pickle, type_key, default)
+        self._packer = _msgpack.Packer(
+            encoding=encoding, use_bin_type=use_bin_type,
+            default=_default_msgpack(default, encode_type), **kwargs)
+
+    def pack(self, obj):
+        """Appends one record to the file."""
+        if not self.single_pass:
+            obj = encode_types(obj, self.type_coder_list, self.enable_pickle,
+                               self.type_key, self.pack_homogeneous,
+                               self.preserve_tuples,
+                               track_refs=self.track_refs,
+                               record_batches=self.record_batches)
+        self.fp.write(self._packer.pack(obj))
+
+
+def iter_unpack(fp,
+                enable_pickle=ENABLE_PICKLE,
+                type_coder_list=TYPE_CODER_LIST,
+                type_key=TYPE_KEY,
+                encoding='utf-8',
+                single_pass=SINGLE_PASS,
+                workers=None,
+                executor=None,
+                homogeneous_as_array=False,
+                records_as='rows',
+                **kwargs):
+    """Yields the records of a MessagePack stream with types decoded.
+
+    The file is read in chunks, so memory is bounded by the size of a
+    single record. Further keyword arguments are passed to the msgpack
+    `Unpacker`.
+    """
+    type_coder_list = _configure(type_coder_list, executor=executor,
+                                 workers=workers,
+                                 homogeneous_as_array=homogeneous_as_array,
+                                 records_as=records_as)
+    if single_pass:
+        kwargs['object_hook'] = type_decoder(type_coder_list, enable_pickle,
+                                             type_key)
+    for obj in _msgpack.Unpacker(fp, encoding=encoding, **kwargs):
+        if single_pass:
+            yield obj
+        else:
+            yield decode_types(obj, type_coder_list, enable_pickle, type_key,
+                               in_place=True)
+
+
+class StreamDumper:
+    """Appends JSON records to `fp`, one per line. Types encoded.
+
+    Takes the same keyword arguments as `dump()`. Do not use `indent`,
+    records have to fit on one line.
+    """
+
+    def __init__(self,
+                 fp,
+                 enable_pickle=ENABLE_PICKLE,
+                 type_coder_list=TYPE_CODER_LIST,
+                 type_key=TYPE_KEY,
+                 default=None,
+                 single_pass=SINGLE_PASS,
+                 compression=None,
+                 workers=None,
+                 executor=None,
+                 pack_homogeneous=False,
+                 preserve_tuples=False,
+                 track_refs=False,
+                 record_batches=False,
+                 **kwargs):
+        type_coder_list = _configure(type_coder_list, compression,
+                                     executor, workers)
+        self.fp = fp
+        self.enable_pickle = enable_pickle
+        self.type_coder_list = type_coder_list
+        self.type_key = type_key
+        self.single_pass = single_pass
+        self.pack_homogeneous = pack_homogeneous
+        self.preserve_tuples = preserve_tuples
+        self.track_refs = track_refs
+        self.record_batches = record_batches
+        encode_type = _type_encoder(single_pass, type_coder_list,
+                                    enable_pickle, type_key, default)
+        self._encoder = _json.JSONEncoder(
+            default=_default_json(default, encode_type), **kwargs)
+
+    def dump(self, obj):
+        """Appends one record to the file."""
+        if not self.single_pass:
+            obj = encode_types(obj, self.type_coder_list, self.enable_pickle,
+                               self.type_key, self.pack_homogeneous,
+                               self.preserve_tuples,
+                               track_refs=self.track_refs,
+                               record_batches=self.record_batches)
+        self.fp.write(self._encoder.encode(obj))
+        self.fp.write('\n')
+
+
+def iter_load(fp,
+              enable_pickle=ENABLE_PICKLE,
+              type_coder_list=TYPE_CODER_LIST,
+              type_key=TYPE_KEY,
+              single_pass=SINGLE_PASS,
+              workers=None,
+              executor=None,
+              homogeneous_as_array=False,
+              records_as='rows',
+              **kwargs):
+    """Yields the records of a line-delimited JSON file. Types decoded."""
+    type_coder_list = _configure(type_coder_list, executor=executor,
+                                 workers=workers,
+                                 homogeneous_as_array=homogeneous_as_array,
+                                 records_as=records_as)
+    for line in fp:
+        if line.strip():
+            yield _loads_json(_json.loads, line, enable_pickle,
+                              type_coder_list, type_key, single_pass)
+
+
+# Memory mapped container:
+# A container file stores every buffer of the encoded data (the bytes of
+# numpy arrays, masks, pickles) as raw blob, aligned to `BLOB_ALIGNMENT`
+# bytes. The structured rest is stored as MessagePack or JSON header,
+# where the buffers are replaced by `{BLOB_KEY: [offset, nbytes]}`.
+# Layout: magic, blobs, header, trailer. The trailer holds the offset
+# and length of the header and the header format.
+# Loading maps the file into memory and reads only the header, arrays
+# are views of the mapped file and are paged in when accessed.
+CONTAINER_MAGIC = b'SCISERC\x01'
+BLOB_ALIGNMENT = 64
+_TRAILER = _struct.Struct('<QQ8s8s')
+
+
+def _externalize_buffers(data, write):
+    # Returns a copy of the data with the buffers replaced by the result
+    # of `write(buffer)`, in the order of the data. Traverses with an
+    # explicit stack like `encode_types()`, so the depth is not limited
+    # by the recursion limit.
+    root = [data]
+    stack = [(root, 0)]
+    while stack:
+        parent, key = stack.pop()
+        value = parent[key]
+        if isinstance(value, dict):
+            out = parent[key] = dict(value)
+            items = out.items()
+        elif isinstance(value, (list, tuple)):
+            out = parent[key] = list(value)
+            items = enumerate(out)
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            parent[key] = {BLOB_KEY: write(value)}
+            continue
+        else:
+            continue
+        stack.extend(reversed([(out, item_key) for item_key, item in items
+                               if isinstance(item, (dict, list, tuple, bytes,
+                                                    bytearray, memoryview))]))
+    return root[0]
+
+
+def dump_container(obj,
+                   fp,
+                   enable_pickle=ENABLE_PICKLE,
+                   type_coder_list=TYPE_CODER_LIST,
+                   type_key=TYPE_KEY,
+                   header_format='msgpack',
+                   compression=None,
+                   workers=None,
+                   executor=None,
+                   pack_homogeneous=False,
+                   preserve_tuples=False,
+                   track_refs=False,
+                   record_batches=False):
+    """Dump into a container file `fp`. Types encoded.
+
+    `fp` has to be a file opened for binary writing, the container must
+    be the whole file. `header_format` is 'msgpack' or 'json'.
+    """
+    type_coder_list = _configure(type_coder_list, compression, executor,
+                                 workers)
+    if header_format not in ('msgpack', 'json'):
+        raise ValueError('Unknown header format {!r}.'.format(header_format))
+    fp.write(CONTAINER_MAGIC)
+    position = [len(CONTAINER_MAGIC)]
+
+    def write_blob(buffer):
+        buffer = memoryview(buffer).cast('B')
+        padding = -position[0] % BLOB_ALIGNMENT
+        fp.write(b'\x00' * padding)
+        offset = position[0] + padding
+        fp.write(buffer)
+        position[0] = offset + buffer.nbytes
+        return [offset, buffer.nbytes]
+
+    header = _externalize_buffers(
+        encode_types(obj, type_coder_list, enable_pickle, type_key,
+                     pack_homogeneous, preserve_tuples,
+                     track_refs=track_refs,
+                     record_batches=record_batches),
+        write_blob)
+    if header_format == 'msgpack':
+        header = _msgpack.packb(header, use_bin_type=True)
+    else:
+        header = _json.dumps(header).encode()
+    fp.write(header)
+    fp.write(_TRAILER.pack(position[0], len(header),
+                           header_format.encode(), CONTAINER_MAGIC))
+
+
+def load_container(fp,
+                   enable_pickle=ENABLE_PICKLE,
+                   type_coder_list=TYPE_CODER_LIST,
+                   type_key=TYPE_KEY,
+                   mode='c',
+                   workers=None,
+                   executor=None,
+                   homogeneous_as_array=False,
+                   records_as='rows'):
+    """Returns data loaded from a container file `fp`. Types decoded.
+
+    `fp` has to be a file opened for binary reading. It can be closed
+    after loading, the memory map stays open as long as it is used.
+    With `mode='c'` (copy on write) decoded arrays are writable views of
+    the mapped file, changes are not written back. With `mode='r'` the
+    mapping is read-only and so are the arrays, unless they are decoded
+    by a coder with `writable=True`, which copies them.
+    """
+    type_coder_list = _configure(type_coder_list, executor=executor,
+                                 workers=workers,
+                                 homogeneous_as_array=homogeneous_as_array,
+                                 records_as=records_as)
+    access = {'c': _mmap.ACCESS_COPY, 'r': _mmap.ACCESS_READ}[mode]
+    buffer = memoryview(_mmap.mmap(fp.fileno(), 0, access=access))
+    (header_offset, header_length,
+     header_format, magic) = _TRAILER.unpack(buffer[-_TRAILER.size:])
+    if (magic != CONTAINER_MAGIC or
+            buffer[:len(CONTAINER_MAGIC)] != CONTAINER_MAGIC):
+        raise ValueError('Not a sciserialize container file.')
+    header = buffer[header_offset:header_offset + header_length]
+
+    def blob_hook(data):
+        if len(data) == 1 and BLOB_KEY in data:
+            offset, nbytes = data[BLOB_KEY]
+            return buffer[offset:offset + nbytes]
+        return data
+
+    if header_format.rstrip(b'\x00') == b'msgpack':
+        header = _msgpack.unpackb(header, encoding='utf-8',
+                                  object_hook=blob_hook)
+    else:
+        header = _json.loads(bytes(header).decode(), object_hook=blob_hook)
+    return decode_types(header, type_coder_list, enable_pickle, type_key,
+                        in_place=True)
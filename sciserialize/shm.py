@@ -0,0 +1,275 @@
+# -- coding: utf-8 --
+"""
+Shared memory transport for processes on the same machine.
+
+`packb()` encodes the data like `serializers.packb()`, but copies all
+buffers (the bytes of arrays, masks, DataFrame columns, ...) into one
+`multiprocessing.shared_memory` block. The returned message is small, it
+holds only the name of the block and the structure of the data with
+offsets into the block, and can be sent through a pipe or queue.
+`unpackb()` in the receiving process maps the block and decodes the
+arrays as views of it, without copying them.
+
+Ownership of the block passes with the message: the receiver has to
+release it, after the data is not used anymore:
+
+```python
+with shm.unpackb(message) as shared:
+    process(shared.data)
+```
+
+Releasing removes the block; it is freed when the last array viewing
+it is garbage collected. Messages, that are never unpacked, have to be
+released by `release()`.
+"""
+import collections as _collections
+import multiprocessing as _multiprocessing
+import os as _os
+import secrets as _secrets
+from multiprocessing import shared_memory as _shared_memory
+from multiprocessing import resource_tracker as _resource_tracker
+
+import msgpack as _msgpack
+
+from .coders import encode_types, decode_types, TYPE_CODER_LIST, TYPE_KEY
+from .serializers import (_configure, _externalize_buffers, BLOB_KEY,
+                          BLOB_ALIGNMENT, ENABLE_PICKLE)
+
+
+SHM_KEY = '__shm__'
+
+
+def _hand_over(block):
+    # The block is owned by the receiver of the message, the resource
+    # tracker of this process must not remove it at exit.
+    _resource_tracker.unregister(block._name, 'shared_memory')
+    block.close()
+
+
+def packb(obj,
+          enable_pickle=ENABLE_PICKLE,
+          type_coder_list=TYPE_CODER_LIST,
+          type_key=TYPE_KEY,
+          compression=None,
+          workers=None,
+          executor=None,
+          pack_homogeneous=False,
+          preserve_tuples=False,
+          track_refs=False,
+          record_batches=False,
+          name=None):
+    """Returns a MessagePack message of the data, with the buffers in a
+    shared memory block. Types encoded.
+
+    The block gets a random name or `name`, if given. Takes the same
+    keyword arguments as `serializers.packb()`.
+    """
+    type_coder_list = _configure(type_coder_list, compression, executor,
+                                 workers)
+    buffers = []
+    position = [0]
+
+    def add_buffer(buffer):
+        buffer = memoryview(buffer).cast('B')
+        offset = position[0] + -position[0] % BLOB_ALIGNMENT
+        buffers.append((offset, buffer))
+        position[0] = offset + buffer.nbytes
+        return [offset, buffer.nbytes]
+
+    data = _externalize_buffers(
+        encode_types(obj, type_coder_list, enable_pickle, type_key,
+                     pack_homogeneous, preserve_tuples,
+                     track_refs=track_refs, record_batches=record_batches),
+        add_buffer)
+    block_name, name = name, None
+    if buffers:
+        block = _shared_memory.SharedMemory(block_name, create=True,
+                                            size=position[0])
+        try:
+            for offset, buffer in buffers:
+                block.buf[offset:offset + buffer.nbytes] = buffer
+        except BaseException:
+            block.close()
+            block.unlink()
+            raise
+        name = block.name
+        _hand_over(block)
+    return _msgpack.packb({SHM_KEY: name, 'data': data}, use_bin_type=True)
+
+
+class SharedData:
+    """Data decoded from a shared memory message.
+
+    `data` are the decoded data. Call `release()` or use the object as
+    context manager to remove the shared memory block.
+    """
+
+    def __init__(self, data, block=None):
+        self.data = data
+        self._block = block
+
+    @property
+    def name(self):
+        """The name of the shared memory block or None."""
+        return None if self._block is None else self._block.name
+
+    def release(self):
+        """Removes the shared memory block.
+
+        The memory is freed when no decoded array views it anymore.
+        """
+        self.data = None
+        if self._block is None:
+            return
+        block, self._block = self._block, None
+        block.unlink()
+        try:
+            block.close()
+        except BufferError:
+            # Arrays still view the block, it is unmapped with them.
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def __repr__(self):
+        return '{}({!r}, name={!r})'.format(self.__class__.__name__,
+                                            self.data, self.name)
+
+
+def unpackb(message,
+            enable_pickle=ENABLE_PICKLE,
+            type_coder_list=TYPE_CODER_LIST,
+            type_key=TYPE_KEY,
+            workers=None,
+            executor=None,
+            homogeneous_as_array=False,
+            records_as='rows'):
+    """Returns the `SharedData` of a message of `packb()`. Types decoded.
+
+    Decoded arrays are writable views of the shared memory block.
+    """
+    type_coder_list = _configure(type_coder_list, executor=executor,
+                                 workers=workers,
+                                 homogeneous_as_array=homogeneous_as_array,
+                                 records_as=records_as)
+    message = _msgpack.unpackb(message, encoding='utf-8')
+    block = None
+    if message[SHM_KEY] is not None:
+        block = _shared_memory.SharedMemory(message[SHM_KEY])
+    buffer = None if block is None else block.buf
+
+    def map_buffers(data):
+        if isinstance(data, dict):
+            if len(data) == 1 and BLOB_KEY in data:
+                offset, nbytes = data[BLOB_KEY]
+                return buffer[offset:offset + nbytes]
+            return {key: map_buffers(value) for key, value in data.items()}
+        elif isinstance(data, list):
+            return [map_buffers(value) for value in data]
+        return data
+
+    try:
+        data = decode_types(map_buffers(message['data']), type_coder_list,
+                            enable_pickle, type_key, in_place=True)
+    except BaseException:
+        if block is not None:
+            SharedData(None, block).release()
+        raise
+    return SharedData(data, block)
+
+
+def release(message):
+    """Removes the shared memory block of a message, that will not be
+    unpacked. Returns False if it was removed already.
+    """
+    return _release_block(
+        _msgpack.unpackb(message, encoding='utf-8')[SHM_KEY])
+
+
+def _release_block(name):
+    # Removes the shared memory block `name`, if it exists.
+    if name is None:
+        return False
+    try:
+        block = _shared_memory.SharedMemory(name)
+    except FileNotFoundError:
+        return False
+    SharedData(None, block).release()
+    return True
+
+
+class _SharedCall:
+    # Calls `function` with the data of a message in a worker process and
+    # returns the result as message with its block named `name`.
+
+    def __init__(self, function, options):
+        self.function = function
+        self.options = options
+
+    def __call__(self, message, name):
+        with unpackb(message) as shared:
+            return packb(self.function(shared.data), name=name,
+                         **self.options)
+
+
+def pool_map(function, iterable, processes=None, pool=None, window=None,
+             **options):
+    """Yields the `SharedData` of `function(item)` for all items, computed
+    by a process pool.
+
+    Items and results are transferred as `packb()` messages. `pool` is a
+    `multiprocessing.Pool` or a new pool with `processes` processes is
+    used. At most `window` items (twice the number of processes by
+    default) are packed and submitted ahead of the consumed results, so
+    `iterable` may be unbounded. The options are passed to `packb()`.
+    The results have to be released by the caller.
+
+    If the generator is closed early, no more items are submitted. An own
+    pool is terminated, calls running in it are cancelled; the calls
+    submitted to a given `pool` are waited for. The messages of the
+    submitted items and the results, that were not consumed, are
+    released.
+    """
+    own_pool = pool is None
+    if own_pool:
+        pool = _multiprocessing.Pool(processes)
+    if window is None:
+        window = 2 * (processes or _os.cpu_count() or 1)
+    call = _SharedCall(function, options)
+    items = iter(iterable)
+    # Item messages, result block names and async results of the
+    # submitted calls, in order. The names of the result blocks are
+    # chosen here, so blocks of cancelled calls can be removed, too:
+    pending = _collections.deque()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < window:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                message = packb(item, **options)
+                name = 'scs_' + _secrets.token_hex(8)
+                pending.append((message, name, pool.apply_async(
+                    call, (message, name))))
+            if not pending:
+                break
+            result = pending[0][2].get()
+            pending.popleft()
+            yield unpackb(result)
+    finally:
+        if own_pool:
+            pool.terminate()
+        for message, name, result in pending:
+            if not own_pool:
+                result.wait()
+            _release_block(name)
+            # Items of failed or cancelled calls were not released by
+            # workers:
+            release(message)
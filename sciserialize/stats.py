@@ -0,0 +1,132 @@
+# -- coding: utf-8 --
+"""
+Collection of serialization metrics.
+
+Pass a `Stats` instance as `stats` option to the serializers or to
+`encode_types()` and `decode_types()`, to record per typestr how often
+the coders are called, their cumulative time and the bytes they produce
+(encoding) or consume (decoding), and the time of the phases of the
+serialization:
+
++ `'encode_types'` and `'decode_types'`: building the encoded tree and
+  decoding it, coder calls included.
++ `'json'` and `'msgpack'`: the calls of json and msgpack. With
+  `single_pass=True` the coders are called in this phase.
+
+Bytes are counted for bytes-like objects and strings in the encoded
+data, so they are the payload without the framing of the format.
+Without `stats` nothing is recorded and the coders are not wrapped.
+"""
+import copy as _copy
+import time as _time
+from contextlib import contextmanager as _contextmanager
+
+from .coders import get_registry, TypeCoderRegistry
+
+
+def _nbytes(data):
+    # Bytes of the buffers and strings in the encoded data.
+    if isinstance(data, (bytes, bytearray, str)):
+        return len(data)
+    elif isinstance(data, memoryview):
+        return data.nbytes
+    elif isinstance(data, dict):
+        return sum(_nbytes(value) for value in data.values())
+    elif isinstance(data, (list, tuple)):
+        return sum(_nbytes(value) for value in data)
+    return 0
+
+
+class Stats:
+    """Collects call counts, times and bytes per coder and phase."""
+
+    def __init__(self):
+        self._registries = {}
+        self.reset()
+
+    def reset(self):
+        """Clears the recorded metrics."""
+        # (direction, typestr): [calls, seconds, bytes]
+        self.coders = {}
+        # phase: [calls, seconds]
+        self.phases = {}
+
+    def record(self, direction, typestr, seconds, nbytes):
+        """Records a call of the `direction` method of a coder."""
+        entry = self.coders.get((direction, typestr))
+        if entry is None:
+            entry = self.coders[(direction, typestr)] = [0, 0., 0]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += nbytes
+
+    @_contextmanager
+    def phase(self, name):
+        """Context manager that records the time of a phase."""
+        start = _time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.phases.setdefault(name, [0, 0.])
+            entry[0] += 1
+            entry[1] += _time.perf_counter() - start
+
+    def _timed_coder(self, coder):
+        coder = _copy.copy(coder)
+        encode, decode = coder.encode, coder.decode
+        typestr = coder.typestr
+
+        def timed_encode(obj, *args):
+            start = _time.perf_counter()
+            data = encode(obj, *args)
+            self.record('encode', typestr, _time.perf_counter() - start,
+                        _nbytes(data))
+            return data
+
+        def timed_decode(data):
+            start = _time.perf_counter()
+            obj = decode(data)
+            self.record('decode', typestr, _time.perf_counter() - start,
+                        _nbytes(data))
+            return obj
+        coder.encode = timed_encode
+        coder.decode = timed_decode
+        return coder
+
+    def instrument(self, type_coder_list):
+        """Returns a registry of coders that record their calls.
+
+        Registries are built once per coder list (see `get_registry()`).
+        Registries returned by this method are returned unchanged.
+        """
+        registry = get_registry(type_coder_list)
+        cached = self._registries.get(id(registry))
+        if cached is not None and cached[0] is registry:
+            return cached[1]
+        instrumented = TypeCoderRegistry(
+            [self._timed_coder(coder) for coder in registry])
+        # The registries are kept alive, so their ids are not reused:
+        self._registries[id(registry)] = (registry, instrumented)
+        self._registries[id(instrumented)] = (instrumented, instrumented)
+        return instrumented
+
+    def as_dict(self):
+        """Returns the metrics as dict of plain dicts, numbers and strings.
+
+        ```
+        {'encode': {typestr: {'calls': int, 'seconds': float,
+                              'bytes': int}},
+         'decode': {...},
+         'phases': {phase: {'calls': int, 'seconds': float}}}
+        ```
+        """
+        out = {'encode': {}, 'decode': {}, 'phases': {}}
+        for (direction, typestr), entry in self.coders.items():
+            out[direction][typestr] = dict(
+                zip(('calls', 'seconds', 'bytes'), entry))
+        for name, entry in self.phases.items():
+            out['phases'][name] = dict(zip(('calls', 'seconds'), entry))
+        return out
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.as_dict())
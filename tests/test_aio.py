@@ -0,0 +1,83 @@
+import sys
+sys.path.append('..')
+
+from sciserialize import aio
+import asyncio
+import datetime
+import socket
+import numpy as np
+
+
+def run_pair(write, read):
+    # Runs the writer and reader coroutines on the ends of a socket pair.
+    async def main():
+        left, right = socket.socketpair()
+        _, writer = await asyncio.open_connection(sock=left)
+        reader, _ = await asyncio.open_connection(sock=right)
+
+        async def write_and_close():
+            await write(writer)
+            writer.close()
+            await writer.wait_closed()
+        received, _ = await asyncio.gather(read(reader), write_and_close())
+        return received
+    return asyncio.run(main())
+
+
+class TestAsyncStreaming:
+    records = [{'i': i, 'dt': datetime.timedelta(i), 'tags': {i}}
+               for i in range(10)]
+    array = np.random.randn(2 ** 20)
+
+    def check(self, received):
+        assert received[:-1] == self.records
+        assert np.all(received[-1]['array'] == self.array)
+
+    def test_pack_iter_unpack(self):
+        async def write(writer):
+            packer = aio.StreamPacker(writer, chunk_size=4096)
+            for record in self.records + [{'array': self.array}]:
+                await packer.pack(record)
+
+        async def read(reader):
+            return [obj async for obj in aio.iter_unpack(reader)]
+        self.check(run_pair(write, read))
+
+    def test_pack_compressed_single_pass(self):
+        async def write(writer):
+            packer = aio.StreamPacker(writer, single_pass=True,
+                                      compression='zlib')
+            for record in self.records + [{'array': self.array}]:
+                await packer.pack(record)
+
+        async def read(reader):
+            return [obj async for obj in aio.iter_unpack(
+                reader, single_pass=True)]
+        self.check(run_pair(write, read))
+
+    def test_single_pass_buffers_in_pieces(self):
+        from sciserialize import serializers
+        packer = aio.StreamPacker(None, single_pass=True)
+        record = {'array': self.array, 'dt': datetime.timedelta(1)}
+        pieces = list(aio._iter_msgpack(record, packer._packer, True,
+                                        packer._encode_type))
+        # The array bytes are not packed into one bytes object:
+        assert max(len(piece) for piece in pieces
+                   if not isinstance(piece, memoryview)) < 1000
+        assert any(np.shares_memory(np.frombuffer(piece, np.uint8),
+                                    self.array)
+                   for piece in pieces if isinstance(piece, memoryview))
+        decoded = serializers.unpackb(b''.join(pieces), single_pass=True)
+        assert np.all(decoded['array'] == self.array)
+        assert decoded['dt'] == record['dt']
+
+    def test_dump_iter_load(self):
+        async def write(writer):
+            dumper = aio.StreamDumper(writer, chunk_size=4096)
+            for record in self.records + [{'array': self.array}]:
+                await dumper.dump(record)
+
+        async def read(reader):
+            return [obj async for obj in aio.iter_load(reader,
+                                                       chunk_size=1000)]
+        self.check(run_pair(write, read))
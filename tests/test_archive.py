@@ -0,0 +1,101 @@
+import sys
+sys.path.append('..')
+
+from sciserialize import archive
+import datetime
+import numpy as np
+import pytest
+
+
+def record(i):
+    return {'run': i, 'data': np.arange(i + 1.), 'time': datetime.datetime(
+        2020, 1, 1) + datetime.timedelta(i)}
+
+
+class TestArchive:
+
+    def write(self, path, n=10, mode='w'):
+        with archive.Archive(path, mode) as a:
+            for i in range(n):
+                a.append(record(i), key='run-{:03d}'.format(i))
+
+    def test_random_access(self, tmp_path):
+        path = str(tmp_path / 'test.sca')
+        self.write(path)
+        with archive.Archive(path) as a:
+            assert len(a) == 10
+            assert a['run-007']['run'] == 7
+            assert np.all(a[3]['data'] == np.arange(4.))
+            assert a[-1]['run'] == 9
+            assert [r['run'] for r in a[2:5]] == [2, 3, 4]
+            assert a.get('missing') is None
+            assert 'run-001' in a and 'run-100' not in a
+            assert a.position('run-004') == 4
+            assert a.typestr(0) == 'dict'
+            with pytest.raises(KeyError):
+                a['missing']
+            with pytest.raises(IndexError):
+                a[10]
+
+    def test_read_after_append(self, tmp_path):
+        path = str(tmp_path / 'test.sca')
+        with archive.Archive(path, 'w') as a:
+            a.append({'x': 1}, key='a')
+            assert a['a'] == {'x': 1}
+            a.append({'x': 2}, key='b')
+            assert a[1] == {'x': 2} and a[0] == {'x': 1}
+        with archive.Archive(path, 'a') as a:
+            a.append({'x': 3}, key='c')
+            assert a['c'] == {'x': 3}
+            assert [r['x'] for r in a] == [1, 2, 3]
+        with archive.Archive(path) as a:
+            assert a.keys() == ['a', 'b', 'c']
+
+    def test_scan(self, tmp_path):
+        path = str(tmp_path / 'test.sca')
+        self.write(path)
+        with archive.Archive(path) as a:
+            assert [k for k, _ in a.scan('run-002', 'run-005')] == [
+                'run-002', 'run-003', 'run-004']
+            assert [r['run'] for _, r in a.scan(8)] == [8, 9]
+            assert [r['run'] for r in a] == list(range(10))
+
+    def test_append_after_reopen(self, tmp_path):
+        path = str(tmp_path / 'test.sca')
+        self.write(path, 3)
+        with archive.Archive(path, 'a') as a:
+            assert a.append(np.ones(3)) == 3
+            a.append('text', key='note')
+            with pytest.raises(KeyError):
+                a.append(1, key='run-000')
+            with pytest.raises(TypeError):
+                a.append(1, key=5)
+        with archive.Archive(path) as a:
+            assert a.keys() == ['run-000', 'run-001', 'run-002', None,
+                                'note']
+            assert a['note'] == 'text'
+            assert a.typestr(3) == 'ndarray'
+            assert np.all(a[3] == np.ones(3))
+            assert a['run-002']['run'] == 2
+            with pytest.raises(ValueError):
+                a.append(1)
+
+    def test_flush(self, tmp_path):
+        path = str(tmp_path / 'test.sca')
+        a = archive.Archive(path, 'w')
+        a.append(1, key='one')
+        a.flush()
+        with archive.Archive(path) as b:
+            assert b['one'] == 1
+        a.append(2, key='two')
+        a.close()
+        with archive.Archive(path) as b:
+            assert b['two'] == 2 and len(b) == 2
+
+    def test_invalid_file(self, tmp_path):
+        path = tmp_path / 'test.sca'
+        path.write_bytes(b'no archive' * 10)
+        with pytest.raises(ValueError):
+            archive.Archive(str(path))
+        with pytest.raises(ValueError):
+            archive.Archive(str(path), 'x')
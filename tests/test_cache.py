@@ -0,0 +1,89 @@
+import sys
+sys.path.append('..')
+
+from sciserialize import cache
+import datetime
+import os
+import subprocess
+import numpy as np
+import pandas as pd
+import pytest
+
+
+class TestHashKey:
+
+    def test_content(self):
+        a = np.arange(10.)
+        assert cache.hash_key(a) == cache.hash_key(a.copy())
+        assert cache.hash_key(a) != cache.hash_key(a.astype(int))
+        assert cache.hash_key(a) != cache.hash_key(a.reshape(2, 5))
+        assert cache.hash_key({'a': 1, 'b': 2}) == cache.hash_key(
+            {'b': 2, 'a': 1})
+        assert cache.hash_key((1, 2)) != cache.hash_key([1, 2])
+        assert cache.hash_key(1) != cache.hash_key(1.0)
+        df = pd.DataFrame({'x': [1, 2], 'y': ['a', 'b']})
+        assert cache.hash_key(df) == cache.hash_key(df.copy())
+        assert cache.hash_key(datetime.datetime(2020, 1, 1)) != \
+            cache.hash_key(datetime.datetime(2020, 1, 2))
+
+    def test_stable_across_processes(self):
+        # Set order depends on the hash seed of the process:
+        statement = ('from sciserialize import cache; '
+                     'print(cache.hash_key({"a", "b", "c", "d"}))')
+        root = os.path.join(os.path.dirname(__file__), '..')
+        keys = {subprocess.run(
+            [sys.executable, '-c', statement], cwd=root, check=True,
+            stdout=subprocess.PIPE, universal_newlines=True,
+            env=dict(os.environ, PYTHONHASHSEED=str(seed))).stdout
+            for seed in range(3)}
+        assert len(keys) == 1
+        assert keys.pop().strip() == cache.hash_key({'d', 'c', 'b', 'a'})
+
+
+class TestCache:
+
+    def test_mapping(self, tmp_path):
+        c = cache.Cache(str(tmp_path))
+        key = c.key(np.arange(3), n=2)
+        assert key not in c and c.get(key) is None
+        c[key] = {'result': np.ones(1000)}
+        assert key in c and len(c) == 1 and c.keys() == [key]
+        result = c[key]['result']
+        assert np.all(result == 1) and result.flags.writeable
+        del c[key]
+        with pytest.raises(KeyError):
+            c[key]
+        assert c.stats() == {'hits': 1, 'misses': 2, 'evictions': 0}
+
+    def test_memoize(self, tmp_path):
+        calls = []
+
+        @cache.Cache(str(tmp_path)).memoize
+        def scale(array, factor=2):
+            calls.append(factor)
+            return array * factor
+
+        assert np.all(scale(np.arange(5)) == np.arange(5) * 2)
+        assert np.all(scale(np.arange(5)) == np.arange(5) * 2)
+        assert np.all(scale(np.arange(5), factor=3) == np.arange(5) * 3)
+        assert calls == [2, 3]
+        assert scale.cache.stats()['hits'] == 1
+        # Another instance shares the stored results:
+        again = cache.Cache(str(tmp_path)).memoize(
+            name=scale.__module__ + '.' + scale.__qualname__)(
+                lambda array, factor=2: None)
+        assert np.all(again(np.arange(5)) == np.arange(5) * 2)
+
+    def test_lru_eviction(self, tmp_path):
+        c = cache.Cache(str(tmp_path))
+        for i in range(3):
+            c[str(i)] = np.zeros(1000)
+            os.utime(c._path(str(i)), (i, i))
+        c['0']
+        size = c.size()
+        c.max_size = size
+        c['3'] = np.zeros(1000)
+        assert sorted(c.keys()) == ['0', '2', '3']
+        assert c.evictions == 1
+        c.clear()
+        assert len(c) == 0 and c.evictions == 4
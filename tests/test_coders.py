@@ -5,6 +5,7 @@ from sciserialize import coders
 import datetime
 import numpy as np
 import pandas as pd
+import pytest
 
 
 # Maybe test_data could be more tha one...
@@ -55,6 +56,37 @@ class TestDateTimeIsoStringCoder(TestCoder):
     test_data_false = {1, 3, 5, datetime.datetime.now()}
 
 
+class TestDateTimeIsoStringCoderFallback:
+    coder = coders.DateTimeIsoStringCoder()
+
+    def test_decode(self):
+        assert self.coder.decode({'isostr': '2014-12-24T05:55:55'}) == \
+            datetime.datetime(2014, 12, 24, 5, 55, 55)
+        assert self.coder.decode({'isostr': 'Dec 24 2014'}) == \
+            datetime.datetime(2014, 12, 24)
+
+
+class TestDateTimeEpochCoder(TestCoder):
+    coder = coders.DateTimeEpochCoder()
+    test_data = datetime.datetime(2020, 1, 2, 3, 4, 5, 6)
+    test_data_false = datetime.timedelta(3)
+
+    def test_timezones(self):
+        import zoneinfo
+        for tz in (datetime.timezone(datetime.timedelta(hours=-3)),
+                   zoneinfo.ZoneInfo('Europe/Berlin')):
+            data = datetime.datetime(1950, 6, 1, 12, tzinfo=tz)
+            decoded = self.coder.decode(self.coder.encode(data))
+            assert decoded == data
+            assert decoded.utcoffset() == data.utcoffset()
+
+    def test_units(self):
+        for value, unit in ((1, 's'), (1000, 'ms'), (10 ** 9, 'ns')):
+            assert self.coder.decode(
+                {'epoch': value, 'unit': unit, 'tz': None}) == \
+                datetime.datetime(1970, 1, 1, 0, 0, 1)
+
+
 class TestTimeDeltaCoder(TestCoder):
     coder = coders.TimeDeltaCoder()
     test_data = datetime.datetime.now() - datetime.datetime.now()
@@ -67,12 +99,160 @@ class TestNumpyArrayCoder(TestCoder):
     test_data_false = np.int16(19)
 
 
+class TestNumpyDateTime64Coder(TestCoder):
+    coder = coders.NumpyDateTime64Coder()
+    test_data = np.datetime64('2020-01-01T12:00:00.123456789')
+    test_data_false = np.timedelta64(5, 'ms')
+
+
+class TestNumpyTimeDelta64Coder(TestCoder):
+    coder = coders.NumpyTimeDelta64Coder()
+    test_data = np.timedelta64(5, 'ms')
+    test_data_false = np.datetime64('2020-01-01')
+
+
+class TestNumpyDateTime64ArrayCoder(TestCoder):
+    coder = coders.NumpyArrayCoder()
+    test_data = np.arange('2020-01', '2021-01', dtype='datetime64[h]')
+    test_data_false = np.datetime64('2020-01-01')
+
+
+class TestNumpyArrayCoderZeroCopy:
+    test_data = np.random.randn(70, 8)
+
+    def test_encode_contiguous_is_not_copied(self):
+        d = coders.NumpyArrayCoder().encode(self.test_data)
+        assert isinstance(d['bytes'], memoryview)
+        assert np.shares_memory(np.asarray(d['bytes']), self.test_data)
+
+    def test_encode_non_contiguous(self):
+        coder = coders.NumpyArrayCoder()
+        d = coder.encode(self.test_data[:, ::2])
+        assert np.all(coder.decode(d) == self.test_data[:, ::2])
+
+    def test_decode_zero_copy(self):
+        coder = coders.NumpyArrayCoder()
+        d = coder.encode(self.test_data)
+        d['bytes'] = bytes(d['bytes'])
+        array = coder.decode(d)
+        assert not array.flags.writeable
+        assert np.shares_memory(array, np.frombuffer(d['bytes'], np.uint8))
+        d['bytes'] = bytearray(d['bytes'])
+        array = coder.decode(d)
+        assert array.flags.writeable
+        assert np.shares_memory(array, np.frombuffer(d['bytes'], np.uint8))
+        assert np.all(array == self.test_data)
+
+    def test_decode_writable(self):
+        coder = coders.NumpyArrayCoder(writable=True)
+        d = coder.encode(self.test_data)
+        d['bytes'] = bytes(d['bytes'])
+        array = coder.decode(d)
+        assert array.flags.writeable
+        assert not np.shares_memory(array,
+                                    np.frombuffer(d['bytes'], np.uint8))
+        assert np.all(array == self.test_data)
+
+
 class TestNumpyMaskedArrayCoder(TestCoder):
     coder = coders.NumpyMaskedArrayCoder()
     test_data = np.ma.masked_array(np.random.randn(3), [True, False, True])
     test_data_false = np.int16(19)
 
 
+class TestNumpyMaskedArrayCoderMask:
+    coder = coders.NumpyMaskedArrayCoder()
+
+    def test_bit_packed(self):
+        data = np.ma.masked_array(np.arange(20.).reshape(4, 5),
+                                  np.arange(20).reshape(4, 5) % 3 == 0)
+        encoded = self.coder.encode(data)
+        assert len(encoded['mask_bits']) == 3 and 'mask_bytes' not in encoded
+        decoded = self.coder.decode(encoded)
+        assert np.all(decoded.mask == data.mask)
+        assert decoded.mask.shape == data.mask.shape
+
+    def test_nomask(self):
+        data = np.ma.masked_array([1., 2., 3.])
+        encoded = self.coder.encode(data)
+        assert 'mask_bits' not in encoded
+        assert self.coder.decode(encoded).mask is np.ma.nomask
+
+    def test_legacy_mask_bytes(self):
+        data = np.ma.masked_array([1., 2., 3.], [True, False, True])
+        encoded = self.coder.encode(data)
+        del encoded['mask_bits']
+        encoded['mask_bytes'] = bytes(np.ma.getmaskarray(data))
+        assert np.all(self.coder.decode(encoded).mask == data.mask)
+
+
+class TestPandasCategoricalCoder(TestCoder):
+    coder = coders.PandasCategoricalCoder()
+    test_data = pd.Categorical(['a', 'b', 'a', None], categories=['b', 'a'],
+                               ordered=True)
+    test_data_false = pd.Index(['a', 'b'])
+
+    def test_coder(self):
+        decoded = self.coder.decode(self.coder.encode(self.test_data))
+        assert decoded.equals(self.test_data) and decoded.ordered
+        assert self.coder.encode(self.test_data)['codes']['dtype'] == 'int8'
+
+
+class TestScipySparseCoder:
+    coder = coders.ScipySparseCoder()
+
+    def test_formats(self):
+        sparse = pytest.importorskip('scipy.sparse')
+        matrix = sparse.random(20, 30, density=0.1, format='csr',
+                               random_state=0)
+        for fmt in ('csr', 'csc', 'coo', 'lil', 'dok'):
+            data = matrix.asformat(fmt)
+            decoded = self.coder.decode(self.coder.encode(data))
+            assert decoded.format == fmt and decoded.shape == data.shape
+            assert (decoded != data).nnz == 0
+
+    def test_sparse_arrays(self):
+        sparse = pytest.importorskip('scipy.sparse')
+        if not hasattr(sparse, 'sparray'):
+            pytest.skip('scipy.sparse.sparray requires scipy 1.11')
+        array = sparse.random_array((20, 30), density=0.1, format='csr',
+                                    random_state=0)
+        for fmt in ('csr', 'csc', 'coo', 'lil'):
+            data = array.asformat(fmt)
+            decoded = coders.decode_types(coders.encode_types(data))
+            assert isinstance(decoded, sparse.sparray)
+            assert decoded.format == fmt and (decoded != data).nnz == 0
+        matrix = coders.decode_types(coders.encode_types(array.tocsr().T))
+        assert isinstance(matrix, sparse.sparray)
+        assert not isinstance(coders.decode_types(coders.encode_types(
+            sparse.csr_matrix(array))), sparse.sparray)
+
+    def test_without_scipy(self):
+        # Stands in for `scipy.sparse` by the constructor arguments:
+        class FakeSparse:
+            def __getattr__(self, name):
+                return lambda args, shape: (name, args, shape)
+
+        class FakeCsr:
+            format = 'csr'
+            shape = (2, 3)
+            indptr = np.array([0, 1, 2])
+            indices = np.array([2, 0])
+            data = np.array([1., 2.])
+
+        for coder, suffix in ((coders.ScipySparseCoder(), '_matrix'),
+                              (coders.ScipySparseArrayCoder(), '_array')):
+            coder.sparse = FakeSparse()
+            encoded = coder.encode(FakeCsr())
+            assert encoded[coders.TYPE_KEY] == coder.typestr
+            assert encoded['format'] == 'csr' and encoded['shape'] == [2, 3]
+            name, (values, indices, indptr), shape = coder.decode(encoded)
+            assert name == 'csr' + suffix and shape == (2, 3)
+            assert np.all(values == FakeCsr.data)
+            assert np.all(indices == FakeCsr.indices)
+            assert np.all(indptr == FakeCsr.indptr)
+
+
 class TestDataFrameCoder(TestCoder):
     coder = coders.DataFrameCoder()
     test_data = pd.DataFrame(np.random.randn(19, 3), columns=['A', 'Be', 10])
@@ -80,6 +260,187 @@ class TestDataFrameCoder(TestCoder):
                                          [True, False, True])
 
 
+class TestDataFrameCoderColumns:
+    coder = coders.DataFrameCoder()
+
+    def test_mixed_dtypes(self):
+        df = pd.DataFrame(
+            {'f': np.random.randn(5), 'i': np.arange(5, dtype=np.int32),
+             's': list('abcde'),
+             't': pd.date_range('2020', periods=5, tz='Europe/Berlin')},
+            index=pd.date_range('2021', periods=5, freq='D', name='time'))
+        encoded = self.coder.encode(df)
+        assert [a['dtype'] for a in encoded['arrays']] == [
+            'float64', 'int32', 'object', 'datetime64[ns]']
+        decoded = self.coder.decode(encoded)
+        pd.testing.assert_frame_equal(decoded, df)
+        assert decoded.index.freq == df.index.freq
+
+    def test_categorical_columns(self):
+        df = pd.DataFrame(
+            {'c': pd.Categorical(list('xyxx'), categories=list('zyx')),
+             's': ['foo', 'bar', 'foo', 'foo'],
+             'm': ['foo', 1, 'foo', 'foo'],
+             'u': list('abcd')},
+            index=pd.CategoricalIndex(list('pqpq'), name='k'))
+        encoded = self.coder.encode(df)
+        assert [sorted(a) for a in encoded['arrays'][:2]] == [
+            ['categories', 'codes', 'ordered'],
+            ['categories', 'codes', 'dense', 'ordered']]
+        assert [a['dtype'] for a in encoded['arrays'][2:]] == [
+            'object', 'object']
+        pd.testing.assert_frame_equal(self.coder.decode(encoded), df)
+
+    def test_unhashable_values(self):
+        df = pd.DataFrame({'a': [[1, 2], [3]] * 5, 'b': [{'x': 1}] * 10,
+                           'c': ['s', None] * 5})
+        encoded = self.coder.encode(df)
+        assert [a['dtype'] for a in encoded['arrays']] == ['object'] * 3
+        decoded = self.coder.decode(encoded)
+        assert decoded['a'].tolist() == df['a'].tolist()
+        assert decoded['b'].tolist() == df['b'].tolist()
+        assert decoded['c'].tolist() == df['c'].tolist()
+
+    def test_multi_index(self):
+        index = pd.MultiIndex.from_product([['x', 'y'], [1, 2]],
+                                           names=['l', 'n'])
+        df = pd.DataFrame(np.random.randn(4, 4), index=index, columns=index)
+        pd.testing.assert_frame_equal(
+            self.coder.decode(self.coder.encode(df)), df)
+
+
+class TestPandasIndexCoder:
+    coder = coders.PandasIndexCoder()
+
+    def test_coder(self):
+        for index in (pd.RangeIndex(2, 10, 3, name='r'),
+                      pd.Index(['a', 3, 2.5]),
+                      pd.date_range('2020', periods=4, freq='H',
+                                    tz='US/Eastern', name='time'),
+                      pd.MultiIndex.from_product([['x', 'y'], [1, 2]])):
+            decoded = self.coder.decode(self.coder.encode(index))
+            pd.testing.assert_index_equal(decoded, index)
+            assert decoded.names == index.names
+
+
+class TestPandasTimestampCoder(TestCoder):
+    coder = coders.PandasTimestampCoder()
+    test_data = pd.Timestamp('2020-01-01 00:00:00.000000001',
+                             tz='Europe/Berlin')
+    test_data_false = datetime.datetime.now()
+
+
+class TestTypeCoderRegistry:
+    registry = coders.TypeCoderRegistry(coders.TYPE_CODER_LIST)
+
+    def test_coder_for_object(self):
+        assert isinstance(self.registry.coder_for_object({1}),
+                          coders.SetCoder)
+        assert isinstance(self.registry.coder_for_object(np.ones(2)),
+                          coders.NumpyArrayCoder)
+        assert self.registry.coder_for_object(1j) is None
+
+    def test_subclass_resolved_by_mro(self):
+        class MySet(set):
+            pass
+        registry = coders.TypeCoderRegistry(
+            [coders.NumpyArrayCoder(), coders.NumpyMaskedArrayCoder(),
+             coders.SetCoder()])
+        masked = np.ma.masked_array([1., 2.], [True, False])
+        assert isinstance(registry.coder_for_object(masked),
+                          coders.NumpyMaskedArrayCoder)
+        assert isinstance(registry.coder_for_object(MySet()),
+                          coders.SetCoder)
+
+    def test_coder_for_typestr(self):
+        assert isinstance(self.registry.coder_for_typestr('timedelta'),
+                          coders.TimeDeltaCoder)
+        assert self.registry.coder_for_typestr('unknown') is None
+
+    def test_verify_type_reimplemented(self):
+        class PositiveCoder(coders.TypeCoder):
+            type_ = complex
+            typestr = 'positive'
+
+            def verify_type(self, obj):
+                return isinstance(obj, complex) and obj.real > 0
+
+        registry = coders.TypeCoderRegistry([PositiveCoder()])
+        assert registry.coder_for_object(1 + 1j) is not None
+        assert registry.coder_for_object(-1 + 1j) is None
+
+    def test_get_registry_is_cached(self):
+        coder_list = list(coders.TYPE_CODER_LIST)
+        registry = coders.get_registry(coder_list)
+        assert coders.get_registry(coder_list) is registry
+        assert coders.get_registry(registry) is registry
+        coder_list.append(coders.SetCoder())
+        assert coders.get_registry(coder_list) is not registry
+
+    def test_configured_cache_bounded(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from sciserialize import serializers
+        registry = coders.TypeCoderRegistry(coders.TYPE_CODER_LIST)
+        configured = registry.configure(compression='zlib')
+        assert registry.configure(compression='zlib') is configured
+        for _ in range(2 * coders.CONFIGURED_CACHE_SIZE):
+            with ThreadPoolExecutor(2) as executor:
+                packed = serializers.packb(
+                    np.arange(1000.), type_coder_list=registry,
+                    compression='zlib', executor=executor)
+            assert np.all(serializers.unpackb(packed) == np.arange(1000.))
+        assert len(registry._configured) == coders.CONFIGURED_CACHE_SIZE
+
+    def test_missing_lazy_type(self):
+        class MissingCoder(coders.TypeCoder):
+            type_name = 'sys.MissingType'
+            typestr = 'missing'
+
+        registry = coders.TypeCoderRegistry([MissingCoder(),
+                                             coders.SetCoder()])
+        assert isinstance(registry.coder_for_object({1}), coders.SetCoder)
+        assert registry.coder_for_object(1j) is None
+
+
+class TestLazyRegistration:
+    script = '''
+import sys
+import sciserialize as scs
+assert scs.unpackb(scs.packb({'a': {1}})) == {'a': {1}}
+assert not {'numpy', 'pandas', 'dateutil'} & set(sys.modules)
+import numpy as np
+assert scs.unpackb(scs.packb(np.arange(3))).tolist() == [0, 1, 2]
+assert 'pandas' not in sys.modules
+assert scs.unpackb(scs.packb({'__type__': 'timestamp', 'value': 0,
+                              'tz': None})).value == 0
+'''
+
+    def test_heavy_modules_imported_on_demand(self):
+        import os
+        import subprocess
+        root = os.path.join(os.path.dirname(__file__), '..')
+        subprocess.run([sys.executable, '-c', self.script], cwd=root,
+                       check=True)
+
+    def test_type_name_registration(self):
+        class ComplexCoder(coders.TypeCoder):
+            type_name = 'builtins.complex'
+            typestr = 'complex'
+
+        registry = coders.TypeCoderRegistry([ComplexCoder()])
+        assert isinstance(registry.coder_for_object(1j), ComplexCoder)
+
+    def test_type_name_not_imported(self):
+        class UnknownCoder(coders.TypeCoder):
+            type_name = 'not_imported_module.Type'
+            typestr = 'unknown'
+
+        registry = coders.TypeCoderRegistry([UnknownCoder()])
+        assert registry.coder_for_object(1j) is None
+        assert isinstance(registry.coder_for_typestr('unknown'),
+                          UnknownCoder)
+
+
 class TestEncodeDecodeTypes():
     test_data = {
         'a': [1, 2, 3, [np.random.randn(10, 2, 3), 'Hello']],
@@ -100,6 +461,246 @@ class TestEncodeDecodeTypes():
         for k, v in self.test_data['b'].items():
             assert np.all(v == dec['b'][k])
 
+
+class TestTraversal:
+
+    def deep_tree(self, depth):
+        tree = {'leaf': np.arange(2)}
+        for level in range(depth):
+            tree = {'child': tree, 'level': [level, (level, 'a')]}
+        return tree
+
+    def test_deeper_than_recursion_limit(self):
+        depth = 3 * sys.getrecursionlimit()
+        encoded = coders.encode_types(self.deep_tree(depth),
+                                      preserve_tuples=True)
+        decoded = coders.decode_types(encoded)
+        for level in range(depth - 1, -1, -1):
+            assert decoded['level'] == [level, (level, 'a')]
+            decoded = decoded['child']
+        assert np.all(decoded['leaf'] == np.arange(2))
+
+    def test_circular_reference(self):
+        from sciserialize import serializers
+        a = [1]
+        a.append(a)
+        d = {'x': {}}
+        d['x']['d'] = d
+        records = [{'a': i} for i in range(10)]
+        records[3]['self'] = records
+        for data, options in ((a, {}), (d, {}), ((a,), {}),
+                              (records, {'record_batches': True})):
+            with pytest.raises(ValueError, match='Circular reference'):
+                coders.encode_types(data, **options)
+        with pytest.raises(ValueError, match='Circular reference'):
+            serializers.packb(a)
+        with pytest.raises(ValueError, match='Circular reference'):
+            serializers.dumps(a)
+        # Shared objects, that are no cycles, are encoded repeatedly:
+        shared = [1, 2]
+        assert coders.encode_types([shared, {'s': shared}]) == [
+            [1, 2], {'s': [1, 2]}]
+        assert coders.decode_types(coders.encode_types(
+            a, track_refs=True))[1][1] is not None
+
+    def test_copies_or_reuses_containers(self):
+        key = coders.TYPE_KEY
+        data = {'a': [1, {'b': 2}], 'c': {key: 'unknown', 'x': [3]},
+                'd': (4, [5])}
+        encoded = coders.encode_types(data)
+        assert encoded == {'a': [1, {'b': 2}], 'c': {key: 'unknown',
+                                                     'x': [3]},
+                           'd': [4, [5]]}
+        assert encoded['a'] is not data['a']
+        assert encoded['a'][1] is not data['a'][1]
+        decoded = coders.decode_types(data)
+        assert decoded == data and decoded['a'] is not data['a']
+        # Unknown types are decoded with the type key last:
+        assert list(decoded['c']) == ['x', key]
+        assert list(data['c']) == [key, 'x']
+        inner = encoded['a']
+        decoded = coders.decode_types(encoded, in_place=True)
+        assert decoded['a'] is inner
+
+    def test_subclasses(self):
+        import collections
+        encoded = coders.encode_types({'x': collections.OrderedDict(a=1),
+                                       'y': np.float64(1.5)})
+        assert type(encoded['x']) is dict
+        assert type(encoded['y']) is np.float64
+        decoded = coders.decode_types(collections.OrderedDict(a=[1]),
+                                      in_place=True)
+        assert type(decoded) is dict and decoded == {'a': [1]}
+
+
+class TestHomogeneousAndTuples:
+    test_data = {'f': [float(i) for i in range(100)],
+                 'i': tuple(range(100)),
+                 'b': [True, False] * 10,
+                 'big': [2 ** 70] * 20,
+                 'mixed': [1, 2.0] * 10,
+                 'short': [1.0, 2.0],
+                 't': (1, 'a', (2, 3))}
+
+    def test_pack_homogeneous(self):
+        encoded = coders.encode_types(self.test_data, pack_homogeneous=True)
+        for key in ('f', 'i', 'b'):
+            assert encoded[key][coders.TYPE_KEY] == 'typed_list'
+        for key in ('big', 'mixed', 'short'):
+            assert type(encoded[key]) is list
+        decoded = coders.decode_types(encoded)
+        assert decoded['f'] == self.test_data['f']
+        # Tuples are decoded as lists regardless of their length:
+        assert decoded['i'] == list(self.test_data['i'])
+        assert type(decoded['b'][0]) is bool
+        assert decoded['t'] == [1, 'a', [2, 3]]
+
+    def test_min_length(self):
+        encoded = coders.encode_types(self.test_data, pack_homogeneous=2)
+        assert encoded['short'][coders.TYPE_KEY] == 'typed_list'
+
+    def test_as_array(self):
+        registry = coders.get_registry().configure(as_array=True)
+        decoded = coders.decode_types(
+            coders.encode_types(self.test_data, pack_homogeneous=True),
+            registry)
+        assert decoded['f'].dtype == np.float64
+        assert np.all(decoded['i'] == np.arange(100))
+
+    def test_preserve_tuples(self):
+        encoded = coders.encode_types(self.test_data, preserve_tuples=True)
+        decoded = coders.decode_types(encoded)
+        assert decoded['t'] == self.test_data['t']
+        assert decoded['i'] == self.test_data['i']
+        assert type(decoded['f']) is list
+        encoded = coders.encode_types(self.test_data, pack_homogeneous=True,
+                                      preserve_tuples=True)
+        assert encoded['i'][coders.TYPE_KEY] == 'typed_list'
+        decoded = coders.decode_types(encoded)
+        assert decoded['i'] == self.test_data['i']
+        assert decoded['t'] == self.test_data['t']
+        assert type(decoded['f']) is list
+
+
+class TestRecordBatches:
+    test_data = [{'x': float(i), 'n': i, 'name': str(i),
+                  'dt': datetime.timedelta(i)} for i in range(20)]
+
+    def test_encode_decode(self):
+        encoded = coders.encode_types(self.test_data, record_batches=True)
+        assert encoded[coders.TYPE_KEY] == coders.RECORD_BATCH_TYPE_NAME
+        assert encoded['keys'] == ['x', 'n', 'name', 'dt']
+        assert encoded['columns'][0][coders.TYPE_KEY] == 'typed_list'
+        assert encoded['columns'][2] == [str(i) for i in range(20)]
+        assert coders.decode_types(encoded) == self.test_data
+
+    def test_not_a_batch(self):
+        data = self.test_data[:-1] + [{'x': 1.}]
+        assert coders.encode_types(data, record_batches=True) == \
+            coders.encode_types(data)
+        short = self.test_data[:3]
+        assert coders.encode_types(short, record_batches=True) == \
+            coders.encode_types(short)
+        assert coders.encode_types(short, record_batches=3)[
+            coders.TYPE_KEY] == coders.RECORD_BATCH_TYPE_NAME
+
+    def test_records_as(self):
+        encoded = coders.encode_types(self.test_data, record_batches=True)
+        registry = coders.get_registry(coders.TYPE_CODER_LIST)
+        arrays = coders.decode_types(
+            encoded, registry.configure(records_as='arrays'))
+        assert arrays['n'].dtype == np.int64
+        assert np.all(arrays['x'] == np.arange(20.))
+        frame = coders.decode_types(
+            encoded, registry.configure(records_as='dataframe'))
+        assert list(frame.columns) == ['x', 'n', 'name', 'dt']
+        assert frame['name'].tolist() == [str(i) for i in range(20)]
+
+    def test_object_columns(self):
+        data = [{'b': [i], 'name': str(i)} for i in range(20)]
+        encoded = coders.encode_types(data, record_batches=True)
+        registry = coders.get_registry(coders.TYPE_CODER_LIST)
+        arrays = coders.decode_types(
+            encoded, registry.configure(records_as='arrays'))
+        assert arrays['b'].shape == (20,) and arrays['b'].dtype == object
+        assert arrays['b'][3] == [3]
+        assert arrays['name'].dtype == object
+        frame = coders.decode_types(
+            encoded, registry.configure(records_as='dataframe'))
+        assert frame['b'].tolist() == [[i] for i in range(20)]
+
+
+class TestLazyDecodeTypes:
+    test_data = {'meta': {'run_id': 7, 'tags': ['a', 'b']},
+                 'values': [np.arange(3), datetime.timedelta(1)]}
+
+    def test_lazy(self):
+        encoded = coders.encode_types(self.test_data)
+        dec = coders.decode_types(encoded, lazy=True)
+        assert isinstance(dec, coders.LazyDict)
+        assert isinstance(dec['meta'], coders.LazyDict)
+        assert dec['meta']['run_id'] == 7
+        assert dec['meta'] is dec['meta']
+        # Typed values are not decoded before they are accessed:
+        assert dec['values']._pending == [True, True]
+        assert dec['values'][1] == datetime.timedelta(1)
+        assert dec['values']._pending == [True, False]
+        assert dec['values'][0] is dec['values'][0]
+        plain = dec.materialize()
+        assert type(plain) is dict and type(plain['values']) is list
+        assert np.all(plain['values'][0] == self.test_data['values'][0])
+        assert plain['meta'] == self.test_data['meta']
+
+    def test_lazy_list_mutation(self):
+        dec = coders.decode_types(coders.encode_types([{1}, [2], 3]),
+                                  lazy=True)
+        dec.insert(0, 'x')
+        del dec[2]
+        assert dec.materialize() == ['x', {1}, 3]
+
+
+class TestSharedReferences:
+
+    def test_shared_objects(self):
+        array = np.arange(10.)
+        items = [1, 2]
+        data = {'a': array, 'b': [array, items], 'c': items, 'd': {1}}
+        encoded = coders.encode_types(data, track_refs=True)
+        assert encoded['a'][coders.TYPE_KEY] == coders.SHARED_TYPE_NAME
+        assert encoded['b'][0] == {coders.TYPE_KEY: coders.REF_TYPE_NAME,
+                                   'id': 0}
+        assert encoded['d'] == coders.encode_types({1})
+        decoded = coders.decode_types(encoded)
+        assert decoded['a'] is decoded['b'][0]
+        assert decoded['b'][1] is decoded['c']
+        assert np.all(decoded['a'] == array) and decoded['c'] == items
+
+    def test_cycles(self):
+        data = {'name': 'root', 'children': []}
+        data['children'].append({'parent': data})
+        data['children'].append(data['children'])
+        decoded = coders.decode_types(
+            coders.encode_types(data, track_refs=True))
+        assert decoded['children'][0]['parent'] is decoded
+        assert decoded['children'][1] is decoded['children']
+
+    def test_content_dedup(self):
+        data = [np.zeros(100), np.zeros(100), np.zeros(100, 'int64')]
+        encoded = coders.encode_types(data, track_refs='content')
+        assert encoded[1][coders.TYPE_KEY] == coders.REF_TYPE_NAME
+        assert encoded[2][coders.TYPE_KEY] == 'ndarray'
+        decoded = coders.decode_types(encoded)
+        assert decoded[0] is decoded[1]
+        assert decoded[2].dtype == np.int64
+        encoded = coders.encode_types(data, track_refs=True)
+        assert encoded[1][coders.TYPE_KEY] == 'ndarray'
+
+    def test_unresolved_reference(self):
+        with pytest.raises(ValueError):
+            coders.decode_types({coders.TYPE_KEY: coders.REF_TYPE_NAME,
+                                 'id': 0})
+
+
 if __name__ == '__main__':
     import pytest
 
@@ -0,0 +1,61 @@
+import sys
+sys.path.append('..')
+
+from sciserialize import compression, coders
+import numpy as np
+import pytest
+
+
+class TestCompression:
+    test_data = np.cumsum(np.random.randn(10000))
+
+    @pytest.mark.parametrize('codec', sorted(compression.CODECS))
+    @pytest.mark.parametrize('shuffle', compression.SHUFFLE_FILTERS)
+    def test_compress_decompress(self, codec, shuffle):
+        settings = compression.Compression(codec, chunk_size=30000,
+                                           shuffle=shuffle)
+        chunks, sizes = compression.compress(
+            memoryview(self.test_data).cast('B'), 8, settings)
+        assert len(chunks) == 3 and sum(sizes) == self.test_data.nbytes
+        out = compression.decompress(chunks, sizes, 8, codec, shuffle)
+        assert np.all(out.view(np.float64) == self.test_data)
+
+    def test_shuffle_compresses_better(self):
+        data = np.arange(100000, dtype=np.float64)
+        size = {}
+        for shuffle in compression.SHUFFLE_FILTERS:
+            chunks, _ = compression.compress(
+                memoryview(data).cast('B'), 8,
+                compression.Compression(shuffle=shuffle))
+            size[shuffle] = sum(len(c) for c in chunks)
+        assert size['byte'] < size[None] and size['bit'] < size[None]
+
+    def test_get_compression(self):
+        assert compression.get_compression(None) is None
+        assert compression.get_compression('bz2').codec == 'bz2'
+        assert compression.get_compression(
+            {'codec': 'lzma', 'shuffle': None}).shuffle is None
+        with pytest.raises(ValueError):
+            compression.get_compression('unknown')
+
+
+class TestCompressedCoders:
+    settings = compression.Compression(chunk_size=1000)
+
+    def test_ndarray(self):
+        data = np.random.randn(30, 20).astype(np.float32)
+        coder = coders.NumpyArrayCoder(compression=self.settings)
+        encoded = coder.encode(data)
+        assert 'bytes' not in encoded and len(encoded['chunks']) == 3
+        decoded = coders.NumpyArrayCoder().decode(encoded)
+        assert decoded.dtype == data.dtype and np.all(decoded == data)
+        assert decoded.flags.writeable
+
+    def test_configure(self):
+        coder = coders.NumpyMaskedArrayCoder().configure(
+            compression=self.settings, unknown=1)
+        assert coder.ndarray_coder.compression == self.settings
+        assert not hasattr(coder, 'unknown')
+        data = np.ma.masked_array(np.arange(500.), np.arange(500) % 3 == 0)
+        decoded = coders.NumpyMaskedArrayCoder().decode(coder.encode(data))
+        assert np.all(decoded == data) and np.all(decoded.mask == data.mask)
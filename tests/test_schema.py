@@ -0,0 +1,111 @@
+import sys
+sys.path.append('..')
+
+from sciserialize import schema, serializers
+import datetime
+import numpy as np
+import pytest
+
+
+def message(i=1):
+    return {'id': i, 'name': 'sensor', 'time': datetime.datetime(2020, 1, i),
+            'values': np.arange(4.) * i, 'tags': ['a', 'b'],
+            'points': [{'x': 1.0, 'when': datetime.timedelta(i)}],
+            'meta': {'a': 1.0, 'b': None}}
+
+
+def assert_message_equal(decoded, expected):
+    assert decoded.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, np.ndarray):
+            assert decoded[key].dtype == value.dtype
+            assert np.all(decoded[key] == value)
+        else:
+            assert decoded[key] == value
+
+
+class TestSchema:
+
+    def test_infer(self):
+        assert schema.infer(message()) == {
+            'id': int, 'name': str, 'time': 'datetime', 'values': 'ndarray',
+            'tags': [str], 'points': [{'x': float, 'when': 'timedelta'}],
+            'meta': {'a': float, 'b': None}}
+        assert schema.infer([1, 'a']) == [object]
+
+    @pytest.mark.parametrize('dump, load', [('packb', 'unpackb'),
+                                            ('dumps', 'loads')])
+    def test_round_trip(self, dump, load):
+        s = schema.Schema.from_example(message())
+        for i in range(1, 4):
+            data = getattr(s, dump)(message(i))
+            assert_message_equal(getattr(s, load)(data), message(i))
+            # The output is readable by the generic serializers:
+            assert_message_equal(getattr(serializers, load)(data), message(i))
+
+    def test_same_output_as_generic(self):
+        s = schema.Schema.from_example(message())
+        assert s.packb(message(2)) == serializers.packb(message(2))
+        assert s.dumps(message(2)) == serializers.dumps(message(2))
+
+    def test_any(self):
+        s = schema.Schema({'id': int, 'extra': object})
+        for extra in [{1, 2}, [datetime.timedelta(1)], 'text']:
+            obj = {'id': 1, 'extra': extra}
+            assert s.unpackb(s.packb(obj)) == obj
+
+    @pytest.mark.parametrize('obj', [
+        {'id': 1.5, 'values': np.zeros(2)},
+        {'id': True, 'values': np.zeros(2)},
+        {'id': 1, 'values': [1, 2]},
+        {'id': 1},
+        {'id': 1, 'values': np.zeros(2), 'other': 3},
+        [1, 2]])
+    def test_fallback(self, obj):
+        s = schema.Schema({'id': int, 'values': 'ndarray'})
+        decoded = s.unpackb(s.packb(obj))
+        assert serializers.packb(decoded) == serializers.packb(obj)
+
+    def test_fallback_native_leaves(self):
+        # Generically encoded messages with the keys of the schema:
+        s = schema.Schema({'a': int, 'b': [int]})
+        for obj in ({'a': datetime.timedelta(1), 'b': [1, {2}]},
+                    {'a': 1, 'b': [1, {2}]},
+                    {'a': {3}, 'b': [1]}):
+            assert s.unpackb(s.packb(obj)) == obj
+            assert s.loads(s.dumps(obj)) == obj
+        s = schema.Schema({'x': int})
+        assert s.decode({'x': '1'}) == {'x': '1'}
+        s = schema.Schema({'a': int}, fallback=False)
+        with pytest.raises(schema.SchemaError, match=r"\['a'\].*int"):
+            s.decode({'a': 1.5})
+
+    def test_mismatch_error(self):
+        s = schema.Schema({'id': int, 'points': [{'x': float}]},
+                          fallback=False)
+        with pytest.raises(schema.SchemaError, match=r"\['points'\]\['\*'\]"
+                                                     r"\['x'\].*float"):
+            s.encode({'id': 1, 'points': [{'x': 1.0}, {'x': 'a'}]})
+        with pytest.raises(schema.SchemaError, match='message'):
+            s.decode([1])
+
+    def test_tuples(self):
+        obj = {'t': (1, datetime.timedelta(1)), 'n': (1, 2)}
+        s = schema.Schema.from_example(obj)
+        assert s.spec == {'t': [object], 'n': [int]}
+        for dump, load in (('packb', 'unpackb'), ('dumps', 'loads')):
+            data = getattr(s, dump)(obj)
+            assert data == getattr(serializers, dump)(obj)
+            assert getattr(s, load)(data) == {
+                't': [1, datetime.timedelta(1)], 'n': [1, 2]}
+        s = schema.Schema.from_example(obj, preserve_tuples=True)
+        assert s.spec == {'t': 'tuple', 'n': 'tuple'}
+        assert s.packb(obj) == serializers.packb(obj, preserve_tuples=True)
+        assert s.unpackb(s.packb(obj)) == obj
+        assert s.loads(s.dumps(obj)) == obj
+
+    def test_invalid_schema(self):
+        with pytest.raises(ValueError):
+            schema.Schema({'values': 'no_such_type'})
+        with pytest.raises(ValueError):
+            schema.Schema([int, str])
@@ -1,8 +1,11 @@
 import sys
 sys.path.append('..')
 
-from sciserialize import serializers
+from sciserialize import serializers, coders
+import datetime
+import io
 import numpy as np
+import pytest
 
 
 class TestSerializers:
@@ -31,3 +34,358 @@ class TestSerializers:
         with open(fname, 'rb') as f:
             d = serializers.unpack(f)
         assert np.all(d == self.test_data)
+
+
+class TestSinglePassSerializers:
+    test_data = {'a': [np.random.randn(4, 3), {1, 2}],
+                 'b': {'c': datetime.datetime.now(),
+                       'd': datetime.timedelta(3, 4)},
+                 'e': 'text'}
+
+    def check(self, d):
+        assert np.all(d['a'][0] == self.test_data['a'][0])
+        assert d['a'][1] == self.test_data['a'][1]
+        assert d['b'] == self.test_data['b']
+        assert d['e'] == self.test_data['e']
+
+    def test_dumps_loads(self):
+        s = serializers.dumps(self.test_data, single_pass=True)
+        assert s == serializers.dumps(self.test_data)
+        self.check(serializers.loads(s, single_pass=True))
+
+    def test_packb_unpackb(self):
+        s = serializers.packb(self.test_data, single_pass=True)
+        self.check(serializers.unpackb(s, single_pass=True))
+        self.check(serializers.unpackb(serializers.packb(self.test_data),
+                                       single_pass=True))
+
+    def test_pickle(self):
+        data = [1j, {2}]
+        s = serializers.packb(data, enable_pickle=True, single_pass=True)
+        assert serializers.unpackb(s, enable_pickle=True,
+                                   single_pass=True) == data
+
+
+class TestStreaming:
+    records = [{'i': i, 't': datetime.timedelta(i), 'x': np.arange(i)}
+               for i in range(50)]
+
+    def check(self, records):
+        records = list(records)
+        assert len(records) == len(self.records)
+        for r, d in zip(records, self.records):
+            assert r['i'] == d['i'] and r['t'] == d['t']
+            assert np.all(r['x'] == d['x'])
+
+    def test_stream_packer(self, tmp_path):
+        fname = str(tmp_path / 'test_stream.mpk')
+        with open(fname, 'wb') as f:
+            packer = serializers.StreamPacker(f)
+            for record in self.records:
+                packer.pack(record)
+        with open(fname, 'rb') as f:
+            self.check(serializers.iter_unpack(f, read_size=64))
+        with open(fname, 'rb') as f:
+            self.check(serializers.iter_unpack(f, single_pass=True))
+
+    def test_stream_dumper(self, tmp_path):
+        fname = str(tmp_path / 'test_stream.json')
+        with open(fname, 'w') as f:
+            dumper = serializers.StreamDumper(f, single_pass=True)
+            for record in self.records:
+                dumper.dump(record)
+        with open(fname, 'r') as f:
+            self.check(serializers.iter_load(f))
+
+
+class TestContainer:
+    test_data = {'a': np.random.randn(100, 3),
+                 'b': [np.ma.masked_array([1., 2.], [True, False]),
+                       np.arange(5, dtype=np.int16)],
+                 'c': {'d': 'meta', 'e': datetime.timedelta(2)}}
+
+    def check(self, d):
+        assert np.all(d['a'] == self.test_data['a'])
+        assert np.all(d['b'][0] == self.test_data['b'][0])
+        assert np.all(d['b'][0].mask == self.test_data['b'][0].mask)
+        assert np.all(d['b'][1] == self.test_data['b'][1])
+        assert d['c'] == self.test_data['c']
+
+    def test_container(self, tmp_path):
+        for header_format in ('msgpack', 'json'):
+            fname = str(tmp_path / 'test_container.scs')
+            with open(fname, 'wb') as f:
+                serializers.dump_container(self.test_data, f,
+                                           header_format=header_format)
+            with open(fname, 'rb') as f:
+                d = serializers.load_container(f)
+            self.check(d)
+            assert d['a'].ctypes.data % serializers.BLOB_ALIGNMENT == 0
+            assert d['a'].flags.writeable and not d['a'].flags.owndata
+            d['a'][0, 0] = 1e9
+            with open(fname, 'rb') as f:
+                self.check(serializers.load_container(f))
+
+    def test_container_read_only(self, tmp_path):
+        fname = str(tmp_path / 'test_container.scs')
+        with open(fname, 'wb') as f:
+            serializers.dump_container(self.test_data, f)
+        with open(fname, 'rb') as f:
+            d = serializers.load_container(f, mode='r')
+        self.check(d)
+        assert not d['a'].flags.writeable
+        type_coder_list = [coders.NumpyArrayCoder(writable=True),
+                           coders.TimeDeltaCoder(),
+                           coders.NumpyMaskedArrayCoder(writable=True)]
+        with open(fname, 'rb') as f:
+            d = serializers.load_container(
+                f, type_coder_list=type_coder_list, mode='r')
+        self.check(d)
+        assert d['a'].flags.writeable and d['a'].flags.owndata
+
+    def test_externalize_deep_data(self):
+        depth = 3 * sys.getrecursionlimit()
+        data = [b'leaf']
+        for level in range(depth):
+            data = {'child': data, 'level': (level, bytearray(b'x'))}
+        blobs = []
+
+        def write(buffer):
+            blobs.append(bytes(buffer))
+            return len(blobs) - 1
+        out = serializers._externalize_buffers(data, write)
+        # In the order of the data, like the recursive traversal:
+        assert blobs == [b'leaf'] + [b'x'] * depth
+        for level in range(depth - 1, -1, -1):
+            assert out['level'] == [level, {serializers.BLOB_KEY: level + 1}]
+            out = out['child']
+        assert out == [{serializers.BLOB_KEY: 0}]
+        assert data['level'][1] == bytearray(b'x')
+
+
+class TestLazySerializers:
+    test_data = {'meta': {'run_id': 3}, 'x': np.arange(10)}
+
+    def test_loads_unpackb(self):
+        for d in (serializers.loads(serializers.dumps(self.test_data),
+                                    lazy=True),
+                  serializers.unpackb(serializers.packb(self.test_data),
+                                      lazy=True, single_pass=True)):
+            assert d['meta']['run_id'] == 3
+            assert np.all(d['x'] == self.test_data['x'])
+
+
+class TestCompressedSerializers:
+    test_data = {'a': np.arange(10000.), 'b': [np.ones((30, 30))]}
+
+    def check(self, d):
+        assert np.all(d['a'] == self.test_data['a'])
+        assert np.all(d['b'][0] == self.test_data['b'][0])
+
+    def test_packb_unpackb(self):
+        s = serializers.packb(self.test_data, compression='zlib')
+        assert len(s) < len(serializers.packb(self.test_data)) / 2
+        self.check(serializers.unpackb(s))
+        s = serializers.packb(self.test_data, compression='lzma',
+                              single_pass=True)
+        self.check(serializers.unpackb(s, single_pass=True))
+
+    def test_dumps_loads(self):
+        s = serializers.dumps(self.test_data, compression='bz2')
+        self.check(serializers.loads(s))
+
+
+class TestParallelSerializers:
+    test_data = {'a': np.cumsum(np.random.randn(200000)),
+                 'b': np.ma.masked_array(np.arange(100000.),
+                                         np.arange(100000) % 7 == 0)}
+    compression = {'codec': 'zlib', 'chunk_size': 2 ** 15}
+
+    def test_packb_unpackb(self):
+        serial = serializers.packb(self.test_data,
+                                   compression=self.compression)
+        parallel = serializers.packb(self.test_data,
+                                     compression=self.compression, workers=4)
+        assert serial == parallel
+        d = serializers.unpackb(parallel, workers=4)
+        assert np.all(d['a'] == self.test_data['a'])
+        assert np.all(d['b'] == self.test_data['b'])
+
+    def test_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(2) as executor:
+            s = serializers.dumps(self.test_data, executor=executor,
+                                  compression=self.compression)
+            d = serializers.loads(s, executor=executor)
+        assert s == serializers.dumps(self.test_data,
+                                      compression=self.compression)
+        assert np.all(d['a'] == self.test_data['a'])
+
+
+class TestHomogeneousSerializers:
+    test_data = {'x': [float(i) for i in range(1000)], 't': (1, (2, 3))}
+
+    def test_packb_unpackb(self):
+        s = serializers.packb(self.test_data, pack_homogeneous=True,
+                              preserve_tuples=True)
+        assert len(s) < len(serializers.packb(self.test_data))
+        assert serializers.unpackb(s) == self.test_data
+        d = serializers.unpackb(s, homogeneous_as_array=True)
+        assert np.all(d['x'] == np.arange(1000.))
+
+    def test_dumps_loads(self):
+        s = serializers.dumps(self.test_data, pack_homogeneous=True,
+                              preserve_tuples=True)
+        assert serializers.loads(s) == self.test_data
+
+
+class TestRecordBatchSerializers:
+    test_data = [{'time': float(i), 'value': i * 0.5, 'valid': i % 2 == 0,
+                  'sensor_label': 'a'} for i in range(100)]
+
+    def test_packb_unpackb(self):
+        s = serializers.packb(self.test_data, record_batches=True)
+        assert len(s) < len(serializers.packb(self.test_data)) / 2
+        assert serializers.unpackb(s) == self.test_data
+        assert serializers.unpackb(s, single_pass=True) == self.test_data
+        frame = serializers.unpackb(s, records_as='dataframe')
+        assert frame['value'].sum() == sum(r['value'] for r in self.test_data)
+
+    def test_dumps_loads(self):
+        s = serializers.dumps(self.test_data, record_batches=True)
+        assert serializers.loads(s) == self.test_data
+        arrays = serializers.loads(s, records_as='arrays')
+        assert arrays['valid'].dtype == bool
+
+
+class TestSharedReferenceSerializers:
+    array = np.random.randn(1000)
+    test_data = {'x': array, 'y': array, 'z': [array]}
+
+    def check(self, data):
+        assert data['x'] is data['y'] and data['x'] is data['z'][0]
+        assert np.all(data['x'] == self.array)
+
+    def test_packb_unpackb(self):
+        s = serializers.packb(self.test_data, track_refs=True)
+        assert len(s) < self.array.nbytes * 1.1
+        self.check(serializers.unpackb(s))
+
+    def test_dumps_loads(self):
+        self.check(serializers.loads(
+            serializers.dumps(self.test_data, track_refs=True)))
+
+    def test_container(self, tmp_path):
+        path = tmp_path / 'shared.scs'
+        with open(path, 'wb') as fp:
+            serializers.dump_container(self.test_data, fp, track_refs=True)
+        assert path.stat().st_size < self.array.nbytes * 1.1
+        with open(path, 'rb') as fp:
+            self.check(serializers.load_container(fp))
+
+
+class TestSelect:
+    test_data = {'meta': {'run_id': 'r1', 'n': 3,
+                          'time': datetime.datetime(2020, 1, 1)},
+                 'big': np.zeros(10000),
+                 'items': [1, {'a': np.ones(2), 'b': 2}, 3, [4, 5]],
+                 'text': 'x' * 300}
+    select = [('meta', 'run_id'), ('meta', 'time'), ('items', 1, 'a'),
+              ('items', -1, 0), 'missing', ('text', 'x'), ('big', 'dtype')]
+
+    def check(self, data):
+        assert data.keys() == {'meta', 'items', 'big'}
+        assert data['meta'] == {'run_id': 'r1',
+                                'time': datetime.datetime(2020, 1, 1)}
+        assert np.all(data['items'][0]['a'] == np.ones(2))
+        assert data['items'][1] == [4]
+        # Typed objects are selected as a whole:
+        assert np.all(data['big'] == self.test_data['big'])
+
+    def test_packb_unpackb(self):
+        s = serializers.packb(self.test_data)
+        self.check(serializers.unpackb(s, select=self.select))
+        assert serializers.unpackb(s, select=[()])['text'] == 'x' * 300
+        assert serializers.unpackb(s, select=['meta', ('meta', 'n')])[
+            'meta']['n'] == 3
+        assert serializers.unpackb(s, select=[]) == {}
+
+    def test_pack_unpack(self, tmp_path):
+        path = tmp_path / 'select.mpk'
+        with open(path, 'wb') as fp:
+            serializers.pack(self.test_data, fp)
+            serializers.pack([self.test_data], fp)
+        with open(path, 'rb') as fp:
+            self.check(serializers.unpack(fp, select=self.select))
+            self.check(serializers.unpack(
+                fp, select=[(0,) + p for p in self.select
+                            if not isinstance(p, str)])[0])
+
+    def test_dumps_loads(self):
+        s = serializers.dumps(self.test_data)
+        self.check(serializers.loads(s, select=self.select))
+
+    def test_msgpack_skip(self):
+        objects = [None, True, -1, -200, 2 ** 40, 1.5, 'a' * 40, 'a' * 300,
+                   b'b' * 70000, list(range(20)),
+                   {str(i): i for i in range(20)}, {'x': [{'y': [1, 2]}]}]
+        for obj in objects:
+            s = serializers._msgpack.packb(obj, use_bin_type=True)
+            assert serializers._msgpack_skip(memoryview(s), 0) == len(s)
+
+
+class TestStreamingJson:
+    test_data = {'array': np.random.randn(30000), 'text': 'ü"\\/',
+                 'keys': {1: None, 2.5: True}, 'nested': [(1, 2), {3}],
+                 'empty': np.zeros(0)}
+
+    def check(self, data):
+        assert np.all(data['array'] == self.test_data['array'])
+        assert data['array'].flags.writeable
+        assert data['text'] == self.test_data['text']
+        assert data['keys'] == {'1': None, '2.5': True}
+        assert data['nested'] == [[1, 2], {3}]
+        assert data['empty'].shape == (0,)
+
+    @pytest.mark.parametrize('kwargs', [{}, {'single_pass': True},
+                                        {'separators': (',', ':')},
+                                        {'sort_keys': True}])
+    def test_same_text_as_dumps(self, kwargs):
+        fp = io.StringIO()
+        serializers.dump(self.test_data, fp, **kwargs)
+        assert fp.getvalue() == serializers.dumps(self.test_data, **kwargs)
+        fp.seek(0)
+        self.check(serializers.load(fp))
+
+    @pytest.mark.parametrize('chunk_size', [3, 3 * 2 ** 16])
+    def test_base64_key_in_ordinary_object(self, monkeypatch, chunk_size):
+        monkeypatch.setattr(serializers, 'BASE64_CHUNK_SIZE', chunk_size)
+        key = serializers.BASE64_KEY
+        data = {'a': {key: 'AAAA', 'other': 1},
+                'b': {key: 'no base64!', 'x': [1]},
+                'c': {key: 'QR==', 'y': 2},
+                'd': {key: 'A/' * 1000 + 'é"', 'z': 3},
+                'array': np.arange(5.)}
+        fp = io.StringIO()
+        serializers.dump(data, fp)
+        fp.seek(0)
+        loaded = serializers.load(fp)
+        assert loaded.pop('array').tolist() == [0., 1., 2., 3., 4.]
+        del data['array']
+        assert loaded == data
+
+    def test_load(self, monkeypatch):
+        # Small chunks split the base64 objects at all positions:
+        monkeypatch.setattr(serializers, 'BASE64_CHUNK_SIZE', 3)
+        s = serializers.dumps(self.test_data)
+        self.check(serializers.load(io.StringIO(s)))
+        self.check(serializers.load(io.BytesIO(s.encode())))
+        self.check(serializers.load(io.StringIO(s.replace('/', '\\/'))))
+        s = serializers.dumps(self.test_data, indent=2)
+        self.check(serializers.load(io.StringIO(s)))
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            serializers.load(io.StringIO('{"__base64__": "AAAA'))
+        with pytest.raises(ValueError):
+            serializers.load(io.StringIO('{"__base64__": "AAAA", "x": '))
@@ -0,0 +1,97 @@
+import sys
+sys.path.append('..')
+
+from sciserialize import shm
+import itertools
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def double(data):
+    return {'doubled': data['array'] * 2, 'id': data['id']}
+
+
+def block_exists(name):
+    return os.path.exists(os.path.join('/dev/shm', name.lstrip('/')))
+
+
+class TestSharedMemory:
+    test_data = {'array': np.random.randn(1000, 10),
+                 'frame': pd.DataFrame({'a': np.arange(100.),
+                                        'b': np.arange(100)}),
+                 'masked': np.ma.masked_array([1., 2., 3.],
+                                              [False, True, False]),
+                 'text': 'small'}
+
+    def test_packb_unpackb(self):
+        message = shm.packb(self.test_data)
+        assert len(message) < 2000
+        with shm.unpackb(message) as shared:
+            data = shared.data
+            assert block_exists(shared.name)
+            assert np.all(data['array'] == self.test_data['array'])
+            assert data['frame'].equals(self.test_data['frame'])
+            assert np.all(data['masked'].mask ==
+                          self.test_data['masked'].mask)
+            assert data['text'] == 'small'
+            # Arrays are writable views of the block:
+            assert not data['array'].flags.owndata
+            assert data['array'].flags.writeable
+            name = shared.name
+            del data
+        assert not block_exists(name)
+        assert shared.data is None
+
+    def test_without_buffers(self):
+        message = shm.packb({'a': 1})
+        shared = shm.unpackb(message)
+        assert shared.data == {'a': 1} and shared.name is None
+        shared.release()
+        assert not shm.release(message)
+
+    def test_release_message(self):
+        message = shm.packb(self.test_data)
+        assert shm.release(message)
+        assert not shm.release(message)
+
+    def test_pool_map(self):
+        items = [{'array': np.arange(10.) + i, 'id': i} for i in range(5)]
+        results = []
+        for shared in shm.pool_map(double, items, processes=2):
+            results.append((shared.data['id'],
+                            shared.data['doubled'].copy()))
+            shared.release()
+        for i, doubled in results:
+            assert np.all(doubled == (np.arange(10.) + i) * 2)
+
+    def test_pool_map_closed_early(self):
+        before = set(os.listdir('/dev/shm'))
+        items = [{'array': np.arange(10.) + i, 'id': i} for i in range(20)]
+        results = shm.pool_map(double, items, processes=2)
+        shared = next(results)
+        results.close()
+        shared.release()
+        assert set(os.listdir('/dev/shm')) <= before
+
+    def test_pool_map_unbounded(self):
+        before = set(os.listdir('/dev/shm'))
+        items = ({'array': np.arange(10.) + i, 'id': i}
+                 for i in itertools.count())
+        results = shm.pool_map(double, items, processes=2, window=4)
+        for i, shared in zip(range(10), results):
+            assert shared.data['id'] == i
+            shared.release()
+        results.close()
+        assert set(os.listdir('/dev/shm')) <= before
+
+    def test_pool_map_failure(self):
+        before = set(os.listdir('/dev/shm'))
+        items = [{'array': np.arange(10.), 'id': i} for i in range(5)]
+        items[2] = {'id': 2}
+        results = shm.pool_map(double, items, processes=2)
+        with pytest.raises(KeyError):
+            for shared in results:
+                shared.release()
+        assert set(os.listdir('/dev/shm')) <= before
@@ -0,0 +1,79 @@
+import sys
+sys.path.append('..')
+
+from sciserialize import stats, serializers, coders
+import datetime
+import json
+import numpy as np
+import pytest
+
+
+class TestStats:
+    test_data = {'array': np.arange(100.), 'dt': datetime.timedelta(3),
+                 'sets': [{1, 2}, {3}]}
+
+    def test_encode_decode_types(self):
+        s = stats.Stats()
+        encoded = coders.encode_types(self.test_data, stats=s)
+        decoded = coders.decode_types(encoded, stats=s)
+        assert np.all(decoded['array'] == self.test_data['array'])
+        d = s.as_dict()
+        assert d['encode']['unique_set']['calls'] == 2
+        assert d['encode']['ndarray']['bytes'] >= 800
+        assert d['decode']['ndarray']['bytes'] >= 800
+        assert d['decode']['timedelta']['calls'] == 1
+        assert set(d['phases']) == {'encode_types', 'decode_types'}
+
+    @pytest.mark.parametrize('single_pass', [False, True])
+    @pytest.mark.parametrize('dump, load, phase', [
+        (serializers.packb, serializers.unpackb, 'msgpack'),
+        (serializers.dumps, serializers.loads, 'json')])
+    def test_serializers(self, dump, load, phase, single_pass):
+        s = stats.Stats()
+        load(dump(self.test_data, single_pass=single_pass, stats=s),
+             single_pass=single_pass, stats=s)
+        d = s.as_dict()
+        assert d['encode']['unique_set']['calls'] == 2
+        assert d['decode']['unique_set']['calls'] == 2
+        assert d['phases'][phase]['calls'] == 2
+        assert ('encode_types' in d['phases']) is not single_pass
+        json.dumps(d)
+
+    def test_record_batches(self):
+        s = stats.Stats()
+        records = [{'x': i, 'y': float(i), 'name': str(i)}
+                   for i in range(100)]
+        data = {'records': records, 'values': list(range(100))}
+        decoded = serializers.unpackb(
+            serializers.packb(data, record_batches=True,
+                              pack_homogeneous=True, stats=s), stats=s)
+        assert decoded['records'] == records
+        d = s.as_dict()
+        assert d['encode']['record_batch']['calls'] == 1
+        assert d['decode']['record_batch']['calls'] == 1
+        assert d['encode']['typed_list']['calls'] == 3
+        assert d['decode']['typed_list']['calls'] == 3
+
+    def test_configured_coders(self):
+        s = stats.Stats()
+        packed = serializers.packb(self.test_data, compression='zlib',
+                                   stats=s)
+        serializers.unpackb(packed, stats=s)
+        assert s.as_dict()['decode']['ndarray']['calls'] == 1
+
+    def test_instrument_cached(self):
+        s = stats.Stats()
+        registry = s.instrument(coders.TYPE_CODER_LIST)
+        assert s.instrument(coders.TYPE_CODER_LIST) is registry
+        assert s.instrument(registry) is registry
+
+    def test_reset(self):
+        s = stats.Stats()
+        coders.encode_types(self.test_data, stats=s)
+        s.reset()
+        assert s.as_dict() == {'encode': {}, 'decode': {}, 'phases': {}}
+
+    def test_disabled(self):
+        serializers.packb(self.test_data)
+        assert not any('encode' in vars(coder)
+                       for coder in coders.TYPE_CODER_LIST)